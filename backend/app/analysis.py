@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import cv2
+
+from .cv_pipeline import FallDetector
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_DIR = os.getenv("ANALYSIS_DIR", "data/analysis")
+
+
+class AnalysisJob:
+    """One offline pass of a video file through FallDetector."""
+
+    def __init__(self, path: str, annotate: bool = False, infer_every: Optional[int] = None, batch_size: int = 8,
+                 backend: Optional[str] = None, source_id: Optional[int] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.source_id = source_id
+        self.annotate = annotate
+        # None: the live cadence (1 + detector SKIP_FRAMES), resolved when the job starts
+        self.infer_every = max(1, int(infer_every)) if infer_every else None
+        self.batch_size = max(1, int(batch_size))
+        self.backend = backend
+
+        self.status = "queued"  # queued | running | done | failed | cancelled
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.video_fps = 0.0
+        self.total_frames = 0
+        self.frames_read = 0
+        self.frames_analyzed = 0
+        self.events: List[Dict] = []
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def to_dict(self, include_events: bool = True) -> Dict:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        d = {
+            "id": self.id,
+            "path": os.path.basename(self.path),
+            "source_id": self.source_id,
+            "status": self.status,
+            "error": self.error,
+            "options": {"annotate": self.annotate, "infer_every": self.infer_every,
+                        "batch_size": self.batch_size, "inference_backend": self.backend},
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "video_fps": self.video_fps,
+            "total_frames": self.total_frames,
+            "frames_read": self.frames_read,
+            "frames_analyzed": self.frames_analyzed,
+            "progress": (self.frames_read / self.total_frames) if self.total_frames else 0.0,
+            "processing_fps": (self.frames_read / elapsed) if elapsed > 0 else 0.0,
+            "event_count": len(self.events),
+        }
+        if include_events:
+            d["events"] = self.events
+        return d
+
+    def run(self):
+        self.status = "running"
+        self.started_at = time.time()
+        cap = cv2.VideoCapture(self.path)
+        try:
+            if not cap.isOpened():
+                raise RuntimeError(f"Cannot open video: {os.path.basename(self.path)}")
+            self.video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            self.total_frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+
+            # Own tracker and history, shared (cached) weights; batched model calls of our own
+            detector = FallDetector(use_batching=False, backend=self.backend)
+            if self.infer_every is None:
+                # Same temporal resolution as a live pipeline, so velocities and confirmations match
+                self.infer_every = detector.SKIP_FRAMES + 1
+            out_dir = os.path.join(ANALYSIS_DIR, self.id)
+            if self.annotate:
+                os.makedirs(out_dir, exist_ok=True)
+
+            idx = 0
+            batch, stamps, indices = [], [], []
+            eof = False
+            while not eof and not self._cancel.is_set():
+                # Fill a batch, grabbing (not decoding) frames we don't analyze
+                while len(batch) < self.batch_size:
+                    if idx % self.infer_every == 0:
+                        ok, frame = cap.read()
+                    else:
+                        ok, frame = cap.grab(), None
+                    if not ok:
+                        eof = True
+                        break
+                    if frame is not None:
+                        batch.append(frame)
+                        stamps.append(self._timestamp(cap, idx))
+                        indices.append(idx)
+                    idx += 1
+                    self.frames_read = idx
+
+                if batch:
+                    for (frame_480, det), frame_idx, ts in zip(detector.detect_batch(batch, stamps), indices, stamps):
+                        self.frames_analyzed += 1
+                        for e in det.events:
+                            event = {
+                                "frame": frame_idx,
+                                "time_s": round(ts, 3),
+                                "track_id": e["track_id"],
+                                "fall_score": e["fall_score"],
+                                "reason": e["reason"],
+                            }
+                            if self.annotate:
+                                name = f"frame_{frame_idx}_{e['track_id']}.jpg"
+                                cv2.imwrite(os.path.join(out_dir, name), FallDetector.annotate(frame_480, det))
+                                event["snapshot_path"] = f"analysis/{self.id}/{name}"
+                            self.events.append(event)
+                    batch, stamps, indices = [], [], []
+
+            self.status = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            logger.error(f"Analysis job {self.id} failed: {e}")
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            cap.release()
+            self.finished_at = time.time()
+            self._save()
+        logger.info(f"Analysis job {self.id} {self.status}: {self.frames_read} frames, {len(self.events)} falls")
+
+    def _timestamp(self, cap, idx: int) -> float:
+        """Video time of the frame just read; falls back to index/fps when the container has no PTS."""
+        pos_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+        if pos_ms and pos_ms > 0:
+            return pos_ms / 1000.0
+        return idx / self.video_fps
+
+    def _save(self):
+        try:
+            os.makedirs(ANALYSIS_DIR, exist_ok=True)
+            with open(os.path.join(ANALYSIS_DIR, f"{self.id}.json"), "w") as f:
+                json.dump(self.to_dict(), f, indent=2)
+        except OSError as e:
+            logger.error(f"Could not save analysis job {self.id}: {e}")
+
+
+class AnalysisManager:
+    """Runs analysis jobs on a small pool of threads (ANALYSIS_MAX_JOBS at a time)."""
+
+    def __init__(self, max_jobs: Optional[int] = None, keep: int = 100):
+        self.max_jobs = max_jobs if max_jobs is not None else int(os.getenv("ANALYSIS_MAX_JOBS", "1"))
+        self.keep = keep
+        self.jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._queue: List[AnalysisJob] = []
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def submit(self, job: AnalysisJob) -> AnalysisJob:
+        with self._lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.keep:
+                old_id, old = next(iter(self.jobs.items()))
+                if old.status in ("queued", "running"):
+                    break
+                del self.jobs[old_id]
+            self._queue.append(job)
+        self._dispatch()
+        return job
+
+    def _dispatch(self):
+        with self._lock:
+            while self._queue and self._running < self.max_jobs:
+                job = self._queue.pop(0)
+                if job._cancel.is_set():
+                    job.status = "cancelled"
+                    continue
+                self._running += 1
+                threading.Thread(target=self._run_job, args=(job,), daemon=True).start()
+
+    def _run_job(self, job: AnalysisJob):
+        try:
+            job.run()
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._dispatch()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        # Finished jobs from before a restart
+        path = os.path.join(ANALYSIS_DIR, f"{os.path.basename(job_id)}.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return None
+
+    def list(self) -> List[Dict]:
+        return [job.to_dict(include_events=False) for job in reversed(list(self.jobs.values()))]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return False
+        job.cancel()
+        if job.status == "queued":
+            job.status = "cancelled"
+        return True
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import List
-import cv2
+from sqlalchemy import func
+from typing import List, Optional
 import asyncio
 import json
 import logging
@@ -11,7 +11,9 @@ from datetime import datetime, timedelta
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 
-from . import schemas, database, pipeline_manager
+from .stream import normalize_capture_backend, normalize_frame_policy
+from .live import LiveSession
+from . import schemas, database, pipeline_manager, inference, model_backends, analysis, notifications
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -26,6 +28,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Global instance
 manager = pipeline_manager.PipelineManager()
+analysis_manager = analysis.AnalysisManager()
 
 # --- Auth Helpers ---
 
@@ -64,6 +67,17 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
     return user
 
+def get_user_from_token(token: str, db: Session):
+    """Token check for WebSockets (browsers cannot set an Authorization header there)."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if username is None:
+        return None
+    return db.query(database.User).filter(database.User.username == username).first()
+
 # --- Auth Endpoints ---
 
 @router.post("/token", response_model=schemas.Token)
@@ -199,8 +213,22 @@ def start_pipeline(config: schemas.PipelineStart, db: Session = Depends(database
                 "bot_token": bot_token
             }
 
-    manager.start_pipeline(source.id, source.source_url, is_file=is_file, telegram_config=telegram_config)
-    return {"status": "started", "source": source.name}
+    try:
+        backend = model_backends.normalize_backend(config.inference_backend)
+        capture_backend = normalize_capture_backend(config.capture_backend)
+        frame_policy = normalize_frame_policy(config.frame_policy)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    capture_options = {
+        "backend": capture_backend,
+        "max_fps": config.capture_max_fps,
+        "queue_depth": config.frame_queue_depth,
+        "frame_policy": frame_policy,
+    }
+    manager.start_pipeline(source.id, source.source_url, is_file=is_file, telegram_config=telegram_config, backend=backend,
+                           capture_options=capture_options)
+    return {"status": "started", "source": source.name, "inference_backend": backend, "capture_backend": capture_backend}
 
 @router.post("/pipeline/stop")
 def stop_pipeline(source_id: int, current_user: schemas.User = Depends(get_current_user)):
@@ -210,7 +238,48 @@ def stop_pipeline(source_id: int, current_user: schemas.User = Depends(get_curre
 @router.get("/pipeline/status")
 def get_pipeline_status(current_user: schemas.User = Depends(get_current_user)):
     """Return list of active source IDs"""
-    return {"active_source_ids": list(manager.pipelines.keys())}
+    pipelines = dict(manager.pipelines)
+    return {
+        "active_source_ids": list(pipelines.keys()),
+        "pipelines": {sid: p.get_stats() for sid, p in pipelines.items()}
+    }
+
+@router.get("/pipeline/health")
+def get_pipeline_health(current_user: schemas.User = Depends(get_current_user)):
+    """Capture health per active pipeline: connection state, reconnects, stalls, effective FPS"""
+    pipelines = dict(manager.pipelines)
+    return {sid: p.stream.get_health() for sid, p in pipelines.items()}
+
+@router.get("/pipeline/viewers")
+def get_pipeline_viewers(current_user: schemas.User = Depends(get_current_user)):
+    """Per-connection live-view stats: delivered FPS, bytes/s, drops, lag and degradation level"""
+    pipelines = dict(manager.pipelines)
+    return {sid: p.broadcaster.get_subscriber_stats() for sid, p in pipelines.items()}
+
+@router.get("/pipeline/inference/stats")
+def get_inference_stats(current_user: schemas.User = Depends(get_current_user)):
+    """Batch-size and queue-wait stats of the shared inference schedulers"""
+    return {
+        "batching": inference.batching_enabled(),
+        "schedulers": manager.get_inference_stats(),
+        "workers": manager.get_worker_stats(),
+    }
+
+@router.get("/notifications/stats")
+def get_notification_stats(db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
+    """Outbound Telegram queue (worker counters, rows per status), reminders and per-bot client metrics"""
+    counts = (db.query(database.NotificationModel.status, func.count(database.NotificationModel.id))
+              .group_by(database.NotificationModel.status).all())
+    stats = manager.notifier.get_stats()
+    stats["rows"] = {status: count for status, count in counts}
+    stats["reminders"] = manager.reminders.get_stats()
+    stats["telegram"] = notifications.get_all_stats()
+    return stats
+
+@router.get("/pipeline/rate")
+def get_rate_decisions(current_user: schemas.User = Depends(get_current_user)):
+    """Current adaptive frame-skipping decision for each active pipeline"""
+    return manager.rate_controller.get_status()
 
 @router.post("/pipeline/config")
 def update_config(source_id: int, night_mode: bool, current_user: schemas.User = Depends(get_current_user)):
@@ -234,8 +303,61 @@ async def upload_video(file: UploadFile = File(...), current_user: schemas.User
         buffer.write(content)
     return {"filename": file.filename, "path": os.path.abspath(file_path)}
 
+@router.post("/analysis")
+def start_analysis(request: schemas.AnalysisCreate, db: Session = Depends(database.get_db), current_user: schemas.User = Depends(get_current_user)):
+    """Analyze a video file offline as fast as possible; poll GET /analysis/{id} for progress and events"""
+    if request.source_id is not None:
+        source = db.query(database.VideoSourceModel).filter(database.VideoSourceModel.id == request.source_id).first()
+        if not source:
+            raise HTTPException(status_code=404, detail="Source not found")
+        if source.type != 'file':
+            raise HTTPException(status_code=400, detail="Only file sources can be analyzed offline")
+        path = source.source_url
+    elif request.filename:
+        # Only files from the upload directory
+        path = os.path.join("data/uploads", os.path.basename(request.filename))
+    else:
+        raise HTTPException(status_code=400, detail="Provide filename or source_id")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Video file not found")
+
+    try:
+        backend = model_backends.normalize_backend(request.inference_backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job = analysis_manager.submit(analysis.AnalysisJob(
+        path, annotate=request.annotate, infer_every=request.infer_every, batch_size=request.batch_size,
+        backend=backend, source_id=request.source_id,
+    ))
+    return job.to_dict(include_events=False)
+
+@router.get("/analysis")
+def list_analysis(current_user: schemas.User = Depends(get_current_user)):
+    return analysis_manager.list()
+
+@router.get("/analysis/{job_id}")
+def get_analysis(job_id: str, current_user: schemas.User = Depends(get_current_user)):
+    job = analysis_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return job
+
+@router.delete("/analysis/{job_id}")
+def cancel_analysis(job_id: str, current_user: schemas.User = Depends(get_current_user)):
+    if not analysis_manager.cancel(job_id):
+        raise HTTPException(status_code=404, detail="No queued or running analysis job with this id")
+    return {"status": "cancelling", "id": job_id}
+
 @router.websocket("/ws/stream/{source_id}")
-async def websocket_endpoint(websocket: WebSocket, source_id: int):
+async def websocket_endpoint(websocket: WebSocket, source_id: int, max_width: Optional[int] = None,
+                             quality: Optional[int] = None, fps: Optional[float] = None,
+                             overlay: Optional[str] = None):
+    """
+    Live view. Optional rendition query params: max_width (px), quality (JPEG 10-95),
+    fps (cap), overlay ("server" draws into the JPEG, "client" sends a clean JPEG preceded
+    by a {"type": "detections"} message).
+    """
     await websocket.accept()
     pipeline = manager.get_pipeline(source_id)
     
@@ -243,36 +365,52 @@ async def websocket_endpoint(websocket: WebSocket, source_id: int):
         await websocket.close(code=1000, reason="Pipeline not active")
         return
 
+    pipeline.add_viewer()
+    client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    subscription = pipeline.broadcaster.subscribe(client, max_width=max_width, quality=quality, max_fps=fps,
+                                                  overlay=overlay)
     try:
-        while True:
-            # Check if pipeline is still running
-            if not pipeline.running:
-                break
-
-            annotated_frame, events = pipeline.get_processed_frame()
-            
-            if annotated_frame is None:
-                await asyncio.sleep(0.1)
+        while pipeline.running:
+            # Woken by the pipeline's encoder thread; slow clients get fewer/smaller frames
+            item = await subscription.next(timeout=1.0)
+            if item is None:
                 continue
+            await subscription.send(websocket, *item)
 
-            # Encode frame to JPEG
-            ret, buffer = cv2.imencode('.jpg', annotated_frame)
-            if not ret:
-                continue
-            
-            await websocket.send_bytes(buffer.tobytes())
-            
-            if events:
-                await websocket.send_text(json.dumps({"type": "events", "data": events}))
-
-            await asyncio.sleep(0.03) # Limit WS FPS to ~30 FPS
-            
     except WebSocketDisconnect:
         logger.info(f"Client disconnected from stream {source_id}")
+    except asyncio.TimeoutError:
+        logger.warning(f"Dropping stalled stream client {client} on source {source_id}")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
+        subscription.close()
+        pipeline.remove_viewer()
         try:
             await websocket.close()
         except:
             pass
+
+@router.websocket("/ws/live")
+async def live_websocket(websocket: WebSocket, token: str = ""):
+    """
+    One multiplexed socket for all cameras: subscribe/unsubscribe to sources, receive
+    header-tagged frames plus event and status messages (see live.LiveSession).
+    """
+    db = database.SessionLocal()
+    try:
+        user = get_user_from_token(token, db)
+    finally:
+        db.close()
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+
+    await websocket.accept()
+    client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    try:
+        await LiveSession(websocket, manager, client).run()
+    except WebSocketDisconnect:
+        logger.info(f"Live client {client} disconnected")
+    except Exception as e:
+        logger.error(f"Live WebSocket error: {e}")
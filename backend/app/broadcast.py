@@ -0,0 +1,455 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+# Degradation ladder for clients that fall behind: (max fps, 0 = uncapped; low-quality JPEG)
+QUALITY_LEVELS = (
+    (0.0, False),
+    (10.0, False),
+    (5.0, True),
+    (2.0, True),
+)
+
+
+class EncodedFrame:
+    """One JPEG-encoded frame shared by every subscriber of a pipeline."""
+
+    __slots__ = ("seq", "jpeg", "jpeg_low", "events", "timestamp", "meta")
+
+    def __init__(self, seq: int, jpeg: bytes, events: List, timestamp: float, jpeg_low: Optional[bytes] = None,
+                 meta: Optional[str] = None):
+        self.seq = seq
+        self.jpeg = jpeg
+        # Low-quality variant, only encoded while some subscriber is degraded
+        self.jpeg_low = jpeg_low
+        self.events = events
+        self.timestamp = timestamp
+        # Client-overlay renditions: JSON "detections" message sent right before the JPEG
+        self.meta = meta
+
+
+class Subscription:
+    """
+    A WebSocket client's handle on a FrameBroadcaster.
+
+    Frames land in a small per-client queue (latest frame wins: when it is full the
+    oldest frame is dropped, its events carried over). Delivery is measured per
+    connection; a client that keeps dropping frames or lagging is moved down
+    QUALITY_LEVELS (lower FPS, then lower JPEG quality) and back up once it keeps up.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, broadcaster, loop, client: Optional[str] = None):
+        self.id = next(self._ids)
+        self.broadcaster = broadcaster
+        self.loop = loop
+        self.client = client
+        self.connected_at = time.time()
+
+        # --- Tuning ---
+        self.QUEUE_DEPTH = max(1, int(os.getenv("STREAM_CLIENT_QUEUE", "1")))
+        self.SEND_TIMEOUT = float(os.getenv("STREAM_SEND_TIMEOUT_S", "10"))
+        self.MAX_LAG_MS = float(os.getenv("STREAM_MAX_LAG_MS", "500"))
+        self.ADAPT_INTERVAL = 1.0
+        self.RECOVER_WINDOWS = 5  # clean intervals before stepping back up
+
+        self._queue = deque()
+        self._carry_events: List = []
+        self._ready = asyncio.Event()
+        self._throttling = False
+        self.level = 0
+        self.rendition = None  # (max_width, quality, max_fps, overlay) key, set by FrameBroadcaster.subscribe
+
+        # Counters
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.throttled = 0
+        self.lag_ms_ema = 0.0
+        self.send_ms_ema = 0.0
+        self.fps = 0.0
+        self.bytes_per_s = 0.0
+        self._last_sent = 0.0
+        self._clean_windows = 0
+        self._win_start = time.monotonic()
+        self._win_sent = 0
+        self._win_bytes = 0
+        self._win_dropped = 0
+
+    def _notify(self, packet: EncodedFrame):
+        # Called from the encoder thread
+        self.loop.call_soon_threadsafe(self._offer, packet)
+
+    def _offer(self, packet: EncodedFrame):
+        if len(self._queue) >= self.QUEUE_DEPTH:
+            old = self._queue.popleft()
+            self._carry_events.extend(old.events)
+            if self._throttling:
+                self.throttled += 1
+            else:
+                self.dropped += 1
+                self._win_dropped += 1
+        self._queue.append(packet)
+        self._ready.set()
+
+    @property
+    def low_quality(self) -> bool:
+        return QUALITY_LEVELS[self.level][1]
+
+    async def next(self, timeout: Optional[float] = None):
+        """Wait for the next frame to send: (packet, jpeg, events), or None on timeout."""
+        while not self._queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        max_fps = QUALITY_LEVELS[self.level][0]
+        if max_fps:
+            wait = self._last_sent + 1.0 / max_fps - time.monotonic()
+            if wait > 0:
+                self._throttling = True
+                try:
+                    await asyncio.sleep(wait)
+                finally:
+                    self._throttling = False
+
+        packet = self._queue.popleft()
+        events = packet.events
+        if self._carry_events:
+            events = self._carry_events + packet.events
+            self._carry_events = []
+        jpeg = packet.jpeg_low if self.low_quality and packet.jpeg_low is not None else packet.jpeg
+        return packet, jpeg, events
+
+    async def send(self, websocket, packet: EncodedFrame, jpeg: bytes, events: List):
+        """Send one frame (and its events). Raises asyncio.TimeoutError if the client stalls."""
+        t0 = time.monotonic()
+        # One deadline for the whole frame: a stalled client can block on any of the three sends
+        await asyncio.wait_for(self._send(websocket, packet, jpeg, events), self.SEND_TIMEOUT)
+        now = time.monotonic()
+        self._record(packet, len(jpeg), t0, now)
+
+    @staticmethod
+    async def _send(websocket, packet: EncodedFrame, jpeg: bytes, events: List):
+        if packet.meta is not None:
+            await websocket.send_text(packet.meta)
+        await websocket.send_bytes(jpeg)
+        if events:
+            await websocket.send_text(json.dumps({"type": "events", "data": events}))
+
+    def _record(self, packet: EncodedFrame, nbytes: int, started: float, now: float):
+        # FPS caps are paced from the start of each send
+        self._last_sent = started
+        self.frames_sent += 1
+        self.bytes_sent += nbytes
+        self._win_sent += 1
+        self._win_bytes += nbytes
+        lag_ms = (time.time() - packet.timestamp) * 1000.0
+        self.lag_ms_ema = lag_ms if self.frames_sent == 1 else 0.8 * self.lag_ms_ema + 0.2 * lag_ms
+        self.send_ms_ema = 0.8 * self.send_ms_ema + 0.2 * (now - started) * 1000.0
+        if now - self._win_start >= self.ADAPT_INTERVAL:
+            self._adapt(now)
+
+    def _adapt(self, now: float):
+        elapsed = now - self._win_start
+        self.fps = self._win_sent / elapsed
+        self.bytes_per_s = self._win_bytes / elapsed
+
+        max_fps = QUALITY_LEVELS[self.level][0]
+        if max_fps:
+            # Frames skipped under a cap are expected; the client only has to keep up with the cap
+            behind = self.fps < 0.8 * max_fps
+        else:
+            behind = self._win_dropped > max(1, 0.2 * self._win_sent)
+        behind = behind or self.lag_ms_ema > self.MAX_LAG_MS
+        if behind:
+            self._clean_windows = 0
+            if self.level < len(QUALITY_LEVELS) - 1:
+                self.level += 1
+                logger.info(f"Viewer {self.id} ({self.client}) is falling behind, stream level -> {self.level}")
+        else:
+            self._clean_windows += 1
+            if self.level > 0 and self._clean_windows >= self.RECOVER_WINDOWS:
+                self.level -= 1
+                self._clean_windows = 0
+
+        self._win_start = now
+        self._win_sent = 0
+        self._win_bytes = 0
+        self._win_dropped = 0
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+    def get_stats(self) -> Dict:
+        max_fps, low = QUALITY_LEVELS[self.level]
+        return {
+            "id": self.id,
+            "client": self.client,
+            "rendition": {"max_width": self.rendition[0] or None, "quality": self.rendition[1],
+                          "max_fps": self.rendition[2] or None, "overlay": self.rendition[3]}
+            if self.rendition else None,
+            "connected_s": round(time.time() - self.connected_at, 1),
+            "level": self.level,
+            "max_fps": max_fps or None,
+            "low_quality": low,
+            "fps": round(self.fps, 1),
+            "bytes_per_s": int(self.bytes_per_s),
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+            "throttled": self.throttled,
+            "queued": len(self._queue),
+            "lag_ms": round(self.lag_ms_ema, 1),
+            "send_ms": round(self.send_ms_ema, 1),
+        }
+
+
+OVERLAY_MODES = ("server", "client")
+
+
+class Rendition:
+    """
+    One output variant of a pipeline's live view: max width, JPEG quality, FPS cap and
+    overlay mode ("server": boxes drawn into the JPEG; "client": clean JPEG plus a
+    detections message for the browser to draw). Exists only while it has subscribers;
+    every subscriber of it shares each encode.
+    """
+
+    def __init__(self, max_width: int, quality: int, max_fps: float, overlay: str = "server"):
+        self.max_width = max_width
+        self.quality = quality
+        self.max_fps = max_fps
+        self.overlay = overlay
+        self.subscribers: List[Subscription] = []
+        self.pending_events: List = []
+        self.latest: Optional[EncodedFrame] = None
+        self.seq = 0
+        self.last_encode = 0.0
+
+        # Counters
+        self.encoded = 0
+        self.bytes_ema = 0.0
+        self.encode_ms_ema = 0.0
+
+    @property
+    def key(self):
+        return (self.max_width, self.quality, self.max_fps, self.overlay)
+
+    def get_stats(self) -> Dict:
+        return {
+            "max_width": self.max_width or None,
+            "quality": self.quality,
+            "max_fps": self.max_fps or None,
+            "overlay": self.overlay,
+            "subscribers": len(self.subscribers),
+            "encoded": self.encoded,
+            "avg_kb": round(self.bytes_ema / 1024, 1),
+            "encode_ms": round(self.encode_ms_ema, 2),
+        }
+
+
+class FrameBroadcaster:
+    """
+    Encode-once fan-out of a pipeline's annotated frames.
+
+    The pipeline thread hands over each new frame with publish(); a dedicated encoder
+    thread takes the newest one (older unencoded frames are skipped) and encodes it once
+    per active rendition, scaling once per distinct width. Renditions are created when
+    the first client asks for them and dropped with the last one, so a grid of
+    thumbnails never pays for full-size frames nobody watches. `serialize(detections,
+    scale)` turns detections into overlay data for client-overlay renditions.
+    """
+
+    def __init__(self, source_id: int, serialize: Optional[Callable] = None):
+        self.source_id = source_id
+        self.serialize = serialize
+        self.JPEG_QUALITY = int(os.getenv("STREAM_JPEG_QUALITY", "80"))
+        self.LOW_JPEG_QUALITY = int(os.getenv("STREAM_LOW_JPEG_QUALITY", "50"))
+
+        self._cond = threading.Condition()
+        self._pending = None  # newest (annotated, clean, detections) not yet encoded
+        self._renditions: Dict[tuple, Rendition] = {}
+        self.running = False
+        self.thread = None
+
+        # Counters
+        self.published = 0
+        self.encoded = 0
+        self.skipped = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(r.subscribers) for r in self._renditions.values())
+
+    def normalize_rendition(self, max_width: Optional[int] = None, quality: Optional[int] = None,
+                            max_fps: Optional[float] = None, overlay: Optional[str] = None) -> tuple:
+        """Clamp requested rendition parameters; 0 width / fps means full size / uncapped."""
+        max_width = max(64, int(max_width)) if max_width else 0
+        quality = min(95, max(10, int(quality))) if quality else self.JPEG_QUALITY
+        max_fps = max(0.5, float(max_fps)) if max_fps else 0.0
+        overlay = overlay if overlay in OVERLAY_MODES and self.serialize is not None else "server"
+        return max_width, quality, max_fps, overlay
+
+    @property
+    def wants_annotated(self) -> bool:
+        """Some subscriber needs server-drawn overlays."""
+        return any(key[3] == "server" for key in list(self._renditions))
+
+    @property
+    def wants_clean(self) -> bool:
+        """Some subscriber draws overlays itself and needs the clean frame."""
+        return any(key[3] == "client" for key in list(self._renditions))
+
+    def subscribe(self, client: Optional[str] = None, max_width: Optional[int] = None,
+                  quality: Optional[int] = None, max_fps: Optional[float] = None,
+                  overlay: Optional[str] = None) -> Subscription:
+        key = self.normalize_rendition(max_width, quality, max_fps, overlay)
+        sub = Subscription(self, asyncio.get_running_loop(), client)
+        sub.rendition = key
+        with self._cond:
+            rendition = self._renditions.get(key)
+            if rendition is None:
+                rendition = self._renditions[key] = Rendition(*key)
+            rendition.subscribers.append(sub)
+            latest = rendition.latest
+        if latest is not None:
+            # Show the current picture right away instead of waiting for the next frame
+            sub._offer(latest)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._cond:
+            rendition = self._renditions.get(sub.rendition)
+            if rendition is None or sub not in rendition.subscribers:
+                return
+            rendition.subscribers.remove(sub)
+            if not rendition.subscribers:
+                del self._renditions[sub.rendition]
+
+    def publish(self, frame, events=None, clean=None, detections=None):
+        """
+        Hand over a new frame (pipeline thread). Never blocks on encoding. `frame` is the
+        annotated frame, `clean` + `detections` feed client-overlay renditions; either
+        may be None when no subscriber needs it.
+        """
+        with self._cond:
+            self.published += 1
+            if not self._renditions:
+                return
+            if events:
+                for rendition in self._renditions.values():
+                    rendition.pending_events.extend(events)
+            if self._pending is not None:
+                self.skipped += 1
+            self._pending = (frame, clean, detections)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self.running)
+                if not self.running:
+                    break
+                (annotated, clean, detections), self._pending = self._pending, None
+                now = time.monotonic()
+                jobs = []
+                for rendition in self._renditions.values():
+                    if (annotated if rendition.overlay == "server" else clean) is None:
+                        continue
+                    if rendition.max_fps and now - rendition.last_encode < 1.0 / rendition.max_fps:
+                        continue  # events wait for this rendition's next frame
+                    rendition.last_encode = now
+                    events, rendition.pending_events = rendition.pending_events, []
+                    need_low = any(sub.low_quality for sub in rendition.subscribers)
+                    jobs.append((rendition, events, need_low))
+
+            scaled = {"server": {}, "client": {}}  # one resize per distinct width and source
+            for rendition, events, need_low in jobs:
+                src = annotated if rendition.overlay == "server" else clean
+                img = self._scale(src, rendition.max_width, scaled[rendition.overlay])
+                t0 = time.perf_counter()
+                ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, rendition.quality])
+                if not ok:
+                    continue
+                jpeg_low = None
+                if need_low and self.LOW_JPEG_QUALITY < rendition.quality:
+                    ok_low, buf_low = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.LOW_JPEG_QUALITY])
+                    jpeg_low = buf_low.tobytes() if ok_low else None
+                meta = None
+                if rendition.overlay == "client" and detections is not None:
+                    meta = {"type": "detections", "seq": rendition.seq + 1, "w": img.shape[1], "h": img.shape[0],
+                            "data": self.serialize(detections, img.shape[1] / float(src.shape[1]))}
+                    meta = json.dumps(meta)
+                ms = (time.perf_counter() - t0) * 1000.0
+
+                with self._cond:
+                    rendition.seq += 1
+                    rendition.encoded += 1
+                    self.encoded += 1
+                    first = rendition.encoded == 1
+                    rendition.encode_ms_ema = ms if first else 0.9 * rendition.encode_ms_ema + 0.1 * ms
+                    rendition.bytes_ema = len(buf) if first else 0.9 * rendition.bytes_ema + 0.1 * len(buf)
+                    packet = rendition.latest = EncodedFrame(rendition.seq, buf.tobytes(), events, time.time(),
+                                                             jpeg_low, meta)
+                    subscribers = list(rendition.subscribers)
+                for sub in subscribers:
+                    try:
+                        sub._notify(packet)
+                    except RuntimeError:
+                        # Event loop already closed
+                        self.unsubscribe(sub)
+
+    @staticmethod
+    def _scale(frame, max_width: int, cache: Dict):
+        w = frame.shape[1]
+        if not max_width or w <= max_width:
+            return frame
+        if max_width not in cache:
+            h = max(1, int(frame.shape[0] * max_width / float(w)))
+            cache[max_width] = cv2.resize(frame, (max_width, h), interpolation=cv2.INTER_AREA)
+        return cache[max_width]
+
+    def get_subscriber_stats(self) -> List[Dict]:
+        with self._cond:
+            subscribers = [sub for r in self._renditions.values() for sub in r.subscribers]
+        return [sub.get_stats() for sub in subscribers]
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            renditions = [r.get_stats() for r in self._renditions.values()]
+        return {
+            "subscribers": sum(r["subscribers"] for r in renditions),
+            "published": self.published,
+            "encoded": self.encoded,
+            "skipped": self.skipped,
+            "renditions": renditions,
+        }
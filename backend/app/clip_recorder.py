@@ -0,0 +1,242 @@
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from .ffmpeg_capture import FFMPEG_BIN
+
+logger = logging.getLogger(__name__)
+
+CLIP_DIR = "data/snapshots"
+
+# H.264 (avc1) plays in browsers and Telegram; mp4v (MPEG-4 Part 2) is the fallback every
+# OpenCV build can write, and is transcoded to H.264 with ffmpeg when that is installed
+CLIP_FOURCCS = ("avc1", "mp4v")
+
+
+def clips_enabled() -> bool:
+    return os.getenv("CLIP_RECORDING", "1").lower() not in ("0", "false", "no")
+
+
+class ClipEncoder:
+    """
+    Shared background worker that turns buffered JPEG frames into mp4 clips, so a fall
+    never blocks a pipeline thread on video encoding.
+    """
+
+    def __init__(self, max_pending: int = 32):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.thread = None
+        self._lock = threading.Lock()
+        self.encoded = 0
+        self.failed = 0
+        self.dropped = 0
+        self.fourcc = None  # First of CLIP_FOURCCS this OpenCV build can write
+        self.transcoded = 0
+
+    def submit(self, path: str, frames: List, on_done: Optional[Callable[[str], None]] = None,
+               annotate: Optional[Callable] = None):
+        with self._lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        try:
+            self._queue.put_nowait((path, frames, on_done, annotate))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Clip encoder backlog full, dropping {os.path.basename(path)}")
+
+    def _run(self):
+        while True:
+            path, frames, on_done, annotate = self._queue.get()
+            try:
+                if self._encode(path, frames, annotate):
+                    self.encoded += 1
+                    if on_done:
+                        on_done(path)
+                else:
+                    self.failed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Clip encoding failed for {os.path.basename(path)}: {e}")
+
+    def _open_writer(self, path: str, fps: float, size) -> Optional[cv2.VideoWriter]:
+        for fourcc in ([self.fourcc] if self.fourcc else CLIP_FOURCCS):
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+            if writer.isOpened():
+                if self.fourcc is None:
+                    self.fourcc = fourcc
+                    if fourcc != "avc1":
+                        how = "transcoding with ffmpeg" if shutil.which(FFMPEG_BIN) else \
+                            "install ffmpeg, clips will not play in browsers or Telegram"
+                        logger.warning(f"OpenCV cannot write H.264 clips, using {fourcc} ({how})")
+                return writer
+            writer.release()
+        logger.error(f"No video codec available for {os.path.basename(path)}")
+        return None
+
+    def _to_h264(self, path: str):
+        """Re-encode a fallback-codec clip to H.264 in place; keeps the original if ffmpeg fails."""
+        if self.fourcc == "avc1" or not shutil.which(FFMPEG_BIN):
+            return
+        tmp = path + ".h264.mp4"
+        cmd = [FFMPEG_BIN, "-y", "-loglevel", "error", "-i", path, "-c:v", "libx264", "-preset", "veryfast",
+               "-pix_fmt", "yuv420p", "-movflags", "+faststart", "-an", tmp]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True, timeout=60)
+            os.replace(tmp, path)
+            self.transcoded += 1
+        except Exception as e:
+            logger.warning(f"H.264 transcode failed for {os.path.basename(path)}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _encode(self, path: str, frames: List, annotate: Optional[Callable] = None) -> bool:
+        """
+        frames: [(timestamp, jpeg_bytes, detections)] in order; detections are drawn with
+        annotate(img, detections) when given. Output fps follows the capture rate.
+        """
+        if len(frames) < 2:
+            return False
+        duration = frames[-1][0] - frames[0][0]
+        fps = min(30.0, max(1.0, (len(frames) - 1) / duration)) if duration > 0 else 10.0
+
+        writer = None
+        size = None
+        for _, jpeg, detections in frames:
+            img = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                continue
+            if annotate is not None and detections is not None:
+                img = annotate(img, detections)
+            if writer is None:
+                size = (img.shape[1], img.shape[0])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writer = self._open_writer(path, fps, size)
+                if writer is None:
+                    return False
+            elif (img.shape[1], img.shape[0]) != size:
+                img = cv2.resize(img, size)
+            writer.write(img)
+        if writer is None:
+            return False
+        writer.release()
+        self._to_h264(path)
+        logger.info(f"Saved clip {os.path.basename(path)} ({len(frames)} frames @ {fps:.1f} fps)")
+        return True
+
+    def get_stats(self) -> Dict:
+        return {"pending": self._queue.qsize(), "encoded": self.encoded, "failed": self.failed,
+                "dropped": self.dropped,
+                "codec": self.fourcc, "transcoded": self.transcoded}
+
+
+_ENCODER = ClipEncoder()
+
+
+class ClipRecorder:
+    """
+    Per-stream pre-event buffer of already JPEG-compressed frames.
+
+    Frames are sampled at up to CLIP_FPS and kept for CLIP_PRE_SECONDS, never exceeding
+    CLIP_BUFFER_MB (oldest frames go first), so memory per camera is fixed regardless
+    of resolution. Frames are stored clean, next to their detections; drawing happens
+    only for clips that are actually encoded. trigger() snapshots the buffer and keeps
+    appending for CLIP_POST_SECONDS; the finished clip is encoded on the shared ClipEncoder.
+    """
+
+    def __init__(self, source_id: int, encoder: ClipEncoder = None, annotate: Optional[Callable] = None):
+        self.source_id = source_id
+        self.encoder = encoder or _ENCODER
+        self.annotate = annotate
+
+        # --- Tuning ---
+        self.PRE_SECONDS = float(os.getenv("CLIP_PRE_SECONDS", "5"))
+        self.POST_SECONDS = float(os.getenv("CLIP_POST_SECONDS", "5"))
+        self.FPS = float(os.getenv("CLIP_FPS", "10"))
+        self.JPEG_QUALITY = int(os.getenv("CLIP_JPEG_QUALITY", "70"))
+        self.MAX_BYTES = int(float(os.getenv("CLIP_BUFFER_MB", "4")) * 1024 * 1024)
+
+        self._frames = deque()  # (timestamp, jpeg_bytes, detections)
+        self._bytes = 0
+        self._last_ts = None
+        self._active: List[Dict] = []  # clips still collecting post-event frames
+        self.lock = threading.Lock()
+
+    def wants_frame(self, timestamp: float) -> bool:
+        """True if a frame at this time would be sampled (lets the caller skip work)."""
+        return self._last_ts is None or timestamp - self._last_ts >= 1.0 / self.FPS
+
+    def push(self, frame, timestamp: float, detections=None):
+        if not self.wants_frame(timestamp):
+            return
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.JPEG_QUALITY])
+        if not ok:
+            return
+        jpeg = buf.tobytes()
+        finished = []
+        with self.lock:
+            self._last_ts = timestamp
+            self._frames.append((timestamp, jpeg, detections))
+            self._bytes += len(jpeg)
+            # Trim to the pre-event window and the byte budget
+            while self._frames and (self._bytes > self.MAX_BYTES
+                                    or timestamp - self._frames[0][0] > self.PRE_SECONDS):
+                _, old, _ = self._frames.popleft()
+                self._bytes -= len(old)
+
+            for clip in self._active:
+                if clip["bytes"] + len(jpeg) <= self.MAX_BYTES:
+                    clip["frames"].append((timestamp, jpeg, detections))
+                    clip["bytes"] += len(jpeg)
+                if timestamp >= clip["until"]:
+                    finished.append(clip)
+            for clip in finished:
+                self._active.remove(clip)
+
+        for clip in finished:
+            self.encoder.submit(clip["path"], clip["frames"], clip["on_done"], self.annotate)
+
+    def trigger(self, name: str, timestamp: float, on_done: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Start a clip around `timestamp`. Returns the clip path it will be written to;
+        on_done(path) runs on the encoder thread once the file exists.
+        """
+        path = os.path.join(CLIP_DIR, name)
+        with self.lock:
+            frames = list(self._frames)
+            self._active.append({
+                "path": path,
+                "frames": frames,
+                "bytes": sum(len(j) for _, j, _ in frames),
+                "until": timestamp + self.POST_SECONDS,
+                "on_done": on_done,
+            })
+        return path
+
+    def flush(self):
+        """Encode clips still waiting for post-event frames (stream stopping)."""
+        with self.lock:
+            pending, self._active = self._active, []
+        for clip in pending:
+            self.encoder.submit(clip["path"], clip["frames"], clip["on_done"], self.annotate)
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            span = (self._frames[-1][0] - self._frames[0][0]) if len(self._frames) > 1 else 0.0
+            return {
+                "buffered_frames": len(self._frames),
+                "buffered_seconds": round(span, 2),
+                "buffered_kb": self._bytes // 1024,
+                "budget_kb": self.MAX_BYTES // 1024,
+                "recording": len(self._active),
+                "encoder": self.encoder.get_stats(),
+            }
@@ -1,17 +1,56 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import logging
-from collections import deque
 import time
 import os
 from .notifications import TelegramBot
+from . import inference, model_backends
+from .tracking import StreamTracker
+from .motion import MotionGate
+from .roi import RoiInference
+from .track_history import TrackHistory
 import threading
 
 logger = logging.getLogger(__name__)
 
 _MODEL_CACHE = {}
 _MODEL_CACHE_LOCK = threading.Lock()
+# The ultralytics predictor keeps per-call state, so calls on a shared model must
+# not overlap (unbatched callers and the batching scheduler both take this lock).
+_MODEL_INFER_LOCKS = {}
+
+# Per-detection state in FrameDetections.status
+STATUS_NORMAL = 0
+STATUS_PENDING = 1     # fall candidate waiting for confirmation
+STATUS_FALL = 2        # confirmed fall, event already sent (cooldown)
+STATUS_CONFIRMED = 3   # confirmed fall that emitted an event on this frame
+
+
+class FrameDetections:
+    """
+    Compact per-frame output of FallDetector: everything needed to draw overlays or
+    report events, without holding on to the ultralytics Results object.
+    Boxes are xywh (center) in 480p frame coordinates.
+    """
+
+    __slots__ = ("boxes", "track_ids", "kpts_xy", "kpts_conf", "status", "scores", "reasons",
+                 "events", "draw_skeleton")
+
+    def __init__(self, boxes=None, track_ids=None, kpts_xy=None, kpts_conf=None, status=None,
+                 scores=None, reasons=None, events=None, draw_skeleton=False):
+        self.boxes = boxes if boxes is not None else np.zeros((0, 4), dtype=np.float32)
+        self.track_ids = track_ids if track_ids is not None else np.zeros(0, dtype=np.int32)
+        self.kpts_xy = kpts_xy
+        self.kpts_conf = kpts_conf
+        n = len(self.track_ids)
+        self.status = status if status is not None else np.zeros(n, dtype=np.int8)
+        self.scores = scores if scores is not None else np.zeros(n, dtype=np.float64)
+        self.reasons = reasons if reasons is not None else [""] * n
+        self.events = events if events is not None else []
+        self.draw_skeleton = draw_skeleton
+
+    def __len__(self):
+        return len(self.track_ids)
 
 
 class FallDetector:
@@ -20,22 +59,41 @@ class FallDetector:
         (11, 13), (13, 15), (12, 14), (14, 16),
         (5, 6), (11, 12), (5, 11), (6, 12)
     )
+    # Skeleton draw config
+    KPT_CONF_THR = 0.35
 
-    def __init__(self, model_path='yolov8n-pose.pt', telegram_config=None):
+    def __init__(self, model_path='yolov8n-pose.pt', telegram_config=None, use_batching=None, tracker=None,
+                 backend=None, imgsz=640):
         global _MODEL_CACHE
 
+        self.backend = model_backends.normalize_backend(backend)
+        self.IMGSZ = imgsz
+        cache_key = model_backends.model_key(model_path, self.backend, imgsz)
+
         with _MODEL_CACHE_LOCK:
-            if model_path not in _MODEL_CACHE:
-                logger.info(f"Loading YOLO model: {model_path}")
-                _MODEL_CACHE[model_path] = YOLO(model_path)
+            if cache_key not in _MODEL_CACHE:
+                logger.info(f"Loading YOLO model: {model_path} (backend={self.backend}, imgsz={imgsz})")
+                _MODEL_CACHE[cache_key] = model_backends.load_model(model_path, self.backend, imgsz)
+                _MODEL_INFER_LOCKS[cache_key] = threading.Lock()
             else:
-                logger.info(f"Using cached YOLO model: {model_path}")
+                logger.info(f"Using cached YOLO model: {cache_key}")
+
+        # Weights are shared across streams; tracker state is not.
+        self.model = _MODEL_CACHE[cache_key]
+        self._infer_lock = _MODEL_INFER_LOCKS[cache_key]
+        self.tracker = tracker if tracker is not None else StreamTracker()
 
-        self.model = _MODEL_CACHE[model_path]
+        # Cross-stream batching: frames go through the shared scheduler
+        if use_batching is None:
+            use_batching = inference.batching_enabled()
+        self.scheduler = (inference.get_scheduler(cache_key, self.model, imgsz, lock=self._infer_lock)
+                          if use_batching else None)
 
         # --- Only store what velocity needs ---
-        # {track_id: deque([(ts, y_center, height), ...])}
-        self.track_history = {}
+        # (ts, y_center, height) ring buffers, one row per track slot. Tracks that
+        # disappear are evicted after TRACK_STATE_TTL_SECONDS along with their
+        # cooldown/pending entries, so per-stream state stays bounded.
+        self.track_history = TrackHistory(capacity=60, on_evict=self._forget_track)
         self.fall_cooldown = {}
         self.COOLDOWN_SECONDS = 5.0
         self.FALL_CONFIDENCE_THRESHOLD = 0.8
@@ -61,15 +119,21 @@ class FallDetector:
 
         # Optimization
         self.frame_count = 0
-        self.SKIP_FRAMES = 2  # process 1, skip 2
+        self.SKIP_FRAMES = 2  # process 1, skip 2 (retuned at runtime by AdaptiveRateController)
         self.last_results = None
+        self.last_infer_ms = 0.0
+        # Smoothed measurements used by the adaptive rate controller
+        self.infer_ms_ema = 0.0
+        self.input_fps = 0.0
+        self._last_frame_time = None
+        # Motion gate: idle scenes drop to a heartbeat inference rate
+        self.motion_gate = MotionGate()
+        # Track-focused ROI inference between full-frame passes (ROI_INFERENCE=1)
+        self.roi = RoiInference()
 
         # 480p processing target
         self.TARGET_H = 480
 
-        # Skeleton draw config
-        self.KPT_CONF_THR = 0.35
-
     def set_night_mode(self, enabled: bool):
         self.night_mode = enabled
         if enabled and self._clahe is None:
@@ -99,20 +163,45 @@ class FallDetector:
         limg = cv2.merge((l, a, b))
         return cv2.cvtColor(limg, cv2.COLOR_LAB2BGR)
 
-    def process_frame(self, frame):
+    def process_frame(self, frame, current_time=None, frame_index=None):
         """
         Returns: (annotated_frame, events)
         Note: annotated_frame is on 480p-resized image.
+        current_time: override the wall clock (e.g. video timestamp when replaying a file).
+        frame_index: position in the source stream; when given it drives the SKIP_FRAMES
+        cadence instead of the count of frames seen, so the stream can skip decoding.
+        """
+        frame_480, detections = self.detect(frame, current_time, frame_index)
+        return self.annotate(frame_480, detections), detections.events
+
+    def wants_frame(self, frame_index):
+        """True if the frame at this stream position would be an inference frame."""
+        return frame_index % (self.SKIP_FRAMES + 1) == 0
+
+    def detect(self, frame, current_time=None, frame_index=None):
+        """
+        Inference + fall heuristics without any drawing.
+        Returns: (frame_480, FrameDetections)
         """
         self.frame_count += 1
-        current_time = time.time()
+        cadence_index = self.frame_count if frame_index is None else frame_index
+        if current_time is None:
+            current_time = time.time()
+        self._update_input_fps(current_time)
 
         frame_480 = self._resize_to_480h(frame)
 
         # Skip inference frames: only draw cached last_results
-        if (self.frame_count % (self.SKIP_FRAMES + 1) != 0) and (self.last_results is not None):
-            return self._draw_results(
-                frame_480,
+        if (cadence_index % (self.SKIP_FRAMES + 1) != 0) and (self.last_results is not None):
+            return frame_480, self._analyze(
+                self.last_results,
+                current_time=current_time,
+                draw_skeleton=False,
+                emit_events=False
+            )
+
+        if not self.motion_gate.should_infer(frame_480, current_time, self._has_activity()):
+            return frame_480, self._analyze(
                 self.last_results,
                 current_time=current_time,
                 draw_skeleton=False,
@@ -121,38 +210,137 @@ class FallDetector:
 
         processed = self._preprocess_frame(frame_480)
 
-        results = self.model.track(
-            processed,
-            persist=True,
-            verbose=False,
-            classes=[0],
-            imgsz=640
-        )
+        t_infer = time.perf_counter()
+        track_boxes = self._track_boxes()
+        motion_outside = False
+        if self.roi.enabled and len(track_boxes):
+            # Someone moving away from the known tracks needs a full-frame pass to be found
+            roi_rects = [self.roi.expand(b, processed.shape) for b in track_boxes]
+            motion_outside = self.motion_gate.motion_outside(roi_rects)
+        crops = self.roi.plan(current_time, track_boxes, processed.shape, motion_outside)
+        if crops is None:
+            results = self._infer([processed], self.IMGSZ)[0]
+        else:
+            crop_imgs = [processed[y1:y2, x1:x2] for (x1, y1, x2, y2) in crops]
+            crop_results = self._infer(crop_imgs, self.roi.IMGSZ)
+            results = self.roi.merge(processed, crops, track_boxes, crop_results, self.model.names)
+        results = self.tracker.update(results, processed)
+        self.last_infer_ms = (time.perf_counter() - t_infer) * 1000.0
+        self.infer_ms_ema = self.last_infer_ms if self.infer_ms_ema == 0.0 else (0.9 * self.infer_ms_ema + 0.1 * self.last_infer_ms)
 
         self.last_results = results
-        return self._draw_results(
-            frame_480,
+        return frame_480, self._analyze(
             results,
             current_time=current_time,
             draw_skeleton=True,
             emit_events=True
         )
 
-    def _draw_results(self, frame, results, current_time=None, draw_skeleton=True, emit_events=True):
-        annotated = frame.copy()
-        events = []
-
+    def detect_batch(self, frames, timestamps):
+        """
+        Offline path: infer every given frame (one batched model call), then track and
+        run the heuristics frame by frame in order. No skip cadence, motion gate or ROI.
+        Returns [(frame_480, FrameDetections)] in input order.
+        """
+        frames_480 = [self._resize_to_480h(f) for f in frames]
+        processed = [self._preprocess_frame(f) for f in frames_480]
+
+        t_infer = time.perf_counter()
+        batch_results = self._infer(processed, self.IMGSZ)
+        self.last_infer_ms = (time.perf_counter() - t_infer) * 1000.0 / max(1, len(frames))
+
+        out = []
+        for frame_480, img, results, ts in zip(frames_480, processed, batch_results, timestamps):
+            self.frame_count += 1
+            results = self.tracker.update(results, img)
+            self.last_results = results
+            out.append((frame_480, self._analyze(results, current_time=ts, draw_skeleton=True, emit_events=True)))
+        return out
+
+    def _infer(self, images, imgsz):
+        """Run the pose model on a list of images; returns one Results list per image."""
+        if self.scheduler is not None:
+            return self.scheduler.infer_many(images, imgsz=imgsz)
+        with self._infer_lock:
+            results = self.model.predict(
+                images,
+                verbose=False,
+                classes=[0],
+                imgsz=imgsz
+            )
+        return [[r] for r in results]
+
+    def _track_boxes(self):
+        """xyxy boxes of the currently tracked people (frame coordinates)."""
+        r = self.last_results
+        if not r or r[0].boxes is None or r[0].boxes.id is None or len(r[0].boxes) == 0:
+            return np.zeros((0, 4), dtype=np.float32)
+        return r[0].boxes.xyxy.cpu().numpy()
+
+    def _update_input_fps(self, now):
+        last, self._last_frame_time = self._last_frame_time, now
+        if last is None or now <= last:
+            return
+        fps = 1.0 / (now - last)
+        self.input_fps = fps if self.input_fps == 0.0 else (0.95 * self.input_fps + 0.05 * fps)
+
+    def scene_state(self, now=None):
+        """'pending' > 'active' > 'motion' > 'idle', used to prioritise inference budget."""
+        if self.pending_falls:
+            return "pending"
+        if self._has_activity():
+            return "active"
+        if not self.motion_gate.is_idle(time.time() if now is None else now):
+            return "motion"
+        return "idle"
+
+    def _has_activity(self):
+        """True while people are tracked or a fall is waiting for confirmation."""
+        if self.pending_falls:
+            return True
+        r = self.last_results
+        return bool(r) and r[0].boxes is not None and r[0].boxes.id is not None and len(r[0].boxes) > 0
+
+    def get_rate_inputs(self):
+        """Measurements the adaptive rate controller needs for this stream."""
+        cost = self.infer_ms_ema
+        if self.scheduler is not None:
+            # Batched: the per-frame share of the batch, not the latency incl. queue wait
+            per_frame = self.scheduler.get_stats()["batch_infer_ms"]["per_frame"]
+            if per_frame > 0:
+                cost = per_frame
+        return {
+            "source_fps": self.input_fps,
+            "cost_ms": cost,
+            "state": self.scene_state(),
+            "heartbeat_s": self.motion_gate.HEARTBEAT_SECONDS,
+        }
+
+    def _forget_track(self, track_id: int):
+        self.fall_cooldown.pop(track_id, None)
+        self.pending_falls.pop(track_id, None)
+
+    def get_stats(self):
+        return {
+            "tracker": self.tracker.get_stats(),
+            "track_state": self.track_history.get_stats(),
+            "motion_gate": self.motion_gate.get_stats(),
+            "roi": self.roi.get_stats(),
+        }
+
+    def _analyze(self, results, current_time=None, draw_skeleton=True, emit_events=True):
+        """Run the fall heuristics over one frame's Results and return FrameDetections."""
         if current_time is None:
             current_time = time.time()
 
         if not results or results[0].boxes is None or results[0].boxes.xywh is None:
-            return annotated, events
+            return FrameDetections()
 
         r0 = results[0]
         boxes = r0.boxes.xywh.cpu().numpy()
         track_ids = r0.boxes.id
         if track_ids is None:
-            return annotated, events
+            return FrameDetections()
         track_ids = track_ids.int().cpu().numpy()
 
         kpts_xy = None
@@ -163,81 +351,84 @@ class FallDetector:
             if hasattr(r0.keypoints, "conf") and r0.keypoints.conf is not None:
                 kpts_conf = r0.keypoints.conf.cpu().numpy()
 
-        for i, track_id in enumerate(track_ids):
-            bbox = boxes[i]
-            x, y, w, h = bbox
-            x1, y1 = int(x - w / 2), int(y - h / 2)
-            x2, y2 = int(x + w / 2), int(y + h / 2)
-
-            color = (0, 255, 0)
-            is_fall = False
-            score = 0.0
-            reason = ""
+        n = len(track_ids)
+        status = np.zeros(n, dtype=np.int8)
+        scores = np.zeros(n, dtype=np.float64)
+        reasons = [""] * n
+        events = []
 
-            if emit_events and (kpts_xy is not None) and i < len(kpts_xy):
-                kpts = kpts_xy[i]
+        if emit_events and kpts_xy is not None:
+            m = min(n, len(kpts_xy))
+            ids = track_ids[:m]
 
-                # Update minimal history for velocity
-                if track_id not in self.track_history:
-                    self.track_history[track_id] = deque(maxlen=60)
-                self.track_history[track_id].append((current_time, float(y), float(h)))
+            # Update minimal history for velocity
+            slots = self.track_history.append(ids, current_time, boxes[:m, 1], boxes[:m, 3])
+            self.track_history.evict_stale(current_time)
 
-                is_fall, score, reason = self._detect_fall(track_id, kpts, bbox, current_time)
+            falls, scores[:m], reasons[:m] = self._detect_falls(ids, slots, kpts_xy[:m], boxes[:m], current_time)
 
-                if is_fall:
-                    color = (0, 0, 255)
-                    last_fall = self.fall_cooldown.get(int(track_id), 0.0)
+            for i in range(m):
+                if falls[i]:
+                    track_id = int(track_ids[i])
+                    status[i] = STATUS_FALL
+                    last_fall = self.fall_cooldown.get(track_id, 0.0)
                     if current_time - last_fall > self.COOLDOWN_SECONDS:
-                        self.fall_cooldown[int(track_id)] = current_time
+                        self.fall_cooldown[track_id] = current_time
+                        status[i] = STATUS_CONFIRMED
 
                         event_data = {
-                            "track_id": int(track_id),
-                            "fall_score": float(score),
+                            "track_id": track_id,
+                            "fall_score": float(scores[i]),
                             "is_fall": True,
                             "timestamp": current_time,
-                            "reason": reason
+                            "reason": reasons[i]
                         }
                         events.append(event_data)
+                elif reasons[i] == "Pending":
+                    status[i] = STATUS_PENDING
+
+        return FrameDetections(boxes, track_ids, kpts_xy, kpts_conf, status, scores, reasons, events, draw_skeleton)
 
-                        cv2.putText(
-                            annotated,
-                            f"FALL CONFIRMED! ({reason})",
-                            (x1, max(0, y1 - 10)),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.8,
-                            (0, 0, 255),
-                            2
-                        )
-
-                        # Optional: send snapshot
-                        try:
-                            if hasattr(self.telegram_bot, "send_photo"):
-                                ok, buf = cv2.imencode(".jpg", annotated, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
-                                if ok:
-                                    self.telegram_bot.send_photo(
-                                        caption=f"📸 Fall Snapshot (CONFIRMED)\nTrack ID: {int(track_id)}\nScore: {score:.2f}\nReason: {reason}",
-                                        photo_bytes=buf.tobytes()
-                                    )
-                        except Exception as e:
-                            logger.debug(f"Snapshot send skipped/failed: {e}")
-
-                # If pending, show hint (optional, very light)
-                elif reason == "Pending":
-                    cv2.putText(
-                        annotated,
-                        "FALL? (pending confirm)",
-                        (x1, max(0, y1 - 10)),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.6,
-                        (0, 165, 255),
-                        2
-                    )
+    @classmethod
+    def annotate(cls, frame, detections):
+        """Draw boxes, IDs, fall labels and skeletons on a copy of the frame."""
+        annotated = frame.copy()
+        det = detections
+
+        for i in range(len(det)):
+            x, y, w, h = det.boxes[i]
+            x1, y1 = int(x - w / 2), int(y - h / 2)
+            x2, y2 = int(x + w / 2), int(y + h / 2)
+            st = det.status[i]
+            color = (0, 0, 255) if st >= STATUS_FALL else (0, 255, 0)
+
+            if st == STATUS_CONFIRMED:
+                cv2.putText(
+                    annotated,
+                    f"FALL CONFIRMED! ({det.reasons[i]})",
+                    (x1, max(0, y1 - 10)),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.8,
+                    (0, 0, 255),
+                    2
+                )
+            # If pending, show hint (optional, very light)
+            elif st == STATUS_PENDING:
+                cv2.putText(
+                    annotated,
+                    "FALL? (pending confirm)",
+                    (x1, max(0, y1 - 10)),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.6,
+                    (0, 165, 255),
+                    2
+                )
 
             # Draw bbox + ID
             cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
             cv2.putText(
                 annotated,
-                f"ID: {int(track_id)}",
+                f"ID: {int(det.track_ids[i])}",
                 (x1, max(0, y1 - 30)),
                 cv2.FONT_HERSHEY_SIMPLEX,
                 0.6,
@@ -246,168 +437,181 @@ class FallDetector:
             )
 
             # Draw skeleton only when useful
-            if draw_skeleton and (kpts_xy is not None) and i < len(kpts_xy):
-                if is_fall or score >= 0.6:
-                    conf_row = (kpts_conf[i] if kpts_conf is not None and i < len(kpts_conf) else None)
-                    self._draw_skeleton_fast(annotated, kpts_xy[i], color, conf_row)
+            if det.draw_skeleton and (det.kpts_xy is not None) and i < len(det.kpts_xy):
+                if st >= STATUS_FALL or det.scores[i] >= 0.6:
+                    conf_row = (det.kpts_conf[i] if det.kpts_conf is not None and i < len(det.kpts_conf) else None)
+                    cls._draw_skeleton_fast(annotated, det.kpts_xy[i], color, conf_row)
 
-        return annotated, events
+        return annotated
 
-    def _posture(self, angle_deg: float, aspect_ratio: float):
+    @classmethod
+    def serialize(cls, detections, scale: float = 1.0):
         """
-        Classify posture roughly using hysteresis-like thresholds.
+        Overlay data for client-side drawing (the JSON counterpart of annotate()).
+        Boxes are [x1, y1, x2, y2] and keypoints a flat [x0, y0, x1, y1, ...] list, both
+        in pixels of the frame scaled by `scale`; keypoints below KPT_CONF_THR are -1.
+        """
+        det = detections
+        n = len(det)
+        corners = np.empty((n, 4), dtype=np.float32)
+        corners[:, :2] = det.boxes[:, :2] - det.boxes[:, 2:] / 2
+        corners[:, 2:] = det.boxes[:, :2] + det.boxes[:, 2:] / 2
+        kpts = None
+        if det.kpts_xy is not None and len(det.kpts_xy):
+            m = min(n, len(det.kpts_xy))
+            pts = np.rint(det.kpts_xy[:m] * scale).astype(np.int32)
+            if det.kpts_conf is not None:
+                valid = det.kpts_conf[:m] > cls.KPT_CONF_THR
+            else:
+                valid = (det.kpts_xy[:m, :, 0] != 0) & (det.kpts_xy[:m, :, 1] != 0)
+            pts[~valid] = -1
+            kpts = pts.reshape(m, -1).tolist()
+        return {
+            "boxes": np.rint(corners * scale).astype(np.int32).tolist(),
+            "ids": det.track_ids.astype(int).tolist(),
+            "status": det.status.astype(int).tolist(),
+            "scores": np.round(det.scores, 2).tolist(),
+            "reasons": list(det.reasons),
+            "kpts": kpts,
+            "fresh": bool(det.draw_skeleton),  # False on frames that reuse the last inference
+        }
+
+    def _posture(self, angle_deg, aspect_ratio):
+        """
+        Classify posture roughly using hysteresis-like thresholds (scalars or arrays).
         - upright: clearly standing/sitting upright
         - lying: clearly horizontal / fallen
         """
-        upright = (angle_deg < 35.0) and (aspect_ratio < 1.15)
-        lying = (angle_deg > 60.0) or (aspect_ratio > 1.65)
+        upright = (angle_deg < 35.0) & (aspect_ratio < 1.15)
+        lying = (angle_deg > 60.0) | (aspect_ratio > 1.65)
         return upright, lying
 
-    def _detect_fall(self, track_id, keypoints, bbox, current_time: float):
+    def _detect_falls(self, track_ids, slots, kpts_xy, boxes, current_time: float):
         """
-        Returns (is_fall_confirmed, score, reason)
+        Fall heuristics for all tracks of a frame at once.
+        track_ids/slots: (N,), kpts_xy: (N, 17, 2), boxes: (N, 4) xywh.
+        Returns (is_fall_confirmed[N], score[N], reason[N]).
         Uses pending confirmation window to avoid sit->stand false positives.
         """
-        w, h = float(bbox[2]), float(bbox[3])
-        if h <= 1e-6:
-            return False, 0.0, ""
-
-        aspect_ratio = w / h
-
-        if keypoints is None or len(keypoints) < 13:
-            return False, 0.0, ""
-
-        l_shoulder, r_shoulder = keypoints[5], keypoints[6]
-        l_hip, r_hip = keypoints[11], keypoints[12]
-
-        # Must have meaningful points
-        if (l_shoulder[0] <= 0 and l_shoulder[1] <= 0) or (l_hip[0] <= 0 and l_hip[1] <= 0):
-            return False, 0.0, ""
+        n = len(track_ids)
+        is_fall = np.zeros(n, dtype=bool)
+        scores = np.zeros(n, dtype=np.float64)
+        reasons = [""] * n
+        if n == 0 or kpts_xy.shape[1] < 13:
+            return is_fall, scores, reasons
+
+        w = boxes[:, 2].astype(np.float64)
+        h = boxes[:, 3].astype(np.float64)
+        l_shoulder, r_shoulder = kpts_xy[:, 5], kpts_xy[:, 6]
+        l_hip, r_hip = kpts_xy[:, 11], kpts_xy[:, 12]
+
+        # Must have a usable box and meaningful points
+        valid = (h > 1e-6)
+        valid &= ~((l_shoulder[:, 0] <= 0) & (l_shoulder[:, 1] <= 0))
+        valid &= ~((l_hip[:, 0] <= 0) & (l_hip[:, 1] <= 0))
+        if not valid.any():
+            return is_fall, scores, reasons
+
+        h_safe = np.where(valid, h, 1.0)
+        aspect_ratio = w / h_safe
 
         mid_shoulder = (l_shoulder + r_shoulder) * 0.5
         mid_hip = (l_hip + r_hip) * 0.5
-
-        dx = float(mid_shoulder[0] - mid_hip[0])
-        dy = float(mid_shoulder[1] - mid_hip[1])
-
-        angle_rad = np.arctan2(abs(dx), max(abs(dy), 1e-6))
-        angle_deg = float(np.degrees(angle_rad))
-
-        score = 0.0
-        reason_parts = []
-        pose_indicates_fall = False
-
-        if angle_deg > self.ANGLE_THRESHOLD:
-            score += 0.6
-            reason_parts.append("Angle")
-            pose_indicates_fall = True
-
-        if aspect_ratio > self.ASPECT_RATIO_THRESHOLD:
-            score += 0.4
-            reason_parts.append("Ratio")
-            pose_indicates_fall = True
-
-        if not pose_indicates_fall:
-            # If not even candidate, we can still clear pending if recovered long enough (handled below)
-            pass
-
-        has_velocity = self._check_fall_velocity(track_id)
-        if pose_indicates_fall and has_velocity:
-            score += 0.4
-            reason_parts.append("Velocity")
-        elif pose_indicates_fall:
-            head_y = float(keypoints[0][1]) if keypoints[0][1] > 0 else 0.0
-            ground_y = float(bbox[1] + bbox[3] / 2.0)
-            head_relative_height = (ground_y - head_y) / h if h > 0 else 1.0
-
-            if head_relative_height < 0.4:
-                score += 0.3
-                reason_parts.append("HeadLow")
+        dx = (mid_shoulder[:, 0] - mid_hip[:, 0]).astype(np.float64)
+        dy = (mid_shoulder[:, 1] - mid_hip[:, 1]).astype(np.float64)
+        angle_deg = np.degrees(np.arctan2(np.abs(dx), np.maximum(np.abs(dy), 1e-6)))
+
+        angle_hit = valid & (angle_deg > self.ANGLE_THRESHOLD)
+        ratio_hit = valid & (aspect_ratio > self.ASPECT_RATIO_THRESHOLD)
+        pose_indicates_fall = angle_hit | ratio_hit
+        scores += np.where(angle_hit, 0.6, 0.0)
+        scores += np.where(ratio_hit, 0.4, 0.0)
+
+        # Velocity only matters for pose candidates
+        velocity_hit = np.zeros(n, dtype=bool)
+        if pose_indicates_fall.any():
+            velocity_hit[pose_indicates_fall] = self.track_history.max_velocity(slots[pose_indicates_fall]) > 0.5
+        velocity_hit &= pose_indicates_fall
+        scores += np.where(velocity_hit, 0.4, 0.0)
+
+        head_y = np.where(kpts_xy[:, 0, 1] > 0, kpts_xy[:, 0, 1], 0.0).astype(np.float64)
+        ground_y = (boxes[:, 1] + boxes[:, 3] / 2.0).astype(np.float64)
+        head_low = pose_indicates_fall & ~velocity_hit & (((ground_y - head_y) / h_safe) < 0.4)
+        scores += np.where(head_low, 0.3, 0.0)
 
         # Posture classification for confirmation logic
         upright, lying = self._posture(angle_deg, aspect_ratio)
 
-        tid = int(track_id)
-        pend = self.pending_falls.get(tid)
-
         # Define what is a "candidate" to start pending
-        fall_candidate = pose_indicates_fall and (score >= self.FALL_CONFIDENCE_THRESHOLD)
-
-        # Start/update pending if candidate happens
-        if fall_candidate:
-            if pend is None:
-                self.pending_falls[tid] = {
-                    "t0": current_time,
-                    "best_score": float(score),
-                    "reason": ", ".join(reason_parts),
-                    "recovered_since": None
-                }
-                pend = self.pending_falls[tid]
-            else:
-                if score > pend.get("best_score", 0.0):
-                    pend["best_score"] = float(score)
-                    pend["reason"] = ", ".join(reason_parts)
+        fall_candidate = pose_indicates_fall & (scores >= self.FALL_CONFIDENCE_THRESHOLD)
+
+        # Pending-state bookkeeping is per track, but only candidates and tracks
+        # that already have a pending fall need it.
+        for i in range(n):
+            if not valid[i]:
+                scores[i] = 0.0
+                continue
+            tid = int(track_ids[i])
+            pend = self.pending_falls.get(tid)
+            if pend is None and not fall_candidate[i]:
+                continue
+            score = float(scores[i])
+
+            # Start/update pending if candidate happens
+            if fall_candidate[i]:
+                reason = ", ".join(part for part, hit in (
+                    ("Angle", angle_hit[i]), ("Ratio", ratio_hit[i]),
+                    ("Velocity", velocity_hit[i]), ("HeadLow", head_low[i])) if hit)
+                if pend is None:
+                    self.pending_falls[tid] = {
+                        "t0": current_time,
+                        "best_score": score,
+                        "reason": reason,
+                        "recovered_since": None
+                    }
+                    pend = self.pending_falls[tid]
+                elif score > pend.get("best_score", 0.0):
+                    pend["best_score"] = score
+                    pend["reason"] = reason
 
-        # If we have pending, decide confirm/cancel
-        if pend is not None:
             # If upright => count recovered time and potentially cancel
-            if upright:
+            if upright[i]:
                 if pend.get("recovered_since") is None:
                     pend["recovered_since"] = current_time
                 if (current_time - pend["recovered_since"]) >= self.RECOVER_CLEAR_SECONDS:
                     # Cancel: person stood back up (sit->stand, stumble recovery, etc.)
-                    best = float(pend.get("best_score", score))
+                    scores[i] = float(pend.get("best_score", score))
+                    reasons[i] = "Recovered"
                     del self.pending_falls[tid]
-                    return False, best, "Recovered"
+                    continue
             else:
                 # Not upright => reset recovered timer
                 pend["recovered_since"] = None
 
             # Confirm only if lying and has persisted long enough
-            if lying and (current_time - pend["t0"]) >= self.CONFIRM_SECONDS:
-                best_score = float(pend.get("best_score", score))
-                best_reason = pend.get("reason", ", ".join(reason_parts))
+            if lying[i] and (current_time - pend["t0"]) >= self.CONFIRM_SECONDS:
+                scores[i] = float(pend.get("best_score", score))
+                reasons[i] = pend.get("reason", "")
+                is_fall[i] = True
                 del self.pending_falls[tid]
-                return True, best_score, f"{best_reason}"
-
-            # Still pending
-            return False, float(pend.get("best_score", score)), "Pending"
-
-        # No pending and not confirmed
-        return False, score, ""
-
-    def _check_fall_velocity(self, track_id):
-        history = self.track_history.get(track_id)
-        if not history or len(history) < 6:
-            return False
-
-        hist = list(history)
-        max_v_norm = 0.0
-
-        for i in range(len(hist) - 1, 5, -1):
-            t_curr, y_curr, h_curr = hist[i]
-            t_prev, y_prev, _ = hist[i - 5]
-
-            dt = t_curr - t_prev
-            if dt <= 1e-6 or h_curr <= 1e-6:
                 continue
 
-            dy = (y_curr - y_prev)  # positive = down
-            v_norm = (dy / dt) / h_curr  # heights/sec
-            if v_norm > max_v_norm:
-                max_v_norm = v_norm
+            # Still pending
+            scores[i] = float(pend.get("best_score", score))
+            reasons[i] = "Pending"
 
-        return max_v_norm > 0.5
+        return is_fall, scores, reasons
 
-    def _draw_skeleton_fast(self, frame, kpts_xy, color, kpts_conf=None):
+    @classmethod
+    def _draw_skeleton_fast(cls, frame, kpts_xy, color, kpts_conf=None):
         pts = kpts_xy.astype(np.int32, copy=False)
 
         if kpts_conf is not None:
-            valid = kpts_conf > self.KPT_CONF_THR
+            valid = kpts_conf > cls.KPT_CONF_THR
         else:
             valid = (pts[:, 0] != 0) & (pts[:, 1] != 0)
 
-        for p1, p2 in self._SKELETON:
+        for p1, p2 in cls._SKELETON:
             if valid[p1] and valid[p2]:
                 cv2.line(
                     frame,
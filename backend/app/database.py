@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -66,6 +66,7 @@ class FallEventModel(Base):
     is_fall = Column(Boolean, default=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
     snapshot_path = Column(String, nullable=True)
+    clip_path = Column(String, nullable=True)
     
     # New columns for resolution tracking
     is_resolved = Column(Boolean, default=False)
@@ -77,8 +78,41 @@ class FallEventModel(Base):
     source = relationship("VideoSourceModel")
 
 
+class NotificationModel(Base):
+    """Outbound notification queue (outbox); delivered by NotificationDispatcher."""
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("fall_events.id", ondelete="CASCADE"), nullable=True, index=True)
+    kind = Column(String)  # 'message', 'photo', 'video'
+    bot_token = Column(String, nullable=True)
+    chat_id = Column(String, nullable=True)
+    payload = Column(Text)  # JSON: caption/text, file path, reply_markup, ...
+    status = Column(String, default="pending", index=True)  # pending, sent, failed, dropped
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+
+def _add_missing_columns():
+    """create_all() does not alter existing tables; add nullable columns introduced later."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
 
 
 def get_db():
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG_BIN) is not None and shutil.which(FFPROBE_BIN) is not None
+
+
+class FFmpegCapture:
+    """
+    cv2.VideoCapture-compatible reader backed by an ffmpeg subprocess.
+
+    ffmpeg decodes and scales to target_h (same rounding as FallDetector._resize_to_480h),
+    optionally drops frames with an fps filter, and writes raw BGR24 to a pipe, which is
+    read straight into the caller's buffer (read(image)), or into a small pool of
+    preallocated buffers. A pooled frame stays valid until `buffers` more frames have
+    been read.
+    """
+
+    def __init__(self, source_url: str, target_h: int = 480, max_fps: float = 0.0, buffers: int = 8,
+                 timeout: float = None):
+        self.source_url = source_url
+        # Open/IO timeout in seconds for network sources (None = ffmpeg default)
+        self.timeout = timeout
+        self.target_h = target_h
+        self.max_fps = max_fps or 0.0
+        self.n_buffers = buffers
+
+        self._proc = None
+        self._stderr = deque(maxlen=20)
+        self._buffers = []
+        self._next = 0
+        self.width = 0
+        self.height = 0
+        self.src_width = 0
+        self.src_height = 0
+        self.fps = 0.0
+        self.frames_read = 0
+
+        try:
+            self._probe()
+            self._start()
+        except Exception as e:
+            logger.error(f"ffmpeg capture failed to open {source_url}: {e}")
+            self.release()
+
+    def _input_args(self):
+        url = self.source_url
+        if url.isdigit():
+            return ["-f", "v4l2", "-i", f"/dev/video{url}"]
+        args = []
+        if url.startswith("rtsp://"):
+            args += ["-rtsp_transport", "tcp"]
+            if self.timeout:
+                args += ["-timeout", str(int(self.timeout * 1e6))]  # microseconds
+        elif self.timeout and "://" in url:
+            args += ["-rw_timeout", str(int(self.timeout * 1e6))]
+        return args + ["-i", url]
+
+    def _probe(self):
+        cmd = [FFPROBE_BIN, "-v", "error", "-select_streams", "v:0",
+               "-show_entries", "stream=width,height,avg_frame_rate", "-of", "json"] + self._input_args()
+        out = subprocess.run(cmd, capture_output=True, timeout=(self.timeout or 15) + 5, check=True).stdout
+        stream = json.loads(out)["streams"][0]
+        self.src_width, self.src_height = int(stream["width"]), int(stream["height"])
+        num, _, den = stream.get("avg_frame_rate", "0/1").partition("/")
+        self.fps = float(num) / float(den) if den and float(den) else 0.0
+
+        self.height = self.target_h
+        self.width = int(self.src_width * (self.target_h / float(self.src_height)))
+        if self.max_fps and self.fps:
+            self.fps = min(self.fps, self.max_fps)
+
+    def _start(self):
+        filters = []
+        if self.max_fps:
+            filters.append(f"fps={self.max_fps:g}")
+        filters.append(f"scale={self.width}:{self.height}:flags=area")
+        cmd = ([FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-nostdin"] + self._input_args()
+               + ["-an", "-sn", "-vf", ",".join(filters), "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"])
+        frame_bytes = self.width * self.height * 3
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                      bufsize=frame_bytes)
+        if len(self._buffers) != self.n_buffers or self._buffers[0].shape != (self.height, self.width, 3):
+            self._buffers = [np.empty((self.height, self.width, 3), dtype=np.uint8) for _ in range(self.n_buffers)]
+        threading.Thread(target=self._drain_stderr, args=(self._proc,), daemon=True).start()
+        logger.info(f"ffmpeg capture {self.source_url}: {self.src_width}x{self.src_height} -> "
+                    f"{self.width}x{self.height}" + (f" @ <= {self.max_fps:g} fps" if self.max_fps else ""))
+
+    def _drain_stderr(self, proc):
+        for line in iter(proc.stderr.readline, b""):
+            self._stderr.append(line.decode(errors="replace").rstrip())
+
+    def isOpened(self) -> bool:
+        return self._proc is not None
+
+    def read(self, image=None):
+        if self._proc is None:
+            return False, None
+        if image is not None and image.shape == (self.height, self.width, 3) and image.flags.c_contiguous:
+            buf = image
+        else:
+            buf = self._buffers[self._next]
+            self._next = (self._next + 1) % self.n_buffers
+        view = memoryview(buf).cast("B")
+        got = 0
+        while got < len(view):
+            n = self._proc.stdout.readinto(view[got:])
+            if not n:
+                if self._proc.poll() not in (None, 0) and self._stderr:
+                    logger.warning(f"ffmpeg ({self.source_url}) exited: {self._stderr[-1]}")
+                return False, None
+            got += n
+        self.frames_read += 1
+        return True, buf
+
+    def grab(self) -> bool:
+        """
+        Consume the next frame without handing it out. ffmpeg has already decoded it, so
+        this only saves the copy; use max_fps to drop frames inside the decoder.
+        """
+        ok, _ = self.read()
+        return ok
+
+    def set(self, prop_id, value) -> bool:
+        # Seeking back to the start (file looping) restarts the decoder
+        if prop_id == cv2.CAP_PROP_POS_FRAMES and value == 0 and self.width:
+            self._stop_proc()
+            self._start()
+            return True
+        return False
+
+    def get(self, prop_id):
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        return 0.0
+
+    def _stop_proc(self):
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        proc.terminate()
+        try:
+            proc.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        proc.stdout.close()
+
+    def release(self):
+        self._stop_proc()
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+FRAME_POLICIES = ("latest", "drop_oldest")
+
+
+class FramePacket:
+    """A frame handed out by FrameRing. `frame` is a view of a ring slot; release it when done."""
+
+    __slots__ = ("frame", "seq", "timestamp", "slot", "generation", "frame_index")
+
+    def __init__(self, frame, seq: int, timestamp: float, slot: int, generation: int, frame_index: int = None):
+        self.frame = frame
+        self.seq = seq
+        self.timestamp = timestamp
+        self.slot = slot
+        self.generation = generation
+        # Position in the source stream, counting frames that were grabbed but not decoded
+        self.frame_index = frame_index
+
+
+class FrameRing:
+    """
+    Preallocated ring of frame buffers shared by one capture thread and its readers.
+
+    The writer asks for a free slot, decodes into it in place and publishes it with a
+    sequence number and capture timestamp. Readers block on a condition variable until
+    a frame is published. A slot handed to a reader is pinned until released, so it is
+    never overwritten while in use.
+
+    Policies:
+    - latest: readers always get the newest frame; unread older frames are dropped.
+    - drop_oldest: readers get frames in order; when every slot is full the oldest
+      unread frame is dropped.
+    """
+
+    def __init__(self, depth: int = 4, policy: str = "latest"):
+        if policy not in FRAME_POLICIES:
+            raise ValueError(f"Unknown frame policy '{policy}'. Choose one of: {', '.join(FRAME_POLICIES)}")
+        self.depth = max(2, int(depth))
+        self.policy = policy
+
+        self._cond = threading.Condition()
+        self._slots = None
+        self._generation = 0
+        self._seq = [0] * self.depth
+        self._ts = [0.0] * self.depth
+        self._index = [0] * self.depth
+        self._pins = [0] * self.depth
+        self._ready = deque()  # published, unread slots, oldest first
+        self._closed = False
+
+        # Counters
+        self.seq = 0
+        self.dropped = 0
+        self.delivered = 0
+        self.last_timestamp = None
+
+    def _allocate(self, shape, dtype):
+        self._slots = [np.empty(shape, dtype=dtype) for _ in range(self.depth)]
+        self._generation += 1
+        self._pins = [0] * self.depth
+        self._ready.clear()
+
+    def acquire_write(self, shape, dtype=np.uint8):
+        """
+        Reserve a slot for the next frame. Returns (slot, buffer), or None if every slot
+        is pinned by readers (the caller should drop that frame).
+        """
+        with self._cond:
+            if self._slots is None or self._slots[0].shape != tuple(shape) or self._slots[0].dtype != dtype:
+                # Readers still holding old slots keep their arrays alive; releases are
+                # matched by generation so they don't touch the new ring.
+                self._allocate(shape, dtype)
+
+            free = [i for i in range(self.depth) if self._pins[i] == 0 and i not in self._ready]
+            if not free:
+                for i in self._ready:
+                    if self._pins[i] == 0:
+                        self._ready.remove(i)
+                        self.dropped += 1
+                        free = [i]
+                        break
+            if not free:
+                return None
+            slot = min(free, key=lambda i: self._seq[i])
+            return slot, self._slots[slot]
+
+    def publish(self, slot: int, timestamp: Optional[float] = None, frame_index: Optional[int] = None):
+        with self._cond:
+            self.seq += 1
+            self._seq[slot] = self.seq
+            self._index[slot] = self.seq if frame_index is None else frame_index
+            self._ts[slot] = time.time() if timestamp is None else timestamp
+            self.last_timestamp = self._ts[slot]
+            if self.policy == "latest":
+                self.dropped += len(self._ready)
+                self._ready.clear()
+            self._ready.append(slot)
+            self._cond.notify_all()
+
+    def read(self, timeout: Optional[float] = None) -> Optional[FramePacket]:
+        """Block until a frame is available (or timeout/close). The slot stays pinned until release()."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._ready or self._closed, timeout):
+                return None
+            if not self._ready:
+                return None
+            slot = self._ready.popleft()
+            self._pins[slot] += 1
+            self.delivered += 1
+            return FramePacket(self._slots[slot], self._seq[slot], self._ts[slot], slot, self._generation,
+                               self._index[slot])
+
+    def drop(self):
+        """Count a captured frame that could not be stored (all slots pinned)."""
+        with self._cond:
+            self.dropped += 1
+
+    def release(self, packet: FramePacket):
+        with self._cond:
+            if packet.generation == self._generation and self._pins[packet.slot] > 0:
+                self._pins[packet.slot] -= 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._closed = False
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "depth": self.depth,
+                "captured": self.seq,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "queued": len(self._ready),
+                "last_capture_age_s": (time.time() - self.last_timestamp) if self.last_timestamp else None,
+            }
@@ -0,0 +1,236 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceRequest:
+    """One frame waiting for a batched model call."""
+
+    __slots__ = ("frame", "imgsz", "submitted_at", "queue_wait", "results", "error", "_done")
+
+    def __init__(self, frame, imgsz=None):
+        self.frame = frame
+        self.imgsz = imgsz
+        self.submitted_at = time.perf_counter()
+        self.queue_wait = 0.0
+        self.results = None
+        self.error = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("Inference request timed out")
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+
+class InferenceScheduler:
+    """
+    Gathers frames from all pipelines sharing a model and runs them as one batch.
+    A batch is flushed when MAX_BATCH frames are queued or the oldest frame has
+    waited MAX_WAIT seconds, whichever comes first.
+    """
+
+    def __init__(self, model, max_batch: int = 8, max_wait: float = 0.02, imgsz: int = 640,
+                 lock: Optional[threading.Lock] = None):
+        self.model = model
+        # The model's per-call lock: unbatched callers (offline analysis) share the predictor
+        self._predict_lock = lock or threading.Lock()
+        self.MAX_BATCH = max(1, int(max_batch))
+        self.MAX_WAIT = max(0.0, float(max_wait))
+        self.imgsz = imgsz
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=500)
+        self._queue_waits = deque(maxlen=2000)
+        self._infer_times = deque(maxlen=500)
+        self.total_batches = 0
+        self.total_frames = 0
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info(f"Inference scheduler started (max_batch={self.MAX_BATCH}, max_wait={self.MAX_WAIT * 1000:.0f}ms)")
+
+    def stop(self):
+        self.running = False
+        self._queue.put(None)  # wake the worker
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        # Fail whatever is still waiting so pipeline threads don't hang
+        while True:
+            try:
+                req = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if req is not None:
+                req.error = RuntimeError("Inference scheduler stopped")
+                req._done.set()
+        logger.info("Inference scheduler stopped")
+
+    def submit(self, frame, imgsz: Optional[int] = None) -> InferenceRequest:
+        req = InferenceRequest(frame, imgsz or self.imgsz)
+        self._queue.put(req)
+        return req
+
+    def infer(self, frame, timeout: Optional[float] = 10.0, imgsz: Optional[int] = None):
+        """Blocking helper: submit a frame and wait for its Results list."""
+        return self.submit(frame, imgsz).wait(timeout)
+
+    def infer_many(self, frames, timeout: Optional[float] = 10.0, imgsz: Optional[int] = None):
+        """Submit several images (e.g. ROI crops) together; returns one Results list per image."""
+        reqs = [self.submit(f, imgsz) for f in frames]
+        return [r.wait(timeout) for r in reqs]
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = first.submitted_at + self.MAX_WAIT
+        while len(batch) < self.MAX_BATCH:
+            remaining = deadline - time.perf_counter()
+            try:
+                req = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if req is None:
+                break
+            batch.append(req)
+        return batch
+
+    def _run(self):
+        while self.running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            for req in batch:
+                req.queue_wait = start - req.submitted_at
+
+            # Full frames and ROI crops use different input sizes; one predict() per size
+            groups = {}
+            for req in batch:
+                groups.setdefault(req.imgsz, []).append(req)
+            for imgsz, group in groups.items():
+                try:
+                    with self._predict_lock:
+                        results = self.model.predict(
+                            [req.frame for req in group],
+                            verbose=False,
+                            classes=[0],
+                            imgsz=imgsz
+                        )
+                    for req, res in zip(group, results):
+                        # Keep the list-of-Results shape returned by model.track()
+                        req.results = [res]
+                except Exception as e:
+                    logger.error(f"Batched inference failed ({len(group)} frames, imgsz={imgsz}): {e}")
+                    for req in group:
+                        req.error = e
+
+            elapsed = time.perf_counter() - start
+            for req in batch:
+                req.frame = None
+                req._done.set()
+
+            with self._stats_lock:
+                self.total_batches += 1
+                self.total_frames += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._infer_times.append(elapsed)
+                self._queue_waits.extend(req.queue_wait for req in batch)
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            waits = sorted(self._queue_waits)
+            times = list(self._infer_times)
+            total_batches = self.total_batches
+            total_frames = self.total_frames
+
+        histogram = {}
+        for s in sizes:
+            histogram[s] = histogram.get(s, 0) + 1
+
+        def _pct(values, p):
+            if not values:
+                return 0.0
+            return values[min(len(values) - 1, int(p * len(values)))]
+
+        return {
+            "max_batch": self.MAX_BATCH,
+            "max_wait_ms": self.MAX_WAIT * 1000.0,
+            "queue_depth": self._queue.qsize(),
+            "total_batches": total_batches,
+            "total_frames": total_frames,
+            "avg_batch_size": (sum(sizes) / len(sizes)) if sizes else 0.0,
+            "batch_size_histogram": dict(sorted(histogram.items())),
+            "queue_wait_ms": {
+                "avg": (sum(waits) / len(waits) * 1000.0) if waits else 0.0,
+                "p50": _pct(waits, 0.50) * 1000.0,
+                "p95": _pct(waits, 0.95) * 1000.0,
+                "max": (waits[-1] * 1000.0) if waits else 0.0,
+            },
+            "batch_infer_ms": {
+                "avg": (sum(times) / len(times) * 1000.0) if times else 0.0,
+                "per_frame": (sum(times) / max(1, sum(sizes)) * 1000.0) if times else 0.0,
+            },
+        }
+
+
+_SCHEDULERS: Dict[str, InferenceScheduler] = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def batching_enabled() -> bool:
+    return os.getenv("INFERENCE_BATCHING", "1").lower() not in ("0", "false", "no")
+
+
+def get_scheduler(model_key: str, model, imgsz: int = 640, lock: Optional[threading.Lock] = None) -> InferenceScheduler:
+    """
+    Return the shared scheduler for a cached model, starting it on first use.
+    lock: the lock every other predict() on this model takes, so calls never overlap.
+    """
+    with _SCHEDULERS_LOCK:
+        scheduler = _SCHEDULERS.get(model_key)
+        if scheduler is None:
+            scheduler = InferenceScheduler(
+                model,
+                max_batch=int(os.getenv("INFERENCE_MAX_BATCH", "8")),
+                max_wait=float(os.getenv("INFERENCE_MAX_WAIT_MS", "20")) / 1000.0,
+                imgsz=imgsz,
+                lock=lock,
+            )
+            scheduler.start()
+            _SCHEDULERS[model_key] = scheduler
+        return scheduler
+
+
+def get_all_stats() -> Dict[str, Dict]:
+    with _SCHEDULERS_LOCK:
+        schedulers = dict(_SCHEDULERS)
+    return {key: s.get_stats() for key, s in schedulers.items()}
+
+
+def stop_all():
+    with _SCHEDULERS_LOCK:
+        schedulers = list(_SCHEDULERS.values())
+        _SCHEDULERS.clear()
+    for s in schedulers:
+        s.stop()
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import math
+import struct
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Binary frame header on the multiplexed socket: source id, rendition sequence (big-endian uint32)
+FRAME_HEADER = struct.Struct(">II")
+
+
+def serialize_event(event) -> Dict:
+    """FallEventModel row -> JSON-safe dict (same fields as schemas.FallEvent, without relations)."""
+    return {
+        "id": event.id,
+        "source_id": event.source_id,
+        "track_id": event.track_id,
+        "fall_score": event.fall_score,
+        "timestamp": event.timestamp.isoformat() if event.timestamp else None,
+        "snapshot_path": event.snapshot_path,
+        "clip_path": event.clip_path,
+        "is_resolved": event.is_resolved,
+        "responder_name": event.responder_name,
+        "responder_id": event.responder_id,
+        "resolved_at": event.resolved_at.isoformat() if event.resolved_at else None,
+    }
+
+
+class EventHub:
+    """
+    Thread-safe fan-out of JSON messages (fall events, pipeline changes) to every
+    multiplexed live connection. Each connection has a small bounded queue; if a client
+    stops reading, its oldest messages are dropped rather than growing memory.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._queues = []  # [(loop, asyncio.Queue)]
+        self._lock = threading.Lock()
+
+    def register(self) -> asyncio.Queue:
+        q = asyncio.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._queues.append((asyncio.get_running_loop(), q))
+        return q
+
+    def unregister(self, q: asyncio.Queue):
+        with self._lock:
+            self._queues = [(loop, other) for loop, other in self._queues if other is not q]
+
+    def publish(self, message: Dict):
+        """Callable from any thread."""
+        with self._lock:
+            targets = list(self._queues)
+        for loop, q in targets:
+            try:
+                loop.call_soon_threadsafe(self._put, q, message)
+            except RuntimeError:
+                self.unregister(q)
+
+    @staticmethod
+    def _put(q: asyncio.Queue, message: Dict):
+        if q.full():
+            q.get_nowait()
+        q.put_nowait(message)
+
+    @property
+    def connections(self) -> int:
+        return len(self._queues)
+
+
+def parse_rendition(msg: Dict) -> Dict:
+    """Rendition fields of a subscribe command as numbers; raises ValueError on bad input."""
+    rendition = {"overlay": msg.get("overlay")}
+    for field, key, cast in (("max_width", "max_width", int), ("quality", "quality", int), ("fps", "max_fps", float)):
+        value = msg.get(field)
+        if value is None:
+            rendition[key] = None
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError(f"'{field}' must be a number")
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValueError(f"'{field}' must be a number") from None
+        if not math.isfinite(number) or number < 0:
+            raise ValueError(f"'{field}' must be a non-negative number")
+        rendition[key] = cast(number)
+    return rendition
+
+
+class LiveSession:
+    """
+    One multiplexed live connection. The client sends JSON commands:
+        {"action": "subscribe", "source_id": 1, "max_width": 320, "quality": 60, "fps": 10,
+         "overlay": "client"}
+        {"action": "unsubscribe", "source_id": 1}
+    and receives binary frames (FRAME_HEADER + JPEG) for each subscribed source,
+    interleaved with JSON messages: detections (client-overlay renditions, sent right
+    before their frame), events, fall_event, event_update, pipelines, status and error.
+    Every subscription is a regular broadcaster Subscription, so per-source backpressure
+    and renditions work as on the single-camera socket.
+    """
+
+    STATUS_INTERVAL = 2.0
+
+    def __init__(self, websocket, manager, client: Optional[str] = None):
+        self.websocket = websocket
+        self.manager = manager
+        self.client = client
+        self._send_lock = asyncio.Lock()
+        self._streams: Dict[int, asyncio.Task] = {}
+
+    async def send_json(self, message: Dict):
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(message))
+
+    async def run(self):
+        events = self.manager.event_hub.register()
+        tasks = [asyncio.create_task(self._forward_events(events)),
+                 asyncio.create_task(self._send_status())]
+        try:
+            await self._receive()
+        finally:
+            for task in tasks + list(self._streams.values()):
+                task.cancel()
+            await asyncio.gather(*tasks, *self._streams.values(), return_exceptions=True)
+            self.manager.event_hub.unregister(events)
+
+    async def _receive(self):
+        while True:
+            text = await self.websocket.receive_text()
+            try:
+                msg = json.loads(text)
+                action = msg.get("action")
+                source_id = int(msg["source_id"])
+            except (ValueError, KeyError, TypeError, AttributeError):
+                await self.send_json({"type": "error", "detail": "Expected {action, source_id}"})
+                continue
+            if action == "subscribe":
+                await self._subscribe(source_id, msg)
+            elif action == "unsubscribe":
+                task = self._streams.pop(source_id, None)
+                if task:
+                    task.cancel()
+            else:
+                await self.send_json({"type": "error", "detail": f"Unknown action '{action}'"})
+
+    async def _subscribe(self, source_id: int, msg: Dict):
+        pipeline = self.manager.get_pipeline(source_id)
+        if pipeline is None:
+            await self.send_json({"type": "error", "source_id": source_id, "detail": "Pipeline not active"})
+            return
+        try:
+            rendition = parse_rendition(msg)
+        except ValueError as e:
+            await self.send_json({"type": "error", "source_id": source_id, "detail": str(e)})
+            return
+        old = self._streams.pop(source_id, None)
+        if old:
+            # Re-subscribing changes the rendition
+            old.cancel()
+        self._streams[source_id] = asyncio.create_task(self._stream(pipeline, source_id, rendition))
+
+    async def _stream(self, pipeline, source_id: int, rendition: Dict):
+        subscription = None
+        try:
+            pipeline.add_viewer()
+            subscription = pipeline.broadcaster.subscribe(self.client, **rendition)
+            while pipeline.running:
+                item = await subscription.next(timeout=1.0)
+                if item is None:
+                    continue
+                packet, jpeg, events = item
+                async with self._send_lock:
+                    await subscription.send(_FramedSocket(self.websocket, source_id, packet.seq), packet, jpeg,
+                                            events)
+            await self.send_json({"type": "unsubscribed", "source_id": source_id, "reason": "Pipeline stopped"})
+        except asyncio.TimeoutError:
+            logger.warning(f"Live client {self.client} stalled on source {source_id}")
+            await self.websocket.close()
+        except Exception as e:
+            logger.error(f"Live stream for source {source_id} failed: {e}")
+            await self.send_json({"type": "error", "source_id": source_id, "detail": "Stream failed"})
+        finally:
+            if subscription is not None:
+                subscription.close()
+            pipeline.remove_viewer()
+            if self._streams.get(source_id) is asyncio.current_task():
+                del self._streams[source_id]
+
+    async def _forward_events(self, q: asyncio.Queue):
+        while True:
+            await self.send_json(await q.get())
+
+    async def _send_status(self):
+        while True:
+            pipelines = dict(self.manager.pipelines)
+            await self.send_json({
+                "type": "status",
+                "active_source_ids": list(pipelines.keys()),
+                "pipelines": {sid: p.stream.get_health() for sid, p in pipelines.items()},
+            })
+            await asyncio.sleep(self.STATUS_INTERVAL)
+
+
+class _FramedSocket:
+    """Adapter handed to Subscription.send: prefixes frames with the source header and tags events."""
+
+    def __init__(self, websocket, source_id: int, seq: int):
+        self.websocket = websocket
+        self.source_id = source_id
+        self.seq = seq
+
+    async def send_bytes(self, data: bytes):
+        await self.websocket.send_bytes(FRAME_HEADER.pack(self.source_id, self.seq & 0xFFFFFFFF) + data)
+
+    async def send_text(self, text: str):
+        # text is a serialized JSON object (shared by every viewer): splice the tag in
+        # rather than decoding and re-encoding it for each one
+        body = text.lstrip()[1:].lstrip()
+        separator = "" if body.startswith("}") else ", "
+        await self.websocket.send_text(f'{{"source_id": {self.source_id}{separator}{body}')
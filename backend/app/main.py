@@ -36,6 +36,17 @@ app.mount("/data", StaticFiles(directory="data"), name="data")
 # Include routers
 app.include_router(api.router, prefix="/api")
 
+@app.on_event("startup")
+def start_notifications():
+    # Resume Telegram notifications and reminders still pending from a previous run
+    api.manager.notifier.start()
+    api.manager.reminders.start()
+
+@app.on_event("shutdown")
+def stop_notifications():
+    api.manager.reminders.stop()
+    api.manager.notifier.stop()
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
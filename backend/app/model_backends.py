@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+from ultralytics import YOLO
+
+logger = logging.getLogger(__name__)
+
+# backend name -> (ultralytics export format, artifact name suffix)
+BACKENDS = {
+    "pytorch": (None, ".pt"),
+    "onnx": ("onnx", ".onnx"),
+    "openvino": ("openvino", "_openvino_model"),
+    # Post-training INT8 IR, calibrated on our recorded clips (see quantization.py)
+    "openvino-int8": ("openvino", "_int8_openvino_model"),
+}
+
+DEFAULT_BACKEND = os.getenv("INFERENCE_BACKEND", "pytorch").lower()
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "data/models")
+
+
+def normalize_backend(backend=None) -> str:
+    backend = (backend or DEFAULT_BACKEND).lower()
+    if backend in ("torch", "pt"):
+        backend = "pytorch"
+    if backend in ("onnxruntime", "ort"):
+        backend = "onnx"
+    if backend in ("ov", "openvino_ir"):
+        backend = "openvino"
+    if backend in ("int8", "openvino_int8"):
+        backend = "openvino-int8"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+    return backend
+
+
+def model_key(model_path: str, backend: str, imgsz: int) -> str:
+    """Key for in-process model/scheduler caches."""
+    return f"{model_path}|{backend}|{imgsz}"
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def artifact_path(weights_path: str, backend: str, imgsz: int) -> str:
+    """
+    On-disk location of the exported model, keyed by weights hash, imgsz and backend:
+    <MODEL_CACHE_DIR>/<stem>-<hash>-<imgsz>/<stem><suffix>
+    """
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    suffix = BACKENDS[backend][1]
+    cache_dir = os.path.join(MODEL_CACHE_DIR, f"{stem}-{_file_hash(weights_path)}-{imgsz}")
+    return os.path.join(cache_dir, f"{stem}{suffix}")
+
+
+def _export(weights_path: str, backend: str, imgsz: int, target: str):
+    fmt = BACKENDS[backend][0]
+    logger.info(f"Exporting {weights_path} to {backend} (imgsz={imgsz}), this only happens once...")
+
+    # Export from a private copy of the weights so the artifacts land in a temp dir,
+    # then move them into the cache in one step.
+    work_dir = tempfile.mkdtemp(prefix="export-", dir=os.path.dirname(target))
+    try:
+        tmp_weights = os.path.join(work_dir, os.path.basename(weights_path))
+        shutil.copy2(weights_path, tmp_weights)
+        # dynamic=True keeps the batch axis free for the cross-stream scheduler
+        exported = YOLO(tmp_weights).export(format=fmt, imgsz=imgsz, dynamic=True, half=False, verbose=False)
+        exported = str(exported).rstrip("/\\")
+        if not os.path.exists(target):
+            shutil.move(exported, target)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def load_model(model_path: str, backend=None, imgsz: int = 640):
+    """
+    Load a pose model for the given backend. Non-PyTorch backends are exported from
+    the .pt weights on first use and reused from MODEL_CACHE_DIR afterwards.
+    Every backend returns an ultralytics YOLO object, so Results decoding
+    (boxes/keypoints) is the same regardless of backend.
+    """
+    backend = normalize_backend(backend)
+    pt_model = YOLO(model_path)
+    if backend == "pytorch":
+        return pt_model
+
+    weights_path = str(getattr(pt_model, "ckpt_path", None) or model_path)
+    return YOLO(ensure_artifact(weights_path, backend, imgsz), task=pt_model.task)
+
+
+def ensure_artifact(weights_path: str, backend: str, imgsz: int) -> str:
+    """Return the cached artifact for a backend, exporting (or quantizing) it if missing."""
+    target = artifact_path(weights_path, backend, imgsz)
+    if os.path.exists(target):
+        logger.info(f"Using cached {backend} model: {target}")
+        return target
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if backend == "openvino-int8":
+        from . import quantization
+
+        fp32_dir = ensure_artifact(weights_path, "openvino", imgsz)
+        frames = quantization.sample_clip_frames(quantization.find_calibration_clips())
+        quantization.quantize_openvino_int8(fp32_dir, target, imgsz, frames)
+    else:
+        _export(weights_path, backend, imgsz, target)
+    logger.info(f"Cached {backend} model at {target}")
+    return target
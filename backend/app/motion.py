@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+import os
+import threading
+
+
+class MotionGate:
+    """
+    Cheap change detector that decides whether a frame is worth running the pose model on.
+    Compares a small blurred grayscale copy of the frame with the previous one; when
+    nothing moves and no track is active, inference drops to one heartbeat every
+    HEARTBEAT_SECONDS.
+    """
+
+    def __init__(self, enabled=None, heartbeat_seconds=None):
+        if enabled is None:
+            enabled = os.getenv("MOTION_GATE", "1").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.HEARTBEAT_SECONDS = float(heartbeat_seconds if heartbeat_seconds is not None
+                                       else os.getenv("MOTION_HEARTBEAT_SECONDS", "2.0"))
+        self.DOWNSCALE_W = 160
+        self.PIXEL_DIFF_THRESHOLD = 25      # grey levels
+        self.CHANGED_RATIO_THRESHOLD = 0.003  # fraction of pixels that must change
+        self.HOLD_SECONDS = 1.0             # keep full rate this long after the last motion
+
+        self._prev = None
+        self._last_motion = None
+        # Changed-pixel mask of the last check that saw motion (DOWNSCALE_W wide), or None
+        self._motion_mask = None
+        self._mask_scale = 1.0
+        self._last_infer = None
+        self._lock = threading.Lock()
+
+        # Counters
+        self.checked = 0
+        self.motion_frames = 0
+        self.inferences = 0
+        self.heartbeats = 0
+        self.skipped = 0
+
+    def _has_motion(self, frame) -> bool:
+        h, w = frame.shape[:2]
+        small_h = max(1, int(h * self.DOWNSCALE_W / float(w)))
+        gray = cv2.cvtColor(cv2.resize(frame, (self.DOWNSCALE_W, small_h), interpolation=cv2.INTER_AREA),
+                            cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        prev, self._prev = self._prev, gray
+        self._mask_scale = self.DOWNSCALE_W / float(w)
+        if prev is None or prev.shape != gray.shape:
+            self._motion_mask = np.full(gray.shape, 255, dtype=np.uint8)
+            return True
+
+        diff = cv2.absdiff(gray, prev)
+        _, mask = cv2.threshold(diff, self.PIXEL_DIFF_THRESHOLD, 255, cv2.THRESH_BINARY)
+        if cv2.countNonZero(mask) <= self.CHANGED_RATIO_THRESHOLD * mask.size:
+            self._motion_mask = None
+            return False
+        self._motion_mask = mask
+        return True
+
+    def motion_outside(self, boxes) -> bool:
+        """
+        True if the last check saw significant motion outside all given xyxy boxes
+        (frame coordinates), e.g. someone entering away from the known tracks.
+        """
+        mask = self._motion_mask
+        if mask is None:
+            return False
+        mask = mask.copy()
+        s = self._mask_scale
+        for x1, y1, x2, y2 in boxes:
+            mask[max(0, int(y1 * s)):int(y2 * s) + 1, max(0, int(x1 * s)):int(x2 * s) + 1] = 0
+        return cv2.countNonZero(mask) > self.CHANGED_RATIO_THRESHOLD * mask.size
+
+    def should_infer(self, frame, now: float, has_activity: bool) -> bool:
+        """
+        has_activity: the detector currently has tracked people or pending falls,
+        in which case we never gate.
+        """
+        if not self.enabled:
+            self._motion_mask = None
+            return True
+
+        with self._lock:
+            self.checked += 1
+            motion = self._has_motion(frame)
+            if motion:
+                self.motion_frames += 1
+                self._last_motion = now
+
+            recently_moved = self._last_motion is not None and (now - self._last_motion) < self.HOLD_SECONDS
+            if has_activity or recently_moved:
+                run = True
+            elif self._last_infer is None or (now - self._last_infer) >= self.HEARTBEAT_SECONDS:
+                run = True
+                self.heartbeats += 1
+            else:
+                run = False
+
+            if run:
+                self.inferences += 1
+                self._last_infer = now
+            else:
+                self.skipped += 1
+            return run
+
+    def is_idle(self, now: float) -> bool:
+        if not self.enabled:
+            return False  # no motion information, assume the scene is live
+        return self._last_motion is None or (now - self._last_motion) >= self.HOLD_SECONDS
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "checked": self.checked,
+                "motion_frames": self.motion_frames,
+                "inferences": self.inferences,
+                "heartbeat_inferences": self.heartbeats,
+                "skipped_inferences": self.skipped,
+                "skip_ratio": (self.skipped / self.checked) if self.checked else 0.0,
+            }
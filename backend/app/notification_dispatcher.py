@@ -0,0 +1,347 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, select
+
+from . import database
+from .notifications import MAX_MESSAGE_LENGTH, TelegramBot
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("message", "photo", "video")
+
+# Order in which kinds are dropped when the queue is full; fall alerts (photo) never are
+DROP_ORDER = ("message", "video")
+
+# Rows in these states are done; they are purged after NOTIFY_RETENTION_HOURS
+FINISHED = ("sent", "failed", "dropped")
+
+# Telegram answers that will never succeed on retry
+PERMANENT_ERRORS = (400, 401, 403, 404)
+
+
+class NotificationDispatcher:
+    """
+    Persistent outbound queue for Telegram notifications.
+
+    Callers add a row to the `notifications` table inside their own transaction
+    (enqueue) and return immediately; nothing on the pipeline thread touches the
+    network. A feeder thread hands due rows to a small worker pool. Workers never sleep:
+    a row whose chat (or bot) is over Telegram's send rate is pushed back to when its
+    bucket refills, and pending plain-text rows for the same chat go out merged into one
+    message. Failed sends are retried with exponential backoff (honouring Telegram's
+    retry_after), and results such as the alert's telegram_message_id are written back
+    to the event. Pending rows
+    survive a restart; beyond NOTIFY_MAX_PENDING, the oldest reminders are dropped first,
+    then clips; fall alerts are never dropped. Finished rows are deleted after
+    NOTIFY_RETENTION_HOURS, except the alert of a still-open event.
+    """
+
+    def __init__(self):
+        # --- Tuning ---
+        self.WORKERS = int(os.getenv("NOTIFY_WORKERS", "2"))
+        self.MAX_PENDING = int(os.getenv("NOTIFY_MAX_PENDING", "1000"))
+        self.MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "6"))
+        self.BACKOFF_BASE_S = float(os.getenv("NOTIFY_BACKOFF_BASE_S", "2"))
+        self.BACKOFF_MAX_S = float(os.getenv("NOTIFY_BACKOFF_MAX_S", "300"))
+        self.RETENTION_HOURS = float(os.getenv("NOTIFY_RETENTION_HOURS", "24"))
+        self.POLL_INTERVAL = 5.0
+        self.PURGE_INTERVAL = 300.0
+        self._last_purge = 0.0
+
+        self._queue = queue.Queue(maxsize=self.WORKERS * 4)
+        self._inflight = set()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.threads = []
+        self.running = False
+
+        self._stats = {"sent": 0, "merged": 0, "deferred": 0, "retried": 0, "failed": 0, "dropped": 0,
+                       "purged": 0}
+
+    def enqueue(self, db, kind: str, bot_token: Optional[str], chat_id: Optional[str], payload: Dict,
+                event_id: Optional[int] = None) -> Optional[database.NotificationModel]:
+        """
+        Add a notification to the caller's session; it is sent once the caller commits
+        and calls wake(). Returns None when there is no bot to send with.
+        payload: text or caption, path (photo/video), reply_markup, and track_message to
+        store the resulting message id as the event's telegram_message_id.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown notification kind '{kind}'")
+        if not bot_token or not chat_id:
+            return None
+        row = database.NotificationModel(event_id=event_id, kind=kind, bot_token=bot_token, chat_id=str(chat_id),
+                                         payload=json.dumps(payload), status="pending",
+                                         next_attempt_at=datetime.utcnow())
+        db.add(row)
+        return row
+
+    def wake(self):
+        """Look for due notifications now instead of at the next poll."""
+        self._wake.set()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            self.threads = [threading.Thread(target=self._feed, daemon=True)]
+            self.threads += [threading.Thread(target=self._work, daemon=True) for _ in range(self.WORKERS)]
+            for thread in self.threads:
+                thread.start()
+        logger.info(f"Notification dispatcher started with {self.WORKERS} workers")
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        for _ in range(self.WORKERS):
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+
+    def _feed(self):
+        while self.running:
+            delay = self.POLL_INTERVAL
+            db = database.SessionLocal()
+            try:
+                self._purge(db)
+                self._trim(db)
+                delay = self._dispatch_due(db)
+            except Exception as e:
+                logger.error(f"Notification feeder error: {e}")
+                db.rollback()
+            finally:
+                db.close()
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _purge(self, db, force: bool = False):
+        """
+        Delete finished rows older than RETENTION_HOURS (every PURGE_INTERVAL). The photo
+        alert of an unresolved event is kept: reminders resume from it after a restart.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        Notification, Event = database.NotificationModel, database.FallEventModel
+        cutoff = datetime.utcnow() - timedelta(hours=self.RETENTION_HOURS)
+        open_alerts = (select(Notification.id).join(Event, Event.id == Notification.event_id)
+                       .where(Notification.kind == "photo", Event.is_resolved == False))  # noqa: E712
+        purged = (db.query(Notification)
+                  .filter(Notification.status.in_(FINISHED), Notification.created_at < cutoff,
+                          ~Notification.id.in_(open_alerts))
+                  .delete(synchronize_session=False))
+        db.commit()
+        if purged:
+            self._count("purged", purged)
+            logger.info(f"Purged {purged} notifications older than {self.RETENTION_HOURS:g}h")
+
+    def _trim(self, db):
+        """
+        Keep the persistent queue bounded: beyond MAX_PENDING, drop the oldest reminders
+        and messages first, then clips. Fall alerts (photo) are never dropped.
+        """
+        Notification = database.NotificationModel
+        pending = db.query(Notification).filter(Notification.status == "pending").count()
+        excess = pending - self.MAX_PENDING
+        if excess <= 0:
+            return
+        with self._lock:
+            inflight = set(self._inflight)
+        priority = case({kind: i for i, kind in enumerate(DROP_ORDER)}, value=Notification.kind)
+        rows = (db.query(Notification).filter(Notification.status == "pending",
+                                              Notification.kind.in_(DROP_ORDER))
+                .order_by(priority, Notification.id).limit(excess + len(inflight)).all())
+        dropped = 0
+        for row in rows:
+            if row.id in inflight or dropped >= excess:
+                continue
+            row.status = "dropped"
+            row.last_error = "Queue full"
+            dropped += 1
+        db.commit()
+        if not dropped:
+            return
+        self._count("dropped", dropped)
+        logger.warning(f"Notification queue over {self.MAX_PENDING}, dropped {dropped} reminders/clips")
+
+    def _dispatch_due(self, db) -> float:
+        """Queue due rows for the workers; returns seconds until the next one is due."""
+        Notification = database.NotificationModel
+        now = datetime.utcnow()
+        with self._lock:
+            inflight = set(self._inflight)
+        free = self._queue.maxsize - self._queue.qsize()
+        if free > 0:
+            query = db.query(Notification.id).filter(Notification.status == "pending",
+                                                     Notification.next_attempt_at <= now)
+            if inflight:
+                query = query.filter(~Notification.id.in_(inflight))
+            for (row_id,) in query.order_by(Notification.id).limit(free).all():
+                with self._lock:
+                    self._inflight.add(row_id)
+                self._queue.put(row_id)
+            if self._queue.qsize() >= self._queue.maxsize:
+                return 0.5  # Backlog: come back as soon as workers free up
+
+        next_due = (db.query(Notification.next_attempt_at)
+                    .filter(Notification.status == "pending", Notification.next_attempt_at > now)
+                    .order_by(Notification.next_attempt_at).first())
+        if next_due:
+            return max(0.1, min(self.POLL_INTERVAL, (next_due[0] - now).total_seconds()))
+        return self.POLL_INTERVAL
+
+    def _work(self):
+        while True:
+            row_id = self._queue.get()
+            if row_id is None:
+                return
+            db = database.SessionLocal()
+            try:
+                self._deliver(db, row_id)
+            except Exception as e:
+                logger.error(f"Notification {row_id} failed: {e}")
+                db.rollback()
+            finally:
+                db.close()
+                with self._lock:
+                    self._inflight.discard(row_id)
+
+    def _deliver(self, db, row_id: int):
+        Notification = database.NotificationModel
+        row = db.query(Notification).filter(Notification.id == row_id).first()
+        if not row or row.status != "pending":
+            return
+        payload = json.loads(row.payload or "{}")
+        path = payload.get("path")
+        if row.kind in ("photo", "video") and (not path or not os.path.exists(path)):
+            self._fail(db, row, f"File not found: {path}")
+            return
+
+        bot = TelegramBot(token=row.bot_token, chat_id=row.chat_id)
+        wait = bot.client.acquire(row.chat_id)
+        if wait > 0:
+            # Chat or bot over its send rate: come back when the bucket refills
+            row.next_attempt_at = datetime.utcnow() + timedelta(seconds=wait)
+            db.commit()
+            self._count("deferred")
+            self._wake.set()
+            return
+
+        merged = self._claim_merge(db, row, payload) if row.kind == "message" else []
+        try:
+            if merged:
+                payload = dict(payload, text="\n\n".join([payload.get("text") or ""] +
+                                                          [text for _, text in merged]))
+            row.attempts = (row.attempts or 0) + 1
+            response = self._send(bot, row.kind, payload)
+            self._record(db, row, response, [m for m, _ in merged])
+        finally:
+            with self._lock:
+                self._inflight.difference_update(m.id for m, _ in merged)
+
+    def _claim_merge(self, db, row, payload: Dict) -> List:
+        """
+        Other pending plain-text rows for the same bot and chat that fit in one message
+        with this one (due or not: a backlog collapses into a single send). Claimed rows
+        are marked in flight so the feeder leaves them alone.
+        """
+        if payload.get("reply_markup"):
+            return []
+        Notification = database.NotificationModel
+        candidates = (db.query(Notification)
+                      .filter(Notification.status == "pending", Notification.kind == "message",
+                              Notification.bot_token == row.bot_token, Notification.chat_id == row.chat_id,
+                              Notification.id != row.id)
+                      .order_by(Notification.id).limit(50).all())
+        size = len(payload.get("text") or "")
+        merged = []
+        with self._lock:
+            for other in candidates:
+                if other.id in self._inflight:
+                    continue
+                other_payload = json.loads(other.payload or "{}")
+                text = other_payload.get("text") or ""
+                if other_payload.get("reply_markup") or size + len(text) + 2 > MAX_MESSAGE_LENGTH:
+                    continue
+                self._inflight.add(other.id)
+                merged.append((other, text))
+                size += len(text) + 2
+        return merged
+
+    def _record(self, db, row, response: Optional[Dict], merged: List):
+        if response and response.get("ok"):
+            now = datetime.utcnow()
+            for sent in [row] + merged:
+                sent.status = "sent"
+                sent.sent_at = now
+                sent.last_error = None
+            payload = json.loads(row.payload or "{}")
+            if payload.get("track_message") and row.event_id:
+                event = db.query(database.FallEventModel).filter(database.FallEventModel.id == row.event_id).first()
+                if event:
+                    event.telegram_message_id = str(response["result"]["message_id"])
+            db.commit()
+            self._count("sent", 1 + len(merged))
+            self._count("merged", len(merged))
+            return
+
+        # Merged rows were not touched; they stay pending and go out with a later send
+        error = response.get("description") if response else "No response"
+        code = response.get("error_code") if response else None
+        if code == 429:
+            row.attempts -= 1  # Rate limiting is not a delivery failure
+        elif code in PERMANENT_ERRORS or row.attempts >= self.MAX_ATTEMPTS:
+            self._fail(db, row, f"{code or ''} {error}".strip())
+            return
+
+        retry_after = (response or {}).get("parameters", {}).get("retry_after")
+        if retry_after is None:
+            retry_after = min(self.BACKOFF_MAX_S, self.BACKOFF_BASE_S * 2 ** (row.attempts - 1))
+            retry_after *= random.uniform(0.8, 1.2)
+        row.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_after)
+        row.last_error = str(error)
+        db.commit()
+        self._count("retried")
+        self._wake.set()
+        logger.warning(f"Notification {row.id} ({row.kind}) failed: {error}; retry in {retry_after:.1f}s")
+
+    def _fail(self, db, row, error: str):
+        row.status = "failed"
+        row.last_error = error
+        db.commit()
+        self._count("failed")
+        logger.error(f"Notification {row.id} ({row.kind}) gave up after {row.attempts} attempts: {error}")
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
+
+    @staticmethod
+    def _send(bot: TelegramBot, kind: str, payload: Dict) -> Optional[Dict]:
+        if kind == "photo":
+            return bot.send_photo(payload.get("caption"), payload["path"], reply_markup=payload.get("reply_markup"))
+        if kind == "video":
+            return bot.send_video(payload.get("caption"), payload["path"], background=False)
+        return bot.send_message(payload.get("text"), reply_markup=payload.get("reply_markup"))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = {
+                "workers": self.WORKERS,
+                "running": self.running,
+                "queued": self._queue.qsize(),
+                "in_flight": len(self._inflight),
+            }
+            stats.update(self._stats)
+        return stats
@@ -1,32 +1,224 @@
 import requests
 import logging
 import threading
+import time
 import os
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Telegram's limit for one message text
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TokenBucket:
+    """Thread-safe token bucket that never blocks: try_acquire() takes a token or says how long to wait."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """0.0 if a token was taken, else seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._blocked_until > now:
+                return self._blocked_until - now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def refund(self):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+    def pause(self, seconds: float):
+        """Telegram said retry_after: refuse tokens until then."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+
+class TelegramClient:
+    """
+    Shared HTTP client for one bot token (see get_client).
+
+    Keeps connections alive in a requests.Session pool and tracks Telegram's send limits
+    (TELEGRAM_GLOBAL_RATE messages/s per bot, TELEGRAM_CHAT_RATE per private chat,
+    TELEGRAM_GROUP_PER_MINUTE per group) in token buckets. acquire() never sleeps, so the
+    caller (NotificationDispatcher) can reschedule instead of blocking a worker; a 429
+    pauses the bucket for retry_after. Records per-request latency and errors.
+    """
+
+    def __init__(self, token: str):
+        self.token = token
+        api_url = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+        self.base_url = f"{api_url}/bot{token}"
+
+        # --- Tuning ---
+        self.POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "4"))
+        self.GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+        self.CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+        self.GROUP_PER_MINUTE = float(os.getenv("TELEGRAM_GROUP_PER_MINUTE", "20"))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._global = TokenBucket(self.GLOBAL_RATE, self.GLOBAL_RATE)
+        self._chats: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.deferred = 0
+        self._latencies = deque(maxlen=200)
+
+    def _chat(self, chat_id) -> TokenBucket:
+        key = str(chat_id)
+        with self._lock:
+            bucket = self._chats.get(key)
+            if bucket is None:
+                # Negative ids are groups and channels, which Telegram limits per minute
+                if key.startswith("-"):
+                    bucket = TokenBucket(self.GROUP_PER_MINUTE / 60.0, 1)
+                else:
+                    bucket = TokenBucket(self.CHAT_RATE, 1)
+                self._chats[key] = bucket
+            return bucket
+
+    def acquire(self, chat_id=None) -> float:
+        """Claim a send slot for chat_id: 0.0 if the send may go now, else seconds to wait."""
+        chat = self._chat(chat_id) if chat_id is not None else None
+        wait = chat.try_acquire() if chat else 0.0
+        if wait <= 0:
+            wait = self._global.try_acquire()
+            if wait > 0 and chat:
+                chat.refund()
+        if wait > 0:
+            with self._stats_lock:
+                self.deferred += 1
+        return wait
+
+    def wait_turn(self, chat_id=None):
+        """Blocking acquire, for interactive calls outside the dispatcher (callback answers, edits)."""
+        while True:
+            wait = self.acquire(chat_id)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def request(self, method: str, chat_id=None, timeout: float = 5, **kwargs) -> Dict:
+        """
+        POST to the Bot API and return the decoded answer (including error answers).
+        Raises on network errors. Not paced: call acquire()/wait_turn() first. chat_id is
+        only used to pause the right bucket on a 429; pass it in the body too.
+        """
+        started = time.monotonic()
+        try:
+            result = self.session.post(f"{self.base_url}/{method}", timeout=timeout, **kwargs).json()
+        except Exception:
+            self._record(started, error=True)
+            raise
+        self._record(started, error=not result.get("ok"), rate_limited=result.get("error_code") == 429)
+
+        if result.get("error_code") == 429:
+            retry_after = result.get("parameters", {}).get("retry_after", 1)
+            (self._chat(chat_id) if chat_id is not None else self._global).pause(retry_after)
+            logger.warning(f"Telegram rate limit on {method}, pausing {retry_after}s")
+        return result
+
+    def _record(self, started: float, error: bool = False, rate_limited: bool = False):
+        with self._stats_lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.rate_limited += int(rate_limited)
+            self._latencies.append(time.monotonic() - started)
+
+    def get_updates(self, params: Dict, timeout: float) -> Dict:
+        """Long poll; not paced and not counted in send latency."""
+        return self.session.get(f"{self.base_url}/getUpdates", params=params, timeout=timeout).json()
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "rate_limited": self.rate_limited,
+                "deferred": self.deferred,
+            }
+        stats["latency_ms"] = {
+            "avg": round(1000 * sum(latencies) / len(latencies), 1) if latencies else None,
+            "p95": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 1) if latencies else None,
+            "max": round(1000 * latencies[-1], 1) if latencies else None,
+        }
+        stats["chats"] = len(self._chats)
+        return stats
+
+
+_CLIENTS: Dict[str, TelegramClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+# Background video uploads (send_video(background=True)) share these threads
+_BACKGROUND = ThreadPoolExecutor(max_workers=2, thread_name_prefix="telegram")
+
+
+def get_client(token: str) -> TelegramClient:
+    """One pooled, rate-limited client per bot token, shared by every camera using it."""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(token)
+        if client is None:
+            client = TelegramClient(token)
+            _CLIENTS[token] = client
+        return client
+
+
+def get_all_stats() -> Dict:
+    """Client metrics keyed by bot id (the part of the token before ':')."""
+    with _CLIENTS_LOCK:
+        clients = dict(_CLIENTS)
+    return {token.split(":")[0]: client.get_stats() for token, client in clients.items()}
+
+
 class TelegramBot:
     def __init__(self, token=None, chat_id=None):
         # Only use environment variables if BOTH are missing from arguments
-        # This allows disabling notifications by passing None if we want, 
+        # This allows disabling notifications by passing None if we want,
         # but here we'll assume if they are provided, we use them.
         # If they are NOT provided (None), we check if we should fallback.
-        # To satisfy the user, if they are NOT in a group and NOT in demo config, 
+        # To satisfy the user, if they are NOT in a group and NOT in demo config,
         # they should be None.
         self.token = token
         self.chat_id = chat_id
-        
+
         # If both are None, we COULD fallback to env, but the user says it's "wrong".
         # So I will only fallback if the env vars are actually set AND no specific config was passed.
         # Actually, let's just make it strict: if not passed, it's None.
-        # But wait, some users might WANT the default. 
+        # But wait, some users might WANT the default.
         # Let's check if they were passed as None explicitly.
-        
-        self.base_url = f"https://api.telegram.org/bot{self.token}" if self.token else None
+
+        # Bots with the same token share one connection pool and rate limiter. send_* do not
+        # pace themselves; NotificationDispatcher claims a slot (client.acquire) before each send.
+        self.client = get_client(self.token) if self.token else None
+        self.base_url = self.client.base_url if self.client else None
 
     def send_message(self, text, reply_markup=None, chat_id=None):
         target_chat_id = chat_id or self.chat_id
@@ -35,12 +227,10 @@ class TelegramBot:
             return None
 
         try:
-            url = f"{self.base_url}/sendMessage"
             payload = {"chat_id": target_chat_id, "text": text}
             if reply_markup:
                 payload["reply_markup"] = reply_markup
-            response = requests.post(url, json=payload, timeout=5)
-            return response.json()
+            return self.client.request("sendMessage", target_chat_id, json=payload)
         except Exception as e:
             logger.error(f"Failed to send Telegram message: {e}")
             return None
@@ -52,19 +242,17 @@ class TelegramBot:
             return None
 
         try:
-            url = f"{self.base_url}/sendPhoto"
             with open(photo_path, "rb") as f:
                 files = {"photo": f}
                 data = {"chat_id": target_chat_id, "caption": caption}
                 if reply_markup:
                     data["reply_markup"] = json.dumps(reply_markup)
-                response = requests.post(url, data=data, files=files, timeout=10)
-                return response.json()
+                return self.client.request("sendPhoto", target_chat_id, timeout=10, data=data, files=files)
         except Exception as e:
             logger.error(f"Failed to send Telegram photo: {e}")
             return None
 
-    def send_video(self, caption, video_path, chat_id=None):
+    def send_video(self, caption, video_path, chat_id=None, background=True):
         target_chat_id = chat_id or self.chat_id
         if not self.base_url or not target_chat_id:
             logger.warning("Telegram token or chat_id not set. Skipping video.")
@@ -72,22 +260,23 @@ class TelegramBot:
 
         def _send():
             try:
-                url = f"{self.base_url}/sendVideo"
                 with open(video_path, "rb") as f:
                     files = {"video": f}
                     data = {"chat_id": target_chat_id, "caption": caption}
-                    requests.post(url, data=data, files=files, timeout=60)
+                    return self.client.request("sendVideo", target_chat_id, timeout=60, data=data, files=files)
             except Exception as e:
                 logger.error(f"Failed to send Telegram video: {e}")
+                return None
 
-        threading.Thread(target=_send, daemon=True).start()
+        if not background:
+            return _send()
+        _BACKGROUND.submit(_send)
 
     def edit_message_caption(self, message_id, caption, reply_markup=None, chat_id=None):
         target_chat_id = chat_id or self.chat_id
         if not self.base_url or not target_chat_id:
             return None
         try:
-            url = f"{self.base_url}/editMessageCaption"
             payload = {
                 "chat_id": target_chat_id,
                 "message_id": message_id,
@@ -95,8 +284,8 @@ class TelegramBot:
             }
             if reply_markup:
                 payload["reply_markup"] = reply_markup
-            response = requests.post(url, json=payload, timeout=5)
-            return response.json()
+            self.client.wait_turn(target_chat_id)
+            return self.client.request("editMessageCaption", target_chat_id, json=payload)
         except Exception as e:
             logger.error(f"Failed to edit Telegram message caption: {e}")
             return None
@@ -105,11 +294,11 @@ class TelegramBot:
         if not self.base_url:
             return
         try:
-            url = f"{self.base_url}/answerCallbackQuery"
             payload = {"callback_query_id": callback_query_id}
             if text:
                 payload["text"] = text
-            requests.post(url, json=payload, timeout=5)
+            self.client.wait_turn()
+            self.client.request("answerCallbackQuery", json=payload)
         except Exception as e:
             logger.error(f"Failed to answer callback query: {e}")
 
@@ -117,12 +306,10 @@ class TelegramBot:
         if not self.base_url:
             return []
         try:
-            url = f"{self.base_url}/getUpdates"
             params = {"timeout": 30}
             if offset:
                 params["offset"] = offset
-            response = requests.get(url, params=params, timeout=35)
-            return response.json().get("result", [])
+            return self.client.get_updates(params, timeout=35).get("result", [])
         except Exception as e:
             logger.error(f"Failed to get Telegram updates: {e}")
             return []
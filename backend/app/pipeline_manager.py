@@ -7,27 +7,66 @@ from datetime import datetime
 from typing import Dict, Optional
 from .stream import VideoStream
 from .cv_pipeline import FallDetector
+from .tracking import StreamTracker
+from .rate_control import AdaptiveRateController
+from .workers import InferenceWorkerPool
+from .clip_recorder import ClipRecorder, clips_enabled
+from .broadcast import FrameBroadcaster
+from .live import EventHub, serialize_event
 from .notifications import TelegramBot
-from . import database
+from .notification_dispatcher import NotificationDispatcher
+from .reminders import ReminderScheduler
+from . import database, inference
 
 logger = logging.getLogger(__name__)
 
 class PipelineInstance:
-    def __init__(self, source_id: int, source_url: str, manager, is_file: bool = False, telegram_config: Optional[Dict] = None):
+    def __init__(self, source_id: int, source_url: str, manager, is_file: bool = False, telegram_config: Optional[Dict] = None,
+                 backend: Optional[str] = None, capture_options: Optional[Dict] = None):
         self.source_id = source_id
         self.manager = manager
-        self.stream = VideoStream(source_url, is_file)
-        self.detector = FallDetector(telegram_config=telegram_config)
+        # capture_options: VideoStream kwargs (backend, max_fps, queue_depth, frame_policy)
+        self.stream = VideoStream(source_url, is_file, **(capture_options or {}))
+        if manager.worker_pool.enabled:
+            # Detection (and the tracker state) lives in a worker process
+            self.detector = manager.worker_pool.create_detector(source_id, telegram_config, backend)
+        else:
+            # Per-stream tracker state; the model weights are shared via the detector cache
+            self.detector = FallDetector(telegram_config=telegram_config, tracker=StreamTracker(), backend=backend)
         self.running = False
         self.thread = None
-        self.last_frame = None
+        self.last_frame = None  # only set while frames are being annotated
         self.last_events = []
+        self.annotated_frames = 0
+        self.unannotated_frames = 0
+        self.detect_errors = 0
+        self._detect_error_logged = 0.0
         self.lock = threading.Lock()
+        # Live-view WebSocket clients. With none, the stream only decodes inference frames.
+        self.viewers = 0
+        # Compressed pre-event frames; a fall turns them into a clip (CLIP_RECORDING=0 disables)
+        self.clip_recorder = ClipRecorder(source_id, annotate=FallDetector.annotate) if clips_enabled() else None
+        # Encodes each new annotated frame once for all live-view clients
+        self.broadcaster = FrameBroadcaster(source_id, serialize=FallDetector.serialize)
+        if os.getenv("DECODE_SKIP", "1").lower() not in ("0", "false", "no"):
+            self.stream.frame_filter = self._wants_frame
+
+    def _wants_frame(self, frame_index: int) -> bool:
+        return self.viewers > 0 or self.detector.wants_frame(frame_index)
+
+    def add_viewer(self):
+        with self.lock:
+            self.viewers += 1
+
+    def remove_viewer(self):
+        with self.lock:
+            self.viewers = max(0, self.viewers - 1)
 
     def start(self):
         if self.running:
             return
         self.stream.start()
+        self.broadcaster.start()
         self.running = True
         self.thread = threading.Thread(target=self._run, daemon=True)
         self.thread.start()
@@ -38,35 +77,70 @@ class PipelineInstance:
         if self.thread:
             self.thread.join(timeout=0.5)
         self.stream.stop()
+        self.broadcaster.close()
+        if self.clip_recorder:
+            self.clip_recorder.flush()
+        close = getattr(self.detector, "close", None)
+        if close:
+            close()
         logger.info(f"Pipeline thread stopped for source {self.source_id}")
 
     def _run(self):
         db = database.SessionLocal()
         try:
             while self.running:
-                frame = self.stream.read()
-                if frame is None:
-                    time.sleep(0.01)
+                # Blocks until the capture thread publishes a frame (newest first by default)
+                packet = self.stream.read_packet(timeout=0.5)
+                if packet is None:
                     continue
-                
-                # Process frame
-                annotated_frame, events = self.detector.process_frame(frame)
-                
+
+                # Detect, then draw only if someone watches or a snapshot is due.
+                # The ring slot stays pinned until nothing reads the frame any more.
+                annotated_frame = clean_frame = None
+                try:
+                    frame_480, detections = self.detector.detect(
+                        packet.frame, current_time=packet.timestamp, frame_index=packet.frame_index)
+                    events = detections.events
+                    if events or self.broadcaster.wants_annotated:
+                        annotated_frame = FallDetector.annotate(frame_480, detections)
+                        self.annotated_frames += 1
+                    else:
+                        self.unannotated_frames += 1
+                    if self.broadcaster.wants_clean:
+                        # Client-drawn overlays; copy only if the frame is still the ring slot
+                        clean_frame = frame_480.copy() if frame_480 is packet.frame else frame_480
+                    if self.clip_recorder:
+                        # Clean frame + detections; clips are drawn when encoded
+                        self.clip_recorder.push(frame_480, packet.timestamp, detections)
+                except Exception as e:
+                    # e.g. a batched predict() raising or the inference scheduler timing out:
+                    # skip this frame, keep the pipeline alive
+                    self._detect_failed(e)
+                    continue
+                finally:
+                    self.stream.release(packet)
+
                 with self.lock:
                     self.last_frame = annotated_frame
                     self.last_events = events
+                if annotated_frame is not None or clean_frame is not None:
+                    self.broadcaster.publish(annotated_frame, events, clean=clean_frame, detections=detections)
 
                 # Handle events (Save to DB and Send Telegram Photo)
                 if events:
                     for event_data in events:
                         self._handle_event(db, event_data, annotated_frame)
-                
-                # Small sleep to prevent 100% CPU if stream is too fast
-                # but usually stream.read() blocks or we handle FPS in stream.py
-                time.sleep(0.001)
         finally:
             db.close()
 
+    def _detect_failed(self, error: Exception):
+        self.detect_errors += 1
+        now = time.monotonic()
+        # At most one log line per 10 s, so a persistent failure does not flood the log
+        if now - self._detect_error_logged >= 10.0:
+            self._detect_error_logged = now
+            logger.error(f"Detection failed on source {self.source_id} ({self.detect_errors} frames so far): {error}")
+
     def _handle_event(self, db, event_data, frame):
         try:
             # 1. Save Snapshot
@@ -86,11 +160,13 @@ class PipelineInstance:
                 snapshot_path=snapshot_name
             )
             db.add(db_event)
-            db.commit()
-            logger.info(f"Saved fall event to DB for source {self.source_id}")
+            db.flush()
 
-            # 3. Send Telegram Photo Alert (Video is handled by FallDetector internally)
-            if self.detector.telegram_bot and self.detector.telegram_bot.base_url:
+            # 3. Queue the Telegram photo alert in the same transaction; the dispatcher sends it
+            # and stores telegram_message_id, so the pipeline never waits on the network
+            bot = self.detector.telegram_bot
+            notify = bool(bot and bot.base_url and bot.chat_id)
+            if notify:
                 caption = (
                     f"⚠️ FALL DETECTED!\n"
                     f"Source ID: {self.source_id}\n"
@@ -98,64 +174,69 @@ class PipelineInstance:
                     f"Score: {event_data['fall_score']:.2f}\n"
                     f"Time: {db_event.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
                 )
-                
+
                 # Inline keyboard for resolution
                 reply_markup = {
                     "inline_keyboard": [[
                         {"text": "✅ Resolve / Đã xử lý", "callback_data": f"resolve_{db_event.id}"}
                     ]]
                 }
-                
-                response = self.detector.telegram_bot.send_photo(caption, snapshot_path, reply_markup=reply_markup)
-                if response and response.get("ok"):
-                    db_event.telegram_message_id = str(response["result"]["message_id"])
-                    db.commit()
-                    
-                # Start repeated notification thread for this specific event if not already handled
-                # Start repeated notification thread for this specific event if not already handled
-                threading.Thread(target=self._notification_loop, args=(db_event.id, self.manager), daemon=True).start()
-                
+                self.manager.notifier.enqueue(db, "photo", bot.token, bot.chat_id, {
+                    "caption": caption, "path": snapshot_path, "reply_markup": reply_markup,
+                    "track_message": True,
+                }, event_id=db_event.id)
+            db.commit()
+            self.manager.notifier.wake()
+            logger.info(f"Saved fall event to DB for source {self.source_id}")
+            self.manager.event_hub.publish({"type": "fall_event", "data": serialize_event(db_event)})
+
+            # Clip of the seconds before and after the fall, encoded in the background
+            if self.clip_recorder:
+                clip_name = f"fall_clip_{self.source_id}_{timestamp}_{event_data['track_id']}.mp4"
+                event_id = db_event.id
+                self.clip_recorder.trigger(clip_name, event_data['timestamp'],
+                                           on_done=lambda path: self._attach_clip(event_id, path))
+
+            if notify:
+                # Remind every REMINDER_INTERVAL_S until someone resolves it
+                self.manager.reminders.schedule(db_event.id, self.source_id, bot.token, bot.chat_id)
+
         except Exception as e:
             logger.error(f"Error handling event in pipeline: {e}")
             db.rollback()
 
-    def _notification_loop(self, event_id: int, manager):
-        """Repeatedly send messages until the event is resolved."""
-        logger.info(f"Starting notification loop for event {event_id}")
+    def _attach_clip(self, event_id: int, clip_path: str):
+        """Runs on the clip encoder thread once the clip file is written."""
         db = database.SessionLocal()
         try:
-            while manager.running:
-                # Refresh event from DB
-                db.expire_all()
-                event = db.query(database.FallEventModel).filter(database.FallEventModel.id == event_id).first()
-                if not event or event.is_resolved:
-                    logger.info(f"Event {event_id} resolved or deleted. Stopping notifications.")
-                    break
-                
-                # Wait 10 seconds before next reminder
-                # We wait at the beginning so the first reminder is 10s after the initial alert
-                for _ in range(10):
-                    if not manager.running: break
-                    time.sleep(1)
-                
-                if not manager.running: break
-                
-                # Re-check resolution after sleep
-                db.refresh(event)
-                if event.is_resolved:
-                    break
-                
-                # Send reminder
-                if self.detector.telegram_bot and self.detector.telegram_bot.base_url:
-                    msg = f"🚨 REMINDER: Fall event {event_id} (Source {self.source_id}) is still NOT resolved!"
-                    self.detector.telegram_bot.send_message(msg)
-                    logger.info(f"Sent reminder for event {event_id}")
-                    
+            event = db.query(database.FallEventModel).filter(database.FallEventModel.id == event_id).first()
+            if event:
+                event.clip_path = os.path.basename(clip_path)
+                bot = self.detector.telegram_bot
+                if bot and bot.base_url:
+                    self.manager.notifier.enqueue(db, "video", bot.token, bot.chat_id, {
+                        "caption": f"🎥 Fall event {event_id} (Source {self.source_id})", "path": clip_path,
+                    }, event_id=event_id)
+                db.commit()
+                self.manager.notifier.wake()
+                self.manager.event_hub.publish({"type": "event_update", "data": serialize_event(event)})
         except Exception as e:
-            logger.error(f"Error in notification loop for event {event_id}: {e}")
+            logger.error(f"Error attaching clip to event {event_id}: {e}")
+            db.rollback()
         finally:
             db.close()
 
+    def get_stats(self):
+        stats = self.detector.get_stats()
+        stats["stream"] = self.stream.get_stats()
+        stats["viewers"] = self.viewers
+        stats["detect_errors"] = self.detect_errors
+        stats["broadcast"] = self.broadcaster.get_stats()
+        stats["render"] = {"annotated": self.annotated_frames, "skipped": self.unannotated_frames}
+        stats["clips"] = self.clip_recorder.get_stats() if self.clip_recorder else None
+        stats["rate"] = self.manager.rate_controller.get_decisions().get(self.source_id)
+        return stats
+
     def get_processed_frame(self):
         with self.lock:
             return self.last_frame, self.last_events
@@ -167,6 +248,15 @@ class PipelineManager:
         self.polling_threads = {} # {bot_token: thread}
         self.polling_offsets = {} # {bot_token: offset}
         self.running = True
+        self.rate_controller = AdaptiveRateController(self)
+        # Detection worker processes (INFERENCE_WORKERS > 0), started with the first pipeline
+        self.worker_pool = InferenceWorkerPool()
+        # Pushes fall events and pipeline changes to multiplexed live connections
+        self.event_hub = EventHub()
+        # Persistent outbound Telegram queue; started with the app so pending rows resume
+        self.notifier = NotificationDispatcher()
+        # Single heap-based scheduler for "still not resolved" reminders
+        self.reminders = ReminderScheduler(self.notifier, on_load=self._ensure_polling)
 
     def _poll_telegram(self, bot_token: str):
         """Poll for updates for a specific bot token."""
@@ -200,6 +290,7 @@ class PipelineManager:
                 time.sleep(5)
 
     def _resolve_event(self, event_id: int, responder_name: str, responder_id: str, bot: TelegramBot, cb_id: str, chat_id: int):
+        self.reminders.cancel(event_id)
         db = database.SessionLocal()
         try:
             event = db.query(database.FallEventModel).filter(database.FallEventModel.id == event_id).first()
@@ -209,6 +300,7 @@ class PipelineManager:
                 event.responder_id = responder_id
                 event.resolved_at = datetime.utcnow()
                 db.commit()
+                self.event_hub.publish({"type": "event_update", "data": serialize_event(event)})
                 
                 logger.info(f"Event {event_id} resolved by {responder_name}")
                 
@@ -233,24 +325,30 @@ class PipelineManager:
         finally:
             db.close()
 
-    def start_pipeline(self, source_id: int, source_url: str, is_file: bool = False, telegram_config: Optional[Dict] = None):
+    def start_pipeline(self, source_id: int, source_url: str, is_file: bool = False, telegram_config: Optional[Dict] = None,
+                       backend: Optional[str] = None, capture_options: Optional[Dict] = None):
         with self.lock:
             if source_id in self.pipelines:
                 logger.info(f"Pipeline {source_id} already running.")
                 return
 
             logger.info(f"Starting pipeline for source {source_id}")
-            pipeline = PipelineInstance(source_id, source_url, self, is_file, telegram_config)
+            pipeline = PipelineInstance(source_id, source_url, self, is_file, telegram_config, backend, capture_options)
             pipeline.start()
             self.pipelines[source_id] = pipeline
+            self._publish_pipelines()
+            self.rate_controller.start()
             
             # Start polling for this bot if not already started
             if telegram_config and telegram_config.get("bot_token"):
-                token = telegram_config["bot_token"]
-                if token not in self.polling_threads:
-                    thread = threading.Thread(target=self._poll_telegram, args=(token,), daemon=True)
-                    thread.start()
-                    self.polling_threads[token] = thread
+                self._ensure_polling(telegram_config["bot_token"])
+
+    def _ensure_polling(self, token: str):
+        """Poll a bot for Resolve button callbacks (also for bots with resumed reminders only)."""
+        if token and token not in self.polling_threads:
+            thread = threading.Thread(target=self._poll_telegram, args=(token,), daemon=True)
+            thread.start()
+            self.polling_threads[token] = thread
 
     def stop_pipeline(self, source_id: int):
         with self.lock:
@@ -258,12 +356,23 @@ class PipelineManager:
                 logger.info(f"Stopping pipeline {source_id}")
                 self.pipelines[source_id].stop()
                 del self.pipelines[source_id]
+                self._publish_pipelines()
+
+    def _publish_pipelines(self):
+        self.event_hub.publish({"type": "pipelines", "active_source_ids": list(self.pipelines.keys())})
 
     def get_pipeline(self, source_id: int) -> Optional[PipelineInstance]:
         return self.pipelines.get(source_id)
 
+    def get_inference_stats(self) -> Dict:
+        return inference.get_all_stats()
+
+    def get_worker_stats(self) -> Dict:
+        return self.worker_pool.get_stats()
+
     def stop_all(self):
         self.running = False # Stop all polling loops
+        self.rate_controller.stop()
         with self.lock:
             for pid, pipeline in self.pipelines.items():
                 pipeline.stop()
@@ -271,3 +380,7 @@ class PipelineManager:
             
             # Wait for polling threads to finish (optional, since they are daemon)
             self.polling_threads.clear()
+        self.worker_pool.stop()
+        self.reminders.stop()
+        self.notifier.stop()
+        inference.stop_all()
@@ -0,0 +1,119 @@
+import glob
+import logging
+import os
+import re
+import shutil
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_GLOB = os.getenv("INT8_CALIBRATION_GLOB", "data/snapshots/fall_clip_*.mp4")
+CALIBRATION_FRAMES = int(os.getenv("INT8_CALIBRATION_FRAMES", "300"))
+
+
+def find_calibration_clips(pattern: str = None):
+    return sorted(glob.glob(pattern or CALIBRATION_GLOB))
+
+
+def sample_clip_frames(clip_paths, max_frames: int = CALIBRATION_FRAMES, target_h: int = 480):
+    """
+    Evenly sample up to max_frames frames across the given clips, resized to the
+    same 480p the pipeline feeds to the model.
+    """
+    counts = []
+    for path in clip_paths:
+        cap = cv2.VideoCapture(path)
+        counts.append(max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))))
+        cap.release()
+
+    total = sum(counts)
+    if total == 0:
+        return []
+    step = max(1, total // max_frames)
+
+    frames = []
+    for path in clip_paths:
+        cap = cv2.VideoCapture(path)
+        idx = 0
+        while len(frames) < max_frames:
+            ok = cap.grab()
+            if not ok:
+                break
+            if idx % step == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    h, w = frame.shape[:2]
+                    if h != target_h:
+                        frame = cv2.resize(frame, (int(w * target_h / float(h)), target_h), interpolation=cv2.INTER_AREA)
+                    frames.append(frame)
+            idx += 1
+        cap.release()
+    return frames
+
+
+def _to_model_input(frame, imgsz: int):
+    """Letterbox + BGR->RGB + CHW + [0,1], matching the ultralytics predictor for exported models."""
+    from ultralytics.data.augment import LetterBox
+
+    im = LetterBox((imgsz, imgsz), auto=False)(image=frame)
+    im = im[..., ::-1].transpose(2, 0, 1)
+    im = np.ascontiguousarray(im, dtype=np.float32) / 255.0
+    return im[None]
+
+
+def _head_ignored_scope(nncf, ov_model):
+    """
+    Keep only the Detect/Pose head's decoding in FP32, as ultralytics does: its
+    Add/Sub/Mul/Div/Sigmoid and DFL ops. Backbone and neck SiLUs (Sigmoid + Multiply)
+    are quantized. The head is the highest-numbered model.N block in the IR's node names
+    ("/model.22/..." from ONNX, "__module.model.22/..." from the PyTorch frontend).
+    """
+    blocks = [int(m.group(1)) for op in ov_model.get_ops()
+              for m in [re.search(r"model\.(\d+)[./]", op.get_friendly_name())] if m]
+    if not blocks:
+        logger.warning("No model.N node names in the IR; keeping every Multiply/Subtract/Sigmoid in FP32")
+        return nncf.IgnoredScope(types=["Multiply", "Subtract", "Sigmoid"])
+
+    head = rf"model\.{max(blocks)}[./]"
+    return nncf.IgnoredScope(
+        patterns=[f".*{head}.*{op}.*" for op in ("Add", "Sub", "Mul", "Div", "Sigmoid")] + [f".*{head}dfl.*"],
+        validate=False,  # Not every head variant has every op (e.g. no Div)
+    )
+
+
+def quantize_openvino_int8(fp32_dir: str, target_dir: str, imgsz: int, frames):
+    """
+    Post-training INT8 quantization of an exported OpenVINO IR with NNCF, calibrated on
+    our own footage. Writes <target_dir>/<name>.xml/.bin plus the ultralytics metadata.yaml
+    so the result loads through YOLO() like any other exported model.
+    """
+    if not frames:
+        raise RuntimeError(
+            f"INT8 calibration needs recorded clips; none found for '{CALIBRATION_GLOB}'. "
+            f"Set INT8_CALIBRATION_GLOB to point at fall_clip_*.mp4 files."
+        )
+
+    import nncf
+    from openvino.runtime import Core, serialize
+
+    xml = next(p for p in sorted(os.listdir(fp32_dir)) if p.endswith(".xml"))
+    ov_model = Core().read_model(os.path.join(fp32_dir, xml))
+
+    logger.info(f"Calibrating INT8 model on {len(frames)} frames...")
+    dataset = nncf.Dataset(frames, lambda f: _to_model_input(f, imgsz))
+    quantized = nncf.quantize(
+        ov_model,
+        dataset,
+        preset=nncf.QuantizationPreset.MIXED,
+        subset_size=len(frames),
+        ignored_scope=_head_ignored_scope(nncf, ov_model),
+    )
+
+    tmp_dir = target_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    serialize(quantized, os.path.join(tmp_dir, xml))
+    shutil.copy2(os.path.join(fp32_dir, "metadata.yaml"), os.path.join(tmp_dir, "metadata.yaml"))
+    os.replace(tmp_dir, target_dir)
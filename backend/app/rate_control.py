@@ -0,0 +1,188 @@
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveRateController:
+    """
+    Sets each pipeline's FallDetector.SKIP_FRAMES from the measured inference cost,
+    the CPU budget shared by all pipelines and each scene's state.
+
+    Budget is expressed in CPU-seconds of inference per wall-second (INFERENCE_CPU_BUDGET,
+    default 75% of the cores). It is handed out in priority order: streams with a pending
+    fall or active tracks always get at least the baseline rate, then motion-only scenes
+    get the baseline from what is left, then idle scenes their motion-gate heartbeats.
+    A shortfall is taken from motion-only and idle scenes. Spare budget goes to pending
+    streams first, then to the others by weight.
+    """
+
+    STATE_PRIORITY = ("pending", "active", "motion", "idle")
+    STATE_WEIGHTS = {"pending": 8.0, "active": 3.0, "motion": 2.0, "idle": 0.5}
+
+    def __init__(self, manager, cpu_budget=None, interval: float = 1.0):
+        self.manager = manager
+        cores = os.cpu_count() or 1
+        self.CPU_BUDGET = float(cpu_budget if cpu_budget is not None
+                                else os.getenv("INFERENCE_CPU_BUDGET", cores * 0.75))
+        self.enabled = os.getenv("ADAPTIVE_RATE", "1").lower() not in ("0", "false", "no")
+        self.INTERVAL = interval
+
+        self.MAX_INFER_FPS = float(os.getenv("MAX_INFER_FPS", "15"))
+        # The rate the fall heuristics were tuned at (30 fps source, SKIP_FRAMES=2). The velocity
+        # check compares samples 5 inferences apart, ~0.5 s at this rate; fewer inferences
+        # widen that window and blur the drop. Streams tracking someone never go below it.
+        self.BASELINE_INFER_FPS = float(os.getenv("BASELINE_INFER_FPS", "10"))
+        # Idle scenes only need enough frames for the motion gate to notice someone walking in.
+        # Motion-only scenes squeezed out of the budget keep this too; a detected person then
+        # turns the stream active, which restores the baseline.
+        self.IDLE_MIN_FPS = 2.0
+        self.DEFAULT_SOURCE_FPS = 30.0
+        self.DEFAULT_COST_MS = 50.0
+
+        self.decisions: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running or not self.enabled:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info(f"Adaptive rate controller started (cpu_budget={self.CPU_BUDGET:.2f} cores)")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+
+    def _run(self):
+        while self.running:
+            try:
+                self.update()
+            except Exception as e:
+                logger.error(f"Rate controller update failed: {e}")
+            time.sleep(self.INTERVAL)
+
+    def _measure(self, pipeline) -> Dict:
+        m = pipeline.detector.get_rate_inputs()
+        m["source_fps"] = m["source_fps"] or self.DEFAULT_SOURCE_FPS
+        m["cost_ms"] = m["cost_ms"] or self.DEFAULT_COST_MS
+        return m
+
+    def update(self):
+        with self.manager.lock:
+            pipelines = dict(self.manager.pipelines)
+        if not pipelines:
+            return
+
+        measured = {sid: self._measure(p) for sid, p in pipelines.items()}
+        decisions = self.compute(measured)
+        for sid, decision in decisions.items():
+            pipelines[sid].detector.SKIP_FRAMES = decision["skip_frames"]
+        with self._lock:
+            self.decisions = decisions
+
+    def compute(self, streams: Dict[int, Dict]) -> Dict[int, Dict]:
+        """
+        streams: {source_id: {"source_fps", "cost_ms", "state", "heartbeat_s"}}
+        Returns {source_id: decision} with the chosen inference rate and SKIP_FRAMES.
+        """
+        budget_ms = self.CPU_BUDGET * 1000.0  # inference-ms available per second
+        order: List[int] = sorted(streams, key=lambda sid: self.STATE_PRIORITY.index(streams[sid]["state"]))
+        pending = [sid for sid in order if streams[sid]["state"] == "pending"]
+        active = [sid for sid in order if streams[sid]["state"] == "active"]
+        motion = [sid for sid in order if streams[sid]["state"] == "motion"]
+        live = active + motion
+        idle = [sid for sid in order if streams[sid]["state"] == "idle"]
+
+        rates, max_rates = {}, {}
+        remaining = budget_ms
+        for sid in pending + live:
+            max_rates[sid] = min(streams[sid]["source_fps"], self.MAX_INFER_FPS)
+
+        def grant(sid, target):
+            """Raise sid towards `target` inferences/s with what is left of the budget."""
+            nonlocal remaining
+            cost = streams[sid]["cost_ms"]
+            add = min(max(0.0, min(target, max_rates[sid]) - rates[sid]), max(0.0, remaining) / cost)
+            rates[sid] += add
+            remaining -= add * cost
+
+        # 1. Pending falls, then active tracks, get the baseline no matter what, even if that
+        #    overruns the budget: below it the fall heuristics' velocity window stretches
+        for sid in pending + active:
+            rates[sid] = min(max_rates[sid], self.BASELINE_INFER_FPS)
+            remaining -= rates[sid] * streams[sid]["cost_ms"]
+
+        # 2. Motion without tracks: a minimal rate each, then the baseline out of what is left
+        for sid in motion:
+            rates[sid] = min(max_rates[sid], self.IDLE_MIN_FPS)
+            remaining -= rates[sid] * streams[sid]["cost_ms"]
+        for sid in motion:
+            grant(sid, self.BASELINE_INFER_FPS)
+
+        # 3. Idle streams: the motion gate only lets heartbeats through, so they cost
+        #    one inference per heartbeat. Their cadence degrades when we're out of budget.
+        for sid in idle:
+            s = streams[sid]
+            remaining -= s["cost_ms"] / max(0.1, s.get("heartbeat_s", 2.0))
+            rates[sid] = min(s["source_fps"], self.IDLE_MIN_FPS if remaining > 0 else self.IDLE_MIN_FPS / 2.0)
+
+        # 4. Spare budget: pending streams up to their max rate, then the rest shared by weight
+        for sid in pending:
+            grant(sid, max_rates[sid])
+        open_set = [sid for sid in live if rates[sid] < max_rates[sid]]
+        while remaining > 1e-6 and open_set:
+            total_w = sum(self.STATE_WEIGHTS[streams[sid]["state"]] * streams[sid]["cost_ms"] for sid in open_set)
+            spent = 0.0
+            still_open = []
+            for sid in open_set:
+                cost = streams[sid]["cost_ms"]
+                share = remaining * self.STATE_WEIGHTS[streams[sid]["state"]] * cost / total_w
+                add = min(share / cost, max_rates[sid] - rates[sid])
+                rates[sid] += add
+                spent += add * cost
+                if rates[sid] < max_rates[sid] - 1e-6:
+                    still_open.append(sid)
+            remaining -= spent
+            if spent <= 1e-6:
+                break
+            open_set = still_open
+
+        decisions = {}
+        for sid in order:
+            s = streams[sid]
+            skip = max(0, int(math.ceil(s["source_fps"] / max(rates[sid], 1e-3))) - 1)
+            if sid in max_rates and rates[sid] >= min(max_rates[sid], self.BASELINE_INFER_FPS) - 1e-6:
+                # Round towards more inferences so a granted baseline is not lost to rounding
+                skip = min(skip, max(0, int(s["source_fps"] // self.BASELINE_INFER_FPS) - 1))
+            decisions[sid] = {
+                "state": s["state"],
+                "skip_frames": skip,
+                "target_infer_fps": round(s["source_fps"] / (skip + 1), 2),
+                "source_fps": round(s["source_fps"], 2),
+                "cost_ms": round(s["cost_ms"], 2),
+                "over_budget": remaining < 0,
+            }
+        return decisions
+
+    def get_decisions(self) -> Dict[int, Dict]:
+        with self._lock:
+            return dict(self.decisions)
+
+    def get_status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "cpu_budget_cores": self.CPU_BUDGET,
+            "max_infer_fps": self.MAX_INFER_FPS,
+            "baseline_infer_fps": self.BASELINE_INFER_FPS,
+            "idle_min_fps": self.IDLE_MIN_FPS,
+            "decisions": self.get_decisions(),
+        }
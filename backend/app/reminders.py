@@ -0,0 +1,192 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func
+
+from . import database
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    """
+    One thread that sends "still not resolved" reminders for every open fall event.
+
+    Due reminders sit in a heap keyed by due time; cancel() just forgets the event and
+    its heap entry is skipped when it surfaces, so resolving an event costs nothing and
+    nothing polls the DB in between. When entries come due they are checked against the
+    DB in a single query (catches events deleted or resolved elsewhere) and the reminders
+    are handed to the NotificationDispatcher, unless the event's previous reminder is
+    still unsent. On start, open events are loaded in bulk from their notification
+    history, so reminders resume after a restart.
+    """
+
+    def __init__(self, notifier, on_load: Optional[Callable[[str], None]] = None):
+        self.notifier = notifier
+        # Called with each bot token that has resumed reminders (to start its callback polling)
+        self.on_load = on_load
+
+        # --- Tuning ---
+        self.INTERVAL = float(os.getenv("REMINDER_INTERVAL_S", "10"))
+
+        self._heap = []  # (due, event_id)
+        self._reminders: Dict[int, Dict] = {}  # event_id -> {due, source_id, bot_token, chat_id}
+        self._cond = threading.Condition()
+        self.thread = None
+        self.running = False
+
+        self.sent = 0
+        self.skipped = 0  # due while the previous reminder was still unsent
+        self.cancelled = 0
+
+    def schedule(self, event_id: int, source_id: int, bot_token: str, chat_id: str, delay: Optional[float] = None):
+        """Remind about `event_id` every INTERVAL seconds (first one after `delay`) until cancelled."""
+        due = time.time() + (self.INTERVAL if delay is None else max(0.0, delay))
+        with self._cond:
+            self._reminders[event_id] = {"due": due, "source_id": source_id, "bot_token": bot_token,
+                                         "chat_id": chat_id}
+            heapq.heappush(self._heap, (due, event_id))
+            self._cond.notify()
+
+    def cancel(self, event_id: int) -> bool:
+        with self._cond:
+            if self._reminders.pop(event_id, None) is None:
+                return False
+            self.cancelled += 1
+            self._cond.notify()
+        logger.info(f"Reminders for event {event_id} cancelled")
+        return True
+
+    def start(self):
+        with self._cond:
+            if self.running:
+                return
+            self.running = True
+        self.load()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify()
+
+    def load(self):
+        """Schedule every unresolved event that was notified, continuing its reminder cadence."""
+        Notification, Event = database.NotificationModel, database.FallEventModel
+        db = database.SessionLocal()
+        try:
+            rows = (db.query(Notification.event_id, Event.source_id, Notification.bot_token, Notification.chat_id,
+                             func.max(Notification.created_at))
+                    .join(Event, Event.id == Notification.event_id)
+                    .filter(Event.is_resolved == False)  # noqa: E712
+                    .group_by(Notification.event_id, Event.source_id, Notification.bot_token, Notification.chat_id)
+                    .all())
+        except Exception as e:
+            logger.error(f"Failed to load pending reminders: {e}")
+            return
+        finally:
+            db.close()
+
+        now = datetime.utcnow()
+        tokens = set()
+        for event_id, source_id, bot_token, chat_id, last_sent in rows:
+            if event_id in self._reminders:
+                continue
+            delay = self.INTERVAL - (now - last_sent).total_seconds() if last_sent else 0.0
+            self.schedule(event_id, source_id, bot_token, chat_id, delay=delay)
+            tokens.add(bot_token)
+        if rows:
+            logger.info(f"Resumed reminders for {len(self._reminders)} unresolved events")
+        if self.on_load:
+            for token in tokens:
+                self.on_load(token)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._pop_due()
+                while self.running and not due:
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._cond.wait(timeout)
+                    due = self._pop_due()
+                if not self.running:
+                    return
+            try:
+                self._fire(due)
+            except Exception as e:
+                logger.error(f"Reminder batch failed: {e}")
+            finally:
+                self._reschedule(due)
+
+    def _pop_due(self) -> List[int]:
+        """Pop due heap entries that are still current (caller holds the lock)."""
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            at, event_id = heapq.heappop(self._heap)
+            reminder = self._reminders.get(event_id)
+            if reminder and reminder["due"] == at:
+                due.append(event_id)
+        return due
+
+    def _fire(self, event_ids: List[int]):
+        Event, Notification = database.FallEventModel, database.NotificationModel
+        db = database.SessionLocal()
+        try:
+            still_open = {row[0] for row in db.query(Event.id).filter(Event.id.in_(event_ids),
+                                                                       Event.is_resolved == False).all()}  # noqa: E712
+            # A reminder still waiting in the outbox (outage, rate limit) already says the same thing
+            unsent = {row[0] for row in db.query(Notification.event_id).filter(
+                Notification.event_id.in_(event_ids), Notification.kind == "message",
+                Notification.status == "pending").distinct().all()}
+            for event_id in event_ids:
+                with self._cond:
+                    reminder = self._reminders.get(event_id)
+                if reminder is None:
+                    continue  # Cancelled while the query ran
+                if event_id not in still_open:
+                    self.cancel(event_id)
+                    continue
+                if event_id in unsent:
+                    self.skipped += 1
+                    continue
+                msg = f"🚨 REMINDER: Fall event {event_id} (Source {reminder['source_id']}) is still NOT resolved!"
+                self.notifier.enqueue(db, "message", reminder["bot_token"], reminder["chat_id"], {"text": msg},
+                                      event_id=event_id)
+                self.sent += 1
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.notifier.wake()
+
+    def _reschedule(self, event_ids: List[int]):
+        with self._cond:
+            for event_id in event_ids:
+                reminder = self._reminders.get(event_id)
+                if reminder is None:
+                    continue
+                # Keep the cadence, but never try to catch up on missed reminders
+                reminder["due"] = max(reminder["due"] + self.INTERVAL, time.time() + 1.0)
+                heapq.heappush(self._heap, (reminder["due"], event_id))
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            next_due = min((r["due"] for r in self._reminders.values()), default=None)
+            return {
+                "interval_s": self.INTERVAL,
+                "open_events": len(self._reminders),
+                "heap_size": len(self._heap),
+                "next_in_s": round(max(0.0, next_due - time.time()), 1) if next_due is not None else None,
+                "sent": self.sent,
+                "skipped": self.skipped,
+                "cancelled": self.cancelled,
+            }
@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+
+class RoiInference:
+    """
+    Track-focused inference: between periodic full-frame passes, pose is estimated only
+    on padded crops around the known track boxes, at a smaller input size, and the
+    detections are mapped back to frame coordinates. Cost then scales with the number
+    of people instead of the frame resolution.
+    """
+
+    def __init__(self, enabled=None):
+        if enabled is None:
+            enabled = os.getenv("ROI_INFERENCE", "0").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.IMGSZ = int(os.getenv("ROI_IMGSZ", "320"))
+        self.FULL_FRAME_SECONDS = float(os.getenv("ROI_FULL_FRAME_SECONDS", "1.0"))
+        self.PAD = 0.25          # crop padding, fraction of the box's longer side
+        self.MIN_CROP = 96       # px, so tiny boxes still get some context
+        self.MAX_TRACKS = 6      # past this many people a full-frame pass is cheaper
+        self.DEDUP_IOU = 0.7
+
+        self._last_full = None
+
+        # Counters
+        self.full_passes = 0
+        self.roi_passes = 0
+        self.crops = 0
+
+    def plan(self, now: float, track_boxes, frame_shape, motion_outside: bool = False):
+        """
+        Decide the next inference. Returns None for a full-frame pass, otherwise a list
+        of integer (x1, y1, x2, y2) crop rectangles, one per track box.
+        """
+        if (not self.enabled or len(track_boxes) == 0 or len(track_boxes) > self.MAX_TRACKS
+                or motion_outside or self._last_full is None
+                or (now - self._last_full) >= self.FULL_FRAME_SECONDS):
+            self._last_full = now
+            self.full_passes += 1
+            return None
+
+        self.roi_passes += 1
+        self.crops += len(track_boxes)
+        return [self.expand(b, frame_shape) for b in track_boxes]
+
+    def expand(self, box, frame_shape):
+        h, w = frame_shape[:2]
+        x1, y1, x2, y2 = [float(v) for v in box[:4]]
+        side = max(x2 - x1, y2 - y1, self.MIN_CROP)
+        pad = side * self.PAD
+        cx, cy = (x1 + x2) / 2.0, (y1 + y2) / 2.0
+        half_w = max(x2 - x1, self.MIN_CROP) / 2.0 + pad
+        half_h = max(y2 - y1, self.MIN_CROP) / 2.0 + pad
+        return (
+            int(max(0, cx - half_w)), int(max(0, cy - half_h)),
+            int(min(w, cx + half_w)), int(min(h, cy + half_h)),
+        )
+
+    @staticmethod
+    def _iou(a, b):
+        x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+        x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+        inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+        return inter / union if union > 0 else 0.0
+
+    def merge(self, frame, crops, track_boxes, crop_results, names):
+        """
+        Build one frame-level Results list (the shape model.predict returns) from per-crop
+        results. Each crop contributes the detection that best overlaps its track box;
+        keypoints/boxes are shifted back to frame coordinates so the heuristics and
+        skeleton drawing work unchanged.
+        """
+        boxes, kpts, chosen = [], [], []
+        for (cx1, cy1, _, _), track_box, res in zip(crops, track_boxes, crop_results):
+            r = res[0] if res else None
+            if r is None or r.boxes is None or len(r.boxes) == 0:
+                continue
+            b = r.boxes.data.cpu().numpy().copy()
+            b[:, [0, 2]] += cx1
+            b[:, [1, 3]] += cy1
+
+            ious = [self._iou(row, track_box) for row in b]
+            best = int(np.argmax(ious))
+            if ious[best] <= 0.0:
+                continue
+            if any(self._iou(b[best], c) > self.DEDUP_IOU for c in chosen):
+                continue  # same person picked up by a neighbouring crop
+            chosen.append(b[best])
+            boxes.append(b[best])
+
+            if r.keypoints is not None:
+                k = r.keypoints.data[best].cpu().numpy().copy()
+                k[:, 0] += cx1
+                k[:, 1] += cy1
+                kpts.append(k)
+
+        if boxes:
+            boxes_t = torch.as_tensor(np.stack(boxes), dtype=torch.float32)
+            kpts_t = torch.as_tensor(np.stack(kpts), dtype=torch.float32) if len(kpts) == len(boxes) else None
+        else:
+            boxes_t = torch.zeros((0, 6), dtype=torch.float32)
+            kpts_t = torch.zeros((0, 17, 3), dtype=torch.float32)
+        # Results re-zeroes keypoints with conf < 0.5, so invisible points stay at (0, 0)
+        return [Results(orig_img=frame, path="", names=names, boxes=boxes_t, keypoints=kpts_t)]
+
+    def get_stats(self):
+        total = self.full_passes + self.roi_passes
+        return {
+            "enabled": self.enabled,
+            "imgsz": self.IMGSZ,
+            "full_passes": self.full_passes,
+            "roi_passes": self.roi_passes,
+            "crops": self.crops,
+            "roi_ratio": (self.roi_passes / total) if total else 0.0,
+        }
@@ -59,6 +59,7 @@ class FallEventBase(BaseModel):
     fall_score: float
     timestamp: datetime
     snapshot_path: Optional[str] = None
+    clip_path: Optional[str] = None
     is_resolved: bool = False
     responder_name: Optional[str] = None
     responder_id: Optional[str] = None
@@ -81,3 +82,16 @@ class PipelineStatus(BaseModel):
 class PipelineStart(BaseModel):
     source_id: int
     telegram_config: Optional[dict] = None
+    inference_backend: Optional[str] = None  # 'pytorch', 'onnx', 'openvino'; defaults to INFERENCE_BACKEND
+    capture_backend: Optional[str] = None  # 'opencv', 'ffmpeg'; defaults to CAPTURE_BACKEND
+    capture_max_fps: Optional[float] = None  # ffmpeg only: drop frames at the decoder above this rate
+    frame_queue_depth: Optional[int] = None  # frame ring slots; defaults to FRAME_QUEUE_DEPTH
+    frame_policy: Optional[str] = None  # 'latest' or 'drop_oldest'; defaults to FRAME_POLICY
+
+class AnalysisCreate(BaseModel):
+    filename: Optional[str] = None  # a file in data/uploads (as returned by /upload)
+    source_id: Optional[int] = None  # or a registered 'file' source
+    annotate: bool = False  # save an annotated frame for each detected fall
+    infer_every: Optional[int] = None  # analyze every Nth frame (others are skipped without decoding); defaults to the live cadence
+    batch_size: int = 8  # frames per model call
+    inference_backend: Optional[str] = None
@@ -1,92 +1,367 @@
 import cv2
+import numpy as np
+import os
+import random
 import time
 import threading
-import queue
 import logging
 from typing import Optional
+from .ffmpeg_capture import FFmpegCapture, ffmpeg_available
+from .frame_ring import FrameRing, FramePacket, FRAME_POLICIES
 
 logger = logging.getLogger(__name__)
 
+CAPTURE_BACKENDS = ("opencv", "ffmpeg")
+DEFAULT_CAPTURE_BACKEND = os.getenv("CAPTURE_BACKEND", "opencv")
+
+
+def normalize_capture_backend(name: Optional[str]) -> str:
+    name = (name or DEFAULT_CAPTURE_BACKEND).strip().lower()
+    if name not in CAPTURE_BACKENDS:
+        raise ValueError(f"Unknown capture backend '{name}'. Choose one of: {', '.join(CAPTURE_BACKENDS)}")
+    if name == "ffmpeg" and not ffmpeg_available():
+        raise ValueError("The ffmpeg capture backend needs the ffmpeg and ffprobe binaries on PATH")
+    return name
+
+
+def normalize_frame_policy(name: Optional[str]) -> str:
+    name = (name or os.getenv("FRAME_POLICY", "latest")).strip().lower()
+    if name not in FRAME_POLICIES:
+        raise ValueError(f"Unknown frame policy '{name}'. Choose one of: {', '.join(FRAME_POLICIES)}")
+    return name
+
+
+class StreamWatchdog:
+    """
+    One shared thread that checks every live stream once a second: it updates the
+    effective FPS and forces a reconnect on streams that stopped delivering frames
+    (a stalled RTSP session can keep read() blocked without ever failing).
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._streams = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, stream):
+        with self._lock:
+            self._streams.add(stream)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def unregister(self, stream):
+        with self._lock:
+            self._streams.discard(stream)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                streams = list(self._streams)
+            now = time.monotonic()
+            for stream in streams:
+                try:
+                    stream._watchdog_tick(now)
+                except Exception as e:
+                    logger.error(f"Stream watchdog error ({stream.source_url}): {e}")
+
+
+_WATCHDOG = StreamWatchdog()
+
+
 class VideoStream:
-    def __init__(self, source_url: str, is_file: bool = False):
+    def __init__(self, source_url: str, is_file: bool = False, backend: Optional[str] = None,
+                 max_fps: Optional[float] = None, queue_depth: Optional[int] = None,
+                 frame_policy: Optional[str] = None):
         self.source_url = source_url
         self.is_file = is_file
+        # 'opencv' decodes full size; 'ffmpeg' decodes straight to 480p (optionally fps-limited)
+        self.backend = normalize_capture_backend(backend)
+        self.max_fps = max_fps if max_fps is not None else float(os.getenv("CAPTURE_MAX_FPS", "0"))
         self.cap = None
         self.running = False
         self.lock = threading.Lock()
-        self.frame_queue = queue.Queue(maxsize=5) # Drop frames if processing is slow
+        # Frames are decoded in place into a preallocated ring; readers block on it
+        self.ring = FrameRing(
+            depth=queue_depth if queue_depth is not None else int(os.getenv("FRAME_QUEUE_DEPTH", "4")),
+            policy=normalize_frame_policy(frame_policy),
+        )
+        self._frame_shape = None
+        # Optional decode filter: frame_filter(frame_index) -> False means the frame is
+        # only grabbed (demuxed), never decoded or published.
+        self.frame_filter = None
+        self.frame_index = -1
+        self.grabbed_only = 0
         self.thread = None
+        self._stop_event = threading.Event()
+
+        # Reconnect engine
+        self.OPEN_TIMEOUT = float(os.getenv("STREAM_OPEN_TIMEOUT_S", "10"))
+        self.READ_TIMEOUT = float(os.getenv("STREAM_READ_TIMEOUT_S", "5"))
+        self.STALL_SECONDS = float(os.getenv("STREAM_STALL_SECONDS", "10"))
+        self.BACKOFF_BASE = 0.5
+        self.BACKOFF_MAX = float(os.getenv("RECONNECT_BACKOFF_MAX_S", "30"))
+        self.MAX_READ_FAILURES = 3  # consecutive failed reads before reopening
+
+        # Health
+        self.state = "stopped"  # connecting | streaming | backoff | stopped | failed
+        self.reconnects = 0
+        self.stalls = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.time_to_first_frame = None
+        self.connected_since = None
+        self.effective_fps = 0.0
+        self._frames_total = 0
+        self._last_frame_mono = None
+        self._fps_mark = None
+        self._reconnect_requested = False
 
     def start(self):
         if self.running:
             return
         self.running = True
+        self._stop_event.clear()
+        self.ring.reopen()
         self.thread = threading.Thread(target=self._update, daemon=True)
         self.thread.start()
+        if not self.is_file:
+            _WATCHDOG.register(self)
         logger.info(f"Started video stream: {self.source_url}")
 
     def stop(self):
         self.running = False
+        self._stop_event.set()
+        _WATCHDOG.unregister(self)
+        self.ring.close()
         if self.thread:
             # Use a small timeout to avoid hanging the API if VideoCapture is stuck
             self.thread.join(timeout=1.0)
         if self.cap:
             self.cap.release()
+        self.state = "stopped"
         logger.info(f"Stopped video stream: {self.source_url}")
 
-    def _update(self):
-        # Open capture in background thread
+    def _open_capture(self):
+        if self.backend == "ffmpeg":
+            # Frames normally go straight into ring slots; the capture's own pool only
+            # serves the first frame and frames dropped because every slot was pinned.
+            return FFmpegCapture(self.source_url, max_fps=self.max_fps, buffers=2,
+                                 timeout=None if self.is_file else self.OPEN_TIMEOUT)
         if self.source_url.isdigit():
-            self.cap = cv2.VideoCapture(int(self.source_url))
+            return cv2.VideoCapture(int(self.source_url))
+        if self.is_file:
+            return cv2.VideoCapture(self.source_url)
+        # Bounded open/read so a dead camera can't hang the capture thread
+        # Force TCP for RTSP reliability
+        # os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = "rtsp_transport;tcp"
+        return cv2.VideoCapture(self.source_url, cv2.CAP_FFMPEG, [
+            cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(self.OPEN_TIMEOUT * 1000),
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(self.READ_TIMEOUT * 1000),
+        ])
+
+    def _capture_one(self) -> bool:
+        """Decode the next frame into a free ring slot and publish it."""
+        self.frame_index += 1
+        if self.frame_filter is not None and not self.frame_filter(self.frame_index):
+            # Nobody will look at this frame: advance the stream without decoding it
+            if not self.cap.grab():
+                return False
+            self.grabbed_only += 1
+            return True
+
+        acquired = self.ring.acquire_write(self._frame_shape) if self._frame_shape is not None else None
+        if acquired is not None:
+            slot, buf = acquired
+            ret, frame = self.cap.read(buf)
         else:
-            # Force TCP for RTSP reliability
-            # os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = "rtsp_transport;tcp"
-            self.cap = cv2.VideoCapture(self.source_url)
+            ret, frame = self.cap.read()
+        ts = time.time()
+        if not ret or frame is None:
+            return False
 
-        if not self.running:
-            if self.cap: self.cap.release()
-            return
+        if acquired is None or frame is not buf:
+            # First frame, a resolution change, or every slot pinned: copy into the ring
+            self._frame_shape = frame.shape
+            acquired = self.ring.acquire_write(frame.shape, frame.dtype)
+            if acquired is None:
+                self.ring.drop()
+                return True
+            slot, buf = acquired
+            np.copyto(buf, frame)
+        self.ring.publish(slot, ts, self.frame_index)
+        return True
 
-        if not self.cap or not self.cap.isOpened():
-            logger.error(f"Failed to open video source: {self.source_url}")
-            self.running = False
-            return
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter: 0.5-1.0 x min(BACKOFF_MAX, BACKOFF_BASE * 2^attempt)."""
+        return min(self.BACKOFF_MAX, self.BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
 
+    def _update(self):
+        attempt = 0
         while self.running:
+            self.state = "connecting"
+            t_open = time.monotonic()
+            self._last_frame_mono = t_open
+            # Open capture in background thread
+            self.cap = self._open_capture()
+
+            if not self.running:
+                if self.cap: self.cap.release()
+                return
+
             if not self.cap or not self.cap.isOpened():
-                logger.error("Video source not opened")
-                self.running = False
+                self.last_error = "open failed"
+                self.consecutive_failures += 1
+                if self.cap:
+                    self.cap.release()
+                if self.is_file:
+                    logger.error(f"Failed to open video source: {self.source_url}")
+                    self.running = False
+                    self.state = "failed"
+                    return
+                delay = self._backoff_delay(attempt)
+                attempt += 1
+                logger.warning(f"Failed to open video source: {self.source_url} (retry in {delay:.1f}s)")
+                self.state = "backoff"
+                self._stop_event.wait(delay)
+                continue
+
+            if self._stream_until_failure(t_open):
+                attempt = 0  # we got frames, so start the backoff over
+            if self.cap:
+                self.cap.release()
+            if not self.running:
                 break
 
-            ret, frame = self.cap.read()
-            if not ret:
+            self.reconnects += 1
+            delay = self._backoff_delay(attempt)
+            attempt += 1
+            logger.warning(f"Reconnecting to {self.source_url} in {delay:.1f}s ({self.last_error})")
+            self.state = "backoff"
+            self._stop_event.wait(delay)
+
+    def _stream_until_failure(self, t_open: float) -> bool:
+        """Read frames until the source fails or stalls. Returns True if any frame arrived."""
+        # Live sources block in read(); files are paced to their native frame rate
+        frame_interval = 0.0
+        if self.is_file:
+            fps = self.cap.get(cv2.CAP_PROP_FPS)
+            frame_interval = 1.0 / fps if fps and fps > 0 else 1.0 / 30.0
+        next_due = time.monotonic()
+        got_frame = False
+        failures = 0
+        self._reconnect_requested = False
+        self._last_frame_mono = time.monotonic()
+
+        while self.running:
+            if not self.cap or not self.cap.isOpened():
+                self.last_error = "capture closed"
+                return got_frame
+
+            try:
+                ok = self._capture_one()
+            except Exception as e:
+                # e.g. the watchdog closed a stalled ffmpeg pipe under us
+                logger.error(f"Capture error on {self.source_url}: {e}")
+                ok = False
+
+            if self._reconnect_requested:
+                self.last_error = "stalled"
+                return got_frame
+
+            if not ok:
                 if self.is_file:
                     # Loop video file
                     self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
                     continue
-                else:
-                    logger.error("Failed to read frame")
-                    # Try reconnect logic here if needed
-                    time.sleep(1)
-                    continue
+                failures += 1
+                self.consecutive_failures += 1
+                logger.error("Failed to read frame")
+                if failures >= self.MAX_READ_FAILURES:
+                    self.last_error = "read failed"
+                    return got_frame
+                continue
 
-            # Manage queue size
-            if self.frame_queue.full():
-                try:
-                    self.frame_queue.get_nowait()
-                except queue.Empty:
-                    pass
-            
-            self.frame_queue.put(frame)
-            
-            # Limit capture FPS if needed (simple sleep)
-            time.sleep(0.01)
+            failures = 0
+            self.consecutive_failures = 0
+            self._frames_total += 1
+            self._last_frame_mono = time.monotonic()
+            if not got_frame:
+                got_frame = True
+                self.state = "streaming"
+                self.time_to_first_frame = self._last_frame_mono - t_open
+                self.connected_since = time.time()
+
+            if frame_interval:
+                next_due += frame_interval
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -1.0:
+                    next_due = time.monotonic()  # fell far behind, don't try to catch up
+        return got_frame
+
+    def _watchdog_tick(self, now: float):
+        if self._fps_mark is not None:
+            frames, t = self._fps_mark
+            if now > t:
+                fps = (self._frames_total - frames) / (now - t)
+                self.effective_fps = fps if self.effective_fps == 0.0 else 0.7 * self.effective_fps + 0.3 * fps
+        self._fps_mark = (self._frames_total, now)
+
+        if (self.state in ("connecting", "streaming") and self._last_frame_mono is not None
+                and now - self._last_frame_mono > max(self.STALL_SECONDS, self.OPEN_TIMEOUT if self.state == "connecting" else 0)):
+            if self._reconnect_requested:
+                return
+            self.stalls += 1
+            self._reconnect_requested = True
+            logger.warning(f"Stream {self.source_url} stalled ({now - self._last_frame_mono:.1f}s without frames)")
+            if isinstance(self.cap, FFmpegCapture):
+                # Killing ffmpeg unblocks the pipe read; cv2 reads return on their own READ_TIMEOUT
+                self.cap.release()
+
+    def get_health(self):
+        last_age = (time.monotonic() - self._last_frame_mono) if self._last_frame_mono is not None else None
+        return {
+            "state": self.state,
+            "reconnects": self.reconnects,
+            "stalls": self.stalls,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "time_to_first_frame_s": round(self.time_to_first_frame, 3) if self.time_to_first_frame is not None else None,
+            "connected_since": self.connected_since,
+            "effective_fps": round(self.effective_fps, 2),
+            "last_frame_age_s": round(last_age, 2) if last_age is not None else None,
+        }
+
+    def read_packet(self, timeout: Optional[float] = None) -> Optional[FramePacket]:
+        """
+        Wait up to timeout for the next frame (per the ring policy). The returned
+        packet's frame is a view of a ring slot: call release(packet) when done with it.
+        """
+        return self.ring.read(timeout)
+
+    def release(self, packet: FramePacket):
+        self.ring.release(packet)
 
     def read(self):
-        try:
-            return self.frame_queue.get_nowait()
-        except queue.Empty:
+        """Non-blocking: returns a copy of the next frame, or None."""
+        packet = self.ring.read(timeout=0)
+        if packet is None:
             return None
+        try:
+            return packet.frame.copy()
+        finally:
+            self.ring.release(packet)
+
+    def get_stats(self):
+        stats = self.ring.get_stats()
+        stats["backend"] = self.backend
+        stats["grabbed_only"] = self.grabbed_only
+        stats["health"] = self.get_health()
+        return stats
 
 class StreamManager:
     def __init__(self):
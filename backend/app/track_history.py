@@ -0,0 +1,159 @@
+import os
+
+import numpy as np
+
+
+class TrackHistory:
+    """
+    Fixed-size per-track history of (timestamp, y_center, height) kept as NumPy ring
+    buffers, one row per track slot (structure of arrays). Replaces the per-track
+    deque of tuples so the velocity check runs over all tracks of a frame at once.
+
+    It is also the per-stream track-state store: every track has a last-seen time, and
+    tracks unseen for TTL_SECONDS, or the least recently seen once MAX_TRACKS is reached,
+    are evicted. on_evict(track_id) lets the owner drop its own per-track state too.
+    """
+
+    def __init__(self, capacity: int = 60, initial_slots: int = 16, ttl_seconds=None, max_tracks=None,
+                 on_evict=None):
+        self.capacity = capacity
+        self.TTL_SECONDS = float(ttl_seconds if ttl_seconds is not None
+                                 else os.getenv("TRACK_STATE_TTL_SECONDS", "30"))
+        self.MAX_TRACKS = int(max_tracks if max_tracks is not None else os.getenv("TRACK_STATE_MAX", "256"))
+        self.EVICT_INTERVAL = 1.0  # seconds between TTL sweeps
+        self.on_evict = on_evict
+
+        self._slots = {}  # track_id -> slot row
+        self._free = list(range(initial_slots - 1, -1, -1))
+        self.t = np.zeros((initial_slots, capacity), dtype=np.float64)
+        self.y = np.zeros((initial_slots, capacity), dtype=np.float64)
+        self.h = np.zeros((initial_slots, capacity), dtype=np.float64)
+        self.head = np.zeros(initial_slots, dtype=np.int64)   # next write position
+        self.count = np.zeros(initial_slots, dtype=np.int64)  # samples held, <= capacity
+        self.last_seen = np.full(initial_slots, np.inf, dtype=np.float64)  # inf = free slot
+        self._last_sweep = None
+
+        # Counters
+        self.peak_live = 0
+        self.evicted_ttl = 0
+        self.evicted_cap = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, track_id):
+        return int(track_id) in self._slots
+
+    def _grow(self):
+        old = len(self.head)
+        new = old * 2
+        for name in ("t", "y", "h"):
+            arr = getattr(self, name)
+            grown = np.zeros((new, self.capacity), dtype=arr.dtype)
+            grown[:old] = arr
+            setattr(self, name, grown)
+        self.head = np.concatenate([self.head, np.zeros(new - old, dtype=np.int64)])
+        self.count = np.concatenate([self.count, np.zeros(new - old, dtype=np.int64)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(new - old, np.inf)])
+        self._free.extend(range(new - 1, old - 1, -1))
+
+    def _slot(self, track_id: int, ts: float) -> int:
+        slot = self._slots.get(track_id)
+        if slot is None:
+            if len(self._slots) >= self.MAX_TRACKS:
+                # Evict the least recently seen track, but never one seen in this frame
+                lru = int(np.argmin(self.last_seen))
+                if self.last_seen[lru] < ts:
+                    self.evicted_cap += 1
+                    self._evict(self._track_of(lru))
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self.head[slot] = 0
+            self.count[slot] = 0
+            self.last_seen[slot] = ts
+            self._slots[track_id] = slot
+            self.peak_live = max(self.peak_live, len(self._slots))
+        return slot
+
+    def _track_of(self, slot: int) -> int:
+        return next(tid for tid, s in self._slots.items() if s == slot)
+
+    def append(self, track_ids, ts: float, ys, hs):
+        """Append one sample per track (all at time ts); returns the tracks' slot rows."""
+        ids = [int(tid) for tid in track_ids]
+        # Refresh known tracks first so the cap never evicts a track present in this frame
+        for tid in ids:
+            slot = self._slots.get(tid)
+            if slot is not None:
+                self.last_seen[slot] = ts
+        slots = np.fromiter((self._slot(tid, ts) for tid in ids), dtype=np.int64, count=len(ids))
+        pos = self.head[slots]
+        self.t[slots, pos] = ts
+        self.y[slots, pos] = ys
+        self.h[slots, pos] = hs
+        self.head[slots] = (pos + 1) % self.capacity
+        self.count[slots] = np.minimum(self.count[slots] + 1, self.capacity)
+        return slots
+
+    def max_velocity(self, slots, lag: int = 5, min_index: int = 6):
+        """
+        Largest downward velocity (heights/sec) per slot, comparing each sample with the
+        one `lag` samples earlier. Samples are indexed oldest-first and only indices
+        >= min_index are used; tracks without a valid pair get 0.0.
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        if len(slots) == 0:
+            return np.zeros(0, dtype=np.float64)
+        cap = self.capacity
+        idx = np.arange(cap)
+        count = self.count[slots][:, None]
+        start = (self.head[slots][:, None] - count) % cap
+        curr = (start + idx) % cap
+        prev = (start + idx - lag) % cap
+        rows = slots[:, None]
+
+        t_curr, y_curr, h_curr = self.t[rows, curr], self.y[rows, curr], self.h[rows, curr]
+        t_prev, y_prev = self.t[rows, prev], self.y[rows, prev]
+        dt = t_curr - t_prev
+
+        valid = (idx >= min_index) & (idx < count) & (dt > 1e-6) & (h_curr > 1e-6)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            v_norm = ((y_curr - y_prev) / dt) / h_curr  # positive = down
+        v_norm = np.where(valid, v_norm, 0.0)
+        return np.maximum(v_norm.max(axis=1), 0.0)
+
+    def evict_stale(self, now: float):
+        """Drop tracks not seen for TTL_SECONDS (at most one sweep per EVICT_INTERVAL)."""
+        if self._last_sweep is not None and (now - self._last_sweep) < self.EVICT_INTERVAL:
+            return
+        self._last_sweep = now
+        stale = np.flatnonzero(self.last_seen < now - self.TTL_SECONDS)
+        if len(stale) == 0:
+            return
+        by_slot = {s: tid for tid, s in self._slots.items()}
+        for slot in stale:
+            self.evicted_ttl += 1
+            self._evict(by_slot[int(slot)])
+
+    def _evict(self, track_id: int):
+        self.release(track_id)
+        if self.on_evict is not None:
+            self.on_evict(track_id)
+
+    def release(self, track_id):
+        slot = self._slots.pop(int(track_id), None)
+        if slot is not None:
+            self.last_seen[slot] = np.inf
+            self._free.append(slot)
+
+    def get_stats(self):
+        return {
+            "live": len(self._slots),
+            "peak_live": self.peak_live,
+            "evicted_ttl": self.evicted_ttl,
+            "evicted_cap": self.evicted_cap,
+            "slots_allocated": len(self.head),
+            "ttl_seconds": self.TTL_SECONDS,
+            "max_tracks": self.MAX_TRACKS,
+        }
@@ -0,0 +1,84 @@
+import logging
+import threading
+
+import torch
+from ultralytics.trackers.bot_sort import BOTSORT
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.trackers.basetrack import BaseTrack
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+logger = logging.getLogger(__name__)
+
+_TRACKER_MAP = {"bytetrack": BYTETracker, "botsort": BOTSORT}
+
+# Ultralytics hands out track IDs from one class-level counter (BaseTrack._count)
+# and every tracker __init__/reset() zeroes it. We swap a per-stream counter in
+# and out under this lock so each camera gets its own stable ID sequence.
+_TRACKER_ID_LOCK = threading.Lock()
+
+
+class StreamTracker:
+    """
+    Tracker state for one video stream, decoupled from the shared YOLO model.
+    Mirrors what model.track(persist=True) does in its postprocess callback.
+    """
+
+    def __init__(self, tracker_cfg: str = "botsort.yaml", frame_rate: int = 30):
+        cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_cfg)))
+        if cfg.tracker_type not in _TRACKER_MAP:
+            raise ValueError(f"Unsupported tracker type: {cfg.tracker_type}")
+        self._next_id = 0
+        with _TRACKER_ID_LOCK:
+            saved = BaseTrack._count
+            self._tracker = _TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+            BaseTrack._count = saved
+
+    def update(self, results, img):
+        """
+        Assign track IDs to a list of Results (as returned by model.predict)
+        for a single image. Returns the list in the same shape model.track() would.
+        """
+        if not results:
+            return results
+        r0 = results[0]
+        if r0.boxes is None:
+            return results
+
+        det = r0.boxes.cpu().numpy()
+        if len(det) == 0:
+            return results
+
+        with _TRACKER_ID_LOCK:
+            saved = BaseTrack._count
+            BaseTrack._count = self._next_id
+            try:
+                tracks = self._tracker.update(det, img)
+            finally:
+                self._next_id = BaseTrack._count
+                BaseTrack._count = saved
+
+        if len(tracks) == 0:
+            return results
+
+        idx = tracks[:, -1].astype(int)
+        r0 = r0[idx]
+        r0.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return [r0]
+
+    def get_stats(self):
+        t = self._tracker
+        return {
+            "frame_id": t.frame_id,
+            "tracked": len(t.tracked_stracks),
+            "lost": len(t.lost_stracks),
+            "removed": len(t.removed_stracks),
+            "ids_issued": self._next_id,
+        }
+
+    def reset(self):
+        with _TRACKER_ID_LOCK:
+            saved = BaseTrack._count
+            self._tracker.reset()
+            BaseTrack._count = saved
+        self._next_id = 0
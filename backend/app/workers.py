@@ -0,0 +1,385 @@
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from .cv_pipeline import FallDetector, FrameDetections
+from .notifications import TelegramBot
+
+logger = logging.getLogger(__name__)
+
+
+def workers_configured() -> int:
+    """Number of detection worker processes (INFERENCE_WORKERS, 0 = detect in-process)."""
+    return max(0, int(os.getenv("INFERENCE_WORKERS", "0")))
+
+
+def _worker_main(task_q, result_q, threads: int):
+    """
+    Worker process loop. Hosts one FallDetector per assigned source (weights are shared
+    through the detector's model cache) and reads frames out of each source's
+    shared-memory ring. Only FrameDetections and a small stats snapshot go back.
+    """
+    logging.basicConfig(level=logging.INFO)
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    detectors = {}  # source_id -> FallDetector
+    rings = {}      # source_id -> (SharedMemory, slot_bytes)
+
+    while True:
+        msg = task_q.get()
+        if msg is None:
+            break
+        kind, sid = msg[0], msg[1]
+        try:
+            if kind == "open":
+                opts = msg[2]
+                detectors[sid] = FallDetector(use_batching=False, backend=opts.get("backend"))
+            elif kind == "attach":
+                _, _, shm_name, slot_bytes = msg
+                old = rings.pop(sid, None)
+                if old is not None:
+                    old[0].close()
+                rings[sid] = (shared_memory.SharedMemory(name=shm_name), slot_bytes)
+            elif kind == "frame":
+                _, _, seq, slot, shape, ts, frame_index = msg
+                shm, slot_bytes = rings[sid]
+                view = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+                # One memcpy out of the slot: last_results keeps a reference to the image,
+                # and the producer reuses the slot a few frames later.
+                frame = view.copy()
+                del view
+                det = detectors[sid]
+                _, detections = det.detect(frame, ts, frame_index)
+                result_q.put((sid, seq, detections, {
+                    "stats": det.get_stats(),
+                    "rate": det.get_rate_inputs(),
+                    "last_infer_ms": det.last_infer_ms,
+                }, None))
+            elif kind == "config":
+                det = detectors[sid]
+                for key, value in msg[2].items():
+                    if key == "night_mode":
+                        det.set_night_mode(value)
+                    elif key == "skip_frames":
+                        det.SKIP_FRAMES = value
+            elif kind == "close":
+                detectors.pop(sid, None)
+                ring = rings.pop(sid, None)
+                if ring is not None:
+                    ring[0].close()
+        except Exception as e:
+            logger.error(f"Worker {os.getpid()} failed on '{kind}' for source {sid}: {e}")
+            if kind == "frame":
+                result_q.put((sid, msg[2], None, None, str(e)))
+
+    for shm, _ in rings.values():
+        shm.close()
+
+
+class ProcessDetector:
+    """
+    Main-process stand-in for a FallDetector whose inference and heuristics run in a
+    worker process. Frames are resized to 480p and written into a small shared-memory
+    ring; the worker returns FrameDetections, which are drawn here.
+    """
+
+    SLOTS = 3
+    RESULT_TIMEOUT = 5.0
+    # How often a wait for results checks that the worker is still alive
+    LIVENESS_POLL = 0.25
+
+    def __init__(self, pool, source_id: int, worker_idx: int, telegram_config: Optional[Dict] = None,
+                 backend: Optional[str] = None):
+        self.pool = pool
+        self.source_id = source_id
+        self.worker_idx = worker_idx
+        self.backend = backend
+        self.TARGET_H = 480
+
+        token = telegram_config.get("bot_token") if telegram_config else None
+        chat_id = telegram_config.get("chat_id") if telegram_config else None
+        self.telegram_bot = TelegramBot(token=token, chat_id=chat_id)
+
+        self._shm = None
+        self._slot_bytes = 0
+        self._slot = 0
+        self._seq = 0
+        self._skip_frames = 2
+        self.night_mode = False
+
+        self._result_cond = threading.Condition()
+        self._result = None  # (seq, detections, snapshot, error)
+
+        # Snapshot of the worker-side detector, refreshed with every result
+        self.last_infer_ms = 0.0
+        self._stats = {}
+        self._rate = {"source_fps": 0.0, "cost_ms": 0.0, "state": "idle", "heartbeat_s": 2.0}
+
+    @property
+    def SKIP_FRAMES(self):
+        return self._skip_frames
+
+    @SKIP_FRAMES.setter
+    def SKIP_FRAMES(self, value):
+        if value != self._skip_frames:
+            self._skip_frames = value
+            self.pool._send(self.worker_idx, ("config", self.source_id, {"skip_frames": value}))
+
+    def set_night_mode(self, enabled: bool):
+        self.night_mode = enabled
+        self.pool._send(self.worker_idx, ("config", self.source_id, {"night_mode": enabled}))
+        logger.info(f"Night mode set to: {enabled}")
+
+    def _resize_to_480h(self, frame):
+        h, w = frame.shape[:2]
+        if h == self.TARGET_H:
+            return frame
+        new_w = int(w * self.TARGET_H / float(h))
+        return cv2.resize(frame, (new_w, self.TARGET_H), interpolation=cv2.INTER_AREA)
+
+    def reopen_messages(self):
+        """Messages that rebuild this source's state in a fresh worker process."""
+        msgs = [("open", self.source_id, {"backend": self.backend})]
+        if self._shm is not None:
+            msgs.append(("attach", self.source_id, self._shm.name, self._slot_bytes))
+        msgs.append(("config", self.source_id, {"night_mode": self.night_mode, "skip_frames": self._skip_frames}))
+        return msgs
+
+    def _ensure_ring(self, nbytes: int):
+        if self._shm is not None and nbytes <= self._slot_bytes:
+            return
+        old = self._shm
+        self._slot_bytes = nbytes
+        self._shm = shared_memory.SharedMemory(create=True, size=nbytes * self.SLOTS)
+        self.pool._send(self.worker_idx, ("attach", self.source_id, self._shm.name, nbytes))
+        if old is not None:
+            old.close()
+            old.unlink()
+
+    def process_frame(self, frame, current_time=None, frame_index=None):
+        """Same contract as FallDetector.process_frame."""
+        frame_480, detections = self.detect(frame, current_time, frame_index)
+        return FallDetector.annotate(frame_480, detections), detections.events
+
+    def wants_frame(self, frame_index):
+        return frame_index % (self._skip_frames + 1) == 0
+
+    def detect(self, frame, current_time=None, frame_index=None):
+        if current_time is None:
+            current_time = time.time()
+        frame_480 = np.ascontiguousarray(self._resize_to_480h(frame))
+
+        self._ensure_ring(frame_480.nbytes)
+        slot = self._slot
+        self._slot = (self._slot + 1) % self.SLOTS
+        view = np.ndarray(frame_480.shape, dtype=np.uint8, buffer=self._shm.buf, offset=slot * self._slot_bytes)
+        np.copyto(view, frame_480)
+        del view
+
+        self._seq += 1
+        seq = self._seq
+        generation = self.pool._generation(self.worker_idx)
+        self.pool._send(self.worker_idx, ("frame", self.source_id, seq, slot, frame_480.shape, current_time,
+                                         frame_index))
+
+        deadline = time.monotonic() + self.RESULT_TIMEOUT
+        with self._result_cond:
+            while self._result is None or self._result[0] < seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"Worker result for source {self.source_id} timed out (seq {seq})")
+                    return frame_480, FrameDetections()
+                if not self.pool._alive(self.worker_idx, generation):
+                    # Don't sit out RESULT_TIMEOUT on a dead worker; the pool is respawning it
+                    logger.warning(f"Worker {self.worker_idx} for source {self.source_id} is gone, dropping seq {seq}")
+                    return frame_480, FrameDetections()
+                self._result_cond.wait(min(remaining, self.LIVENESS_POLL))
+            _, detections, snapshot, error = self._result
+
+        if error is not None or detections is None:
+            logger.error(f"Worker detection failed for source {self.source_id}: {error}")
+            return frame_480, FrameDetections()
+        self._stats = snapshot["stats"]
+        self._rate = snapshot["rate"]
+        self.last_infer_ms = snapshot["last_infer_ms"]
+        return frame_480, detections
+
+    def _deliver(self, seq, detections, snapshot, error):
+        with self._result_cond:
+            self._result = (seq, detections, snapshot, error)
+            self._result_cond.notify_all()
+
+    @property
+    def infer_ms_ema(self):
+        return self._rate.get("cost_ms", 0.0)
+
+    @property
+    def input_fps(self):
+        return self._rate.get("source_fps", 0.0)
+
+    def get_rate_inputs(self):
+        return dict(self._rate)
+
+    def get_stats(self):
+        return dict(self._stats, worker=self.worker_idx)
+
+    def close(self):
+        self.pool._release(self)
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class InferenceWorkerPool:
+    """
+    Pool of detection worker processes. Each source is pinned to the least-loaded worker
+    so its tracker and fall history stay in one place; a dispatcher thread routes
+    results back to the ProcessDetector waiting for them. The same thread watches the
+    processes: a worker that dies (OOM, segfault) is respawned and its sources are
+    re-opened and re-attached to their shared-memory rings (tracker history restarts).
+    """
+
+    # Minimum seconds between two restarts of the same worker (crash loops)
+    RESTART_BACKOFF = 5.0
+
+    def __init__(self, num_workers: Optional[int] = None):
+        self.num_workers = workers_configured() if num_workers is None else num_workers
+        self._ctx = mp.get_context("spawn")
+        self._workers = []  # [{"proc", "task_q", "sources": set()}]
+        self._result_q = None
+        self._detectors: Dict[int, ProcessDetector] = {}
+        self._lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.num_workers > 0
+
+    def start(self):
+        if self.running or not self.enabled:
+            return
+        self._threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+        self._result_q = self._ctx.Queue()
+        for _ in range(self.num_workers):
+            task_q = self._ctx.Queue()
+            self._workers.append({"proc": self._spawn(task_q), "task_q": task_q, "sources": set(),
+                                  "generation": 0, "restarts": 0, "started_at": time.monotonic()})
+        self.running = True
+        self.thread = threading.Thread(target=self._dispatch, daemon=True)
+        self.thread.start()
+        logger.info(f"Started {self.num_workers} detection worker processes ({self._threads} threads each)")
+
+    def _spawn(self, task_q):
+        proc = self._ctx.Process(target=_worker_main, args=(task_q, self._result_q, self._threads), daemon=True)
+        proc.start()
+        return proc
+
+    def _generation(self, worker_idx: int) -> int:
+        return self._workers[worker_idx]["generation"]
+
+    def _alive(self, worker_idx: int, generation: int) -> bool:
+        """False once the process that was sent `generation`'s frames has died or been replaced."""
+        w = self._workers[worker_idx]
+        return w["generation"] == generation and w["proc"].is_alive()
+
+    def _check_workers(self):
+        if not self.running:
+            return
+        now = time.monotonic()
+        for idx, w in enumerate(self._workers):
+            if w["proc"].is_alive() or now - w["started_at"] < self.RESTART_BACKOFF:
+                continue
+            self._respawn(idx)
+
+    def _respawn(self, idx: int):
+        with self._lock:
+            old = self._workers[idx]
+            detectors = [d for d in self._detectors.values() if d.worker_idx == idx]
+            logger.error(f"Detection worker {idx} (pid {old['proc'].pid}) died with exit code "
+                         f"{old['proc'].exitcode}; respawning for sources {sorted(old['sources'])}")
+            # Queue the sources' state before anything else can reach the new process
+            task_q = self._ctx.Queue()
+            for detector in detectors:
+                for msg in detector.reopen_messages():
+                    task_q.put(msg)
+            self._workers[idx] = {"proc": self._spawn(task_q), "task_q": task_q, "sources": old["sources"],
+                                  "generation": old["generation"] + 1, "restarts": old["restarts"] + 1,
+                                  "started_at": time.monotonic()}
+        # Wake pipelines still waiting on the dead process
+        for detector in detectors:
+            with detector._result_cond:
+                detector._result_cond.notify_all()
+
+    def create_detector(self, source_id: int, telegram_config: Optional[Dict] = None,
+                        backend: Optional[str] = None) -> ProcessDetector:
+        with self._lock:
+            self.start()
+            idx = min(range(len(self._workers)), key=lambda i: len(self._workers[i]["sources"]))
+            self._workers[idx]["sources"].add(source_id)
+            detector = ProcessDetector(self, source_id, idx, telegram_config, backend)
+            self._detectors[source_id] = detector
+        self._send(idx, ("open", source_id, {"backend": backend}))
+        return detector
+
+    def _send(self, worker_idx: int, msg):
+        self._workers[worker_idx]["task_q"].put(msg)
+
+    def _release(self, detector: ProcessDetector):
+        with self._lock:
+            if self._detectors.get(detector.source_id) is detector:
+                del self._detectors[detector.source_id]
+            self._workers[detector.worker_idx]["sources"].discard(detector.source_id)
+        self._send(detector.worker_idx, ("close", detector.source_id))
+
+    def _dispatch(self):
+        while self.running:
+            self._check_workers()
+            try:
+                sid, seq, detections, snapshot, error = self._result_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            detector = self._detectors.get(sid)
+            if detector is not None:
+                detector._deliver(seq, detections, snapshot, error)
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        for w in self._workers:
+            w["task_q"].put(None)
+        for w in self._workers:
+            w["proc"].join(timeout=2.0)
+            if w["proc"].is_alive():
+                w["proc"].terminate()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self._workers = []
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "processes": [
+                    {"pid": w["proc"].pid, "alive": w["proc"].is_alive(), "restarts": w["restarts"],
+                     "sources": sorted(w["sources"])}
+                    for w in self._workers
+                ],
+            }
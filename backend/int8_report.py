@@ -0,0 +1,190 @@
+"""
+Compare the FP32 and INT8 pose models on our recorded clips.
+
+Usage (from backend/):
+    python int8_report.py [--clips "data/snapshots/fall_clip_*.mp4"] [--baseline openvino]
+
+Writes data/reports/int8_report.md and .json with per-frame latency, keypoint drift
+and whether _detect_fall reaches the same confirmed-fall decisions on both models.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+
+import cv2
+import numpy as np
+
+from app.cv_pipeline import FallDetector
+from app import quantization
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+IOU_MATCH = 0.5
+DECISION_TOLERANCE_S = 0.5
+
+
+def _extract(results):
+    """Pull boxes/keypoints out of a Results list as plain arrays."""
+    if not results or results[0].boxes is None or len(results[0].boxes) == 0:
+        return np.zeros((0, 4)), np.zeros((0, 17, 2)), None
+    r0 = results[0]
+    boxes = r0.boxes.xyxy.cpu().numpy()
+    kpts = r0.keypoints.xy.cpu().numpy() if r0.keypoints is not None else np.zeros((len(boxes), 17, 2))
+    conf = r0.keypoints.conf.cpu().numpy() if r0.keypoints is not None and r0.keypoints.conf is not None else None
+    return boxes, kpts, conf
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def run_clip(clip_path, backend):
+    """Replay one clip through a fresh FallDetector using video time, not wall time."""
+    detector = FallDetector(backend=backend, use_batching=False)
+    cap = cv2.VideoCapture(clip_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    latencies, detections, confirmed = [], {}, []
+    idx = 0
+    prev_results = None
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        ts = idx / fps
+        _, events = detector.process_frame(frame, current_time=ts)
+        if detector.last_results is not prev_results:
+            prev_results = detector.last_results
+            latencies.append(detector.last_infer_ms)
+            detections[idx] = _extract(detector.last_results)
+        for e in events:
+            confirmed.append({"frame": idx, "time": round(ts, 3), "track_id": e["track_id"], "reason": e["reason"]})
+        idx += 1
+    cap.release()
+    return {"fps": fps, "frames": idx, "latencies": latencies, "detections": detections, "confirmed": confirmed}
+
+
+def keypoint_drift(base, quant, kpt_conf_thr=0.35):
+    """Mean keypoint distance between IoU-matched detections, in px and in box heights."""
+    drift_px, drift_rel, unmatched = [], [], 0
+    for idx, (b_boxes, b_kpts, b_conf) in base["detections"].items():
+        q_boxes, q_kpts, q_conf = quant["detections"].get(idx, (np.zeros((0, 4)), None, None))
+        used = set()
+        for i, bb in enumerate(b_boxes):
+            best_j, best_iou = -1, IOU_MATCH
+            for j, qb in enumerate(q_boxes):
+                if j not in used:
+                    iou = _iou(bb, qb)
+                    if iou >= best_iou:
+                        best_j, best_iou = j, iou
+            if best_j < 0:
+                unmatched += 1
+                continue
+            used.add(best_j)
+            valid = np.ones(len(b_kpts[i]), dtype=bool)
+            if b_conf is not None and q_conf is not None:
+                valid = (b_conf[i] > kpt_conf_thr) & (q_conf[best_j] > kpt_conf_thr)
+            if not valid.any():
+                continue
+            d = np.linalg.norm(b_kpts[i][valid] - q_kpts[best_j][valid], axis=1)
+            h = max(1e-6, float(bb[3] - bb[1]))
+            drift_px.append(float(d.mean()))
+            drift_rel.append(float(d.mean()) / h)
+        unmatched += len(q_boxes) - len(used)
+    return drift_px, drift_rel, unmatched
+
+
+def same_decisions(base_confirmed, quant_confirmed):
+    if len(base_confirmed) != len(quant_confirmed):
+        return False
+    for a, b in zip(sorted(base_confirmed, key=lambda e: e["time"]), sorted(quant_confirmed, key=lambda e: e["time"])):
+        if abs(a["time"] - b["time"]) > DECISION_TOLERANCE_S:
+            return False
+    return True
+
+
+def _summary(values):
+    if not values:
+        return {"mean": 0.0, "p95": 0.0, "max": 0.0}
+    s = sorted(values)
+    return {
+        "mean": round(statistics.fmean(s), 3),
+        "p95": round(s[min(len(s) - 1, int(0.95 * len(s)))], 3),
+        "max": round(s[-1], 3),
+    }
+
+
+def build_report(clips, baseline):
+    report = {"baseline": baseline, "quantized": "openvino-int8", "clips": [], "all_decisions_match": True}
+    for clip in clips:
+        logger.info(f"Replaying {clip}")
+        base = run_clip(clip, baseline)
+        quant = run_clip(clip, "openvino-int8")
+        drift_px, drift_rel, unmatched = keypoint_drift(base, quant)
+        match = same_decisions(base["confirmed"], quant["confirmed"])
+        report["all_decisions_match"] &= match
+        report["clips"].append({
+            "clip": os.path.basename(clip),
+            "frames": base["frames"],
+            "latency_ms": {"fp32": _summary(base["latencies"]), "int8": _summary(quant["latencies"])},
+            "keypoint_drift_px": _summary(drift_px),
+            "keypoint_drift_rel_height": _summary(drift_rel),
+            "unmatched_detections": unmatched,
+            "confirmed_falls": {"fp32": base["confirmed"], "int8": quant["confirmed"]},
+            "decisions_match": match,
+        })
+    return report
+
+
+def write_markdown(report, path):
+    lines = [
+        "# INT8 vs FP32 pose model report",
+        "",
+        f"Baseline: `{report['baseline']}` - Quantized: `{report['quantized']}`",
+        "",
+        f"**All confirmed-fall decisions match: {'YES' if report['all_decisions_match'] else 'NO'}**",
+        "",
+        "| Clip | Frames | FP32 ms (mean/p95) | INT8 ms (mean/p95) | KPT drift px (mean/p95) | Drift / box h | Unmatched | Falls FP32 | Falls INT8 | Same decision |",
+        "| :--- | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | :---: |",
+    ]
+    for c in report["clips"]:
+        lf, li = c["latency_ms"]["fp32"], c["latency_ms"]["int8"]
+        d, dr = c["keypoint_drift_px"], c["keypoint_drift_rel_height"]
+        lines.append(
+            f"| {c['clip']} | {c['frames']} | {lf['mean']:.1f} / {lf['p95']:.1f} | {li['mean']:.1f} / {li['p95']:.1f} | "
+            f"{d['mean']:.2f} / {d['p95']:.2f} | {dr['mean']:.3f} | {c['unmatched_detections']} | "
+            f"{len(c['confirmed_falls']['fp32'])} | {len(c['confirmed_falls']['int8'])} | {'yes' if c['decisions_match'] else 'NO'} |"
+        )
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", default=quantization.CALIBRATION_GLOB, help="glob of recorded clips")
+    parser.add_argument("--baseline", default="openvino", help="FP32 backend to compare against (pytorch/onnx/openvino)")
+    parser.add_argument("--out", default="data/reports", help="output directory")
+    args = parser.parse_args()
+
+    clips = quantization.find_calibration_clips(args.clips)
+    if not clips:
+        logger.error(f"No clips found for '{args.clips}'")
+        return
+
+    report = build_report(clips, args.baseline)
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "int8_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    write_markdown(report, os.path.join(args.out, "int8_report.md"))
+    logger.info(f"Report written to {args.out} (decisions match: {report['all_decisions_match']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+FFmpegCapture against a small clip generated on the fly. Needs the ffmpeg and ffprobe
+binaries (skipped otherwise). Run from backend/: python -m pytest tests
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ffmpeg_capture import FFmpegCapture, ffmpeg_available  # noqa: E402
+
+pytestmark = pytest.mark.skipif(not ffmpeg_available(), reason="ffmpeg/ffprobe not on PATH")
+
+FRAMES = 20
+SRC_W, SRC_H, FPS = 320, 240, 10.0
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("clips") / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (SRC_W, SRC_H))
+    assert writer.isOpened()
+    for i in range(FRAMES):
+        frame = np.full((SRC_H, SRC_W, 3), 10 * i, dtype=np.uint8)
+        cv2.putText(frame, str(i), (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def _read_all(cap, image=None):
+    frames = []
+    while True:
+        ok, frame = cap.read(image)
+        if not ok:
+            return frames
+        frames.append(frame.copy())
+
+
+def test_reads_every_frame_scaled_then_eof(clip):
+    cap = FFmpegCapture(clip, target_h=120)
+    try:
+        assert cap.isOpened()
+        assert (cap.width, cap.height) == (160, 120)
+        assert (cap.src_width, cap.src_height) == (SRC_W, SRC_H)
+        assert cap.get(cv2.CAP_PROP_FPS) == pytest.approx(FPS)
+
+        frames = _read_all(cap)
+        assert len(frames) == FRAMES == cap.frames_read
+        assert all(f.shape == (120, 160, 3) and f.dtype == np.uint8 for f in frames)
+        # Frames come out in order (the background brightens by 10 per frame)
+        assert frames[0][2, 2].mean() < frames[-1][2, 2].mean()
+
+        # EOF is sticky and does not raise
+        assert cap.read() == (False, None)
+        assert not cap.grab()
+    finally:
+        cap.release()
+
+
+def test_reads_into_the_callers_buffer(clip):
+    cap = FFmpegCapture(clip, target_h=120)
+    try:
+        image = np.zeros((120, 160, 3), dtype=np.uint8)
+        ok, frame = cap.read(image)
+        assert ok and frame is image and image.any()
+    finally:
+        cap.release()
+
+
+def test_max_fps_drops_frames_in_the_decoder(clip):
+    cap = FFmpegCapture(clip, target_h=120, max_fps=FPS / 2)
+    try:
+        assert cap.get(cv2.CAP_PROP_FPS) == pytest.approx(FPS / 2)
+        assert abs(len(_read_all(cap)) - FRAMES // 2) <= 1
+    finally:
+        cap.release()
+
+
+def test_rewind_restarts_the_decoder(clip):
+    cap = FFmpegCapture(clip, target_h=120)
+    try:
+        first = cap._proc
+        _read_all(cap)
+        assert cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        assert first.poll() is not None
+        assert len(_read_all(cap)) == FRAMES
+    finally:
+        cap.release()
+
+
+def test_release_mid_stream_leaves_no_process(clip):
+    cap = FFmpegCapture(clip, target_h=120)
+    proc = cap._proc
+    assert cap.read()[0]
+    # ffmpeg is blocked writing the rest of the clip into the pipe
+    cap.release()
+    assert proc.poll() is not None  # exited and reaped
+    assert proc.stdout.closed
+    assert not cap.isOpened()
+    assert cap.read() == (False, None)
+    cap.release()  # idempotent
+
+
+def test_missing_source_fails_to_open(tmp_path):
+    cap = FFmpegCapture(str(tmp_path / "missing.mp4"))
+    assert not cap.isOpened()
+    assert cap._proc is None
+    assert cap.read() == (False, None)
@@ -0,0 +1,99 @@
+"""
+Multiplexed live socket: subscribe validation and viewer bookkeeping, against fake
+pipelines and sockets. Run from backend/: python -m pytest tests
+"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.live import LiveSession, parse_rendition  # noqa: E402
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self):
+        pass
+
+
+class FakeBroadcaster:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def subscribe(self, client=None, **rendition):
+        self.calls.append(rendition)
+        raise self.error or RuntimeError("broadcaster closed")
+
+
+class FakePipeline:
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+        self.running = True
+        self.viewers = 0
+
+    def add_viewer(self):
+        self.viewers += 1
+
+    def remove_viewer(self):
+        self.viewers = max(0, self.viewers - 1)
+
+
+class FakeManager:
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def get_pipeline(self, source_id):
+        return self.pipeline
+
+
+def test_parse_rendition_converts_numbers():
+    rendition = parse_rendition({"max_width": "320", "quality": 60.0, "fps": "2.5", "overlay": "client"})
+    assert rendition == {"max_width": 320, "quality": 60, "max_fps": 2.5, "overlay": "client"}
+    assert parse_rendition({}) == {"max_width": None, "quality": None, "max_fps": None, "overlay": None}
+
+
+@pytest.mark.parametrize("msg", [{"max_width": "abc"}, {"quality": [1]}, {"fps": "inf"}, {"fps": -1},
+                                 {"max_width": True}])
+def test_parse_rendition_rejects_bad_fields(msg):
+    with pytest.raises(ValueError):
+        parse_rendition(msg)
+
+
+def test_bad_rendition_gets_an_error_reply():
+    async def scenario():
+        pipeline = FakePipeline(FakeBroadcaster())
+        socket = FakeSocket()
+        session = LiveSession(socket, FakeManager(pipeline))
+        await session._subscribe(1, {"action": "subscribe", "source_id": 1, "max_width": "abc"})
+        return pipeline, socket, session
+
+    pipeline, socket, session = asyncio.run(scenario())
+    assert socket.sent == [{"type": "error", "source_id": 1, "detail": "'max_width' must be a number"}]
+    assert pipeline.viewers == 0
+    assert not session._streams
+    assert pipeline.broadcaster.calls == []
+
+
+def test_failed_subscribe_releases_the_viewer():
+    async def scenario():
+        pipeline = FakePipeline(FakeBroadcaster())
+        socket = FakeSocket()
+        session = LiveSession(socket, FakeManager(pipeline))
+        await session._subscribe(1, {"action": "subscribe", "source_id": 1, "max_width": 320})
+        await asyncio.gather(*session._streams.values())
+        return pipeline, socket, session
+
+    pipeline, socket, session = asyncio.run(scenario())
+    assert pipeline.viewers == 0
+    assert not session._streams
+    assert socket.sent[-1]["type"] == "error"
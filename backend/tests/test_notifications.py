@@ -0,0 +1,204 @@
+"""
+Telegram client and notification dispatcher against a local stand-in Bot API
+(TELEGRAM_API_URL pointed at an http.server). Run from backend/: python -m pytest tests
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import database, notifications  # noqa: E402
+from app.notification_dispatcher import NotificationDispatcher  # noqa: E402
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Records every call; answers with queued responses, then {"ok": true}."""
+    protocol_version = "HTTP/1.1"  # keep-alive
+    calls = []
+    responses = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        StandIn.calls.append({"path": self.path, "body": body, "port": self.client_address[1]})
+        answer = StandIn.responses.pop(0) if StandIn.responses else {
+            "ok": True, "result": {"message_id": len(StandIn.calls)}}
+        data = json.dumps(answer).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{httpd.server_port}"
+    database.init_db()
+    yield httpd
+    httpd.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def reset(server):
+    StandIn.calls.clear()
+    StandIn.responses.clear()
+    db = database.SessionLocal()
+    db.query(database.NotificationModel).delete()
+    db.commit()
+    db.close()
+
+
+def _token(name):
+    # Fresh client (own pool and buckets) per test
+    return f"{abs(hash(name)) % 10 ** 8}:{name}"
+
+
+def test_connections_are_reused(server):
+    bot = notifications.TelegramBot(_token("keepalive"), "1")
+    for i in range(5):
+        assert bot.send_message(f"msg {i}")["ok"]
+    assert len(StandIn.calls) == 5
+    assert len({c["port"] for c in StandIn.calls}) == 1
+    assert notifications.TelegramBot(bot.token, "2").client is bot.client
+
+
+def test_chat_rate_defers_instead_of_sleeping(server):
+    client = notifications.get_client(_token("pacing"))
+    assert client.acquire("1") == 0.0
+    started = time.monotonic()
+    wait = client.acquire("1")
+    assert 0.0 < wait <= 1.0 / client.CHAT_RATE
+    assert time.monotonic() - started < 0.05
+    # Other chats are not held up
+    assert client.acquire("2") == 0.0
+    # Groups get the per-minute budget
+    assert client.acquire("-100") == 0.0
+    assert client.acquire("-100") > 1.0
+
+
+def test_retry_after_pauses_the_chat(server):
+    client = notifications.get_client(_token("429"))
+    StandIn.responses.append({"ok": False, "error_code": 429, "description": "Too Many Requests",
+                              "parameters": {"retry_after": 3}})
+    result = client.request("sendMessage", "7", json={"chat_id": "7", "text": "x"})
+    assert result["error_code"] == 429
+    assert client.acquire("7") > 2.0
+    assert client.get_stats()["rate_limited"] == 1
+
+
+def _enqueue(dispatcher, token, chat_id, kind, payload, event_id=None):
+    db = database.SessionLocal()
+    row = dispatcher.enqueue(db, kind, token, chat_id, payload, event_id=event_id)
+    db.commit()
+    row_id = row.id
+    db.close()
+    return row_id
+
+
+def _deliver(dispatcher, row_id):
+    db = database.SessionLocal()
+    try:
+        dispatcher._deliver(db, row_id)
+    finally:
+        db.close()
+
+
+def _rows():
+    db = database.SessionLocal()
+    rows = {r.id: r for r in db.query(database.NotificationModel).all()}
+    db.close()
+    return rows
+
+
+def test_dispatcher_merges_pending_messages_per_chat(server):
+    dispatcher = NotificationDispatcher()
+    token = _token("merge")
+    ids = [_enqueue(dispatcher, token, "5", "message", {"text": f"reminder {i}"}) for i in range(6)]
+    other = _enqueue(dispatcher, token, "6", "message", {"text": "other chat"})
+
+    _deliver(dispatcher, ids[0])
+
+    assert len(StandIn.calls) == 1
+    text = json.loads(StandIn.calls[0]["body"])["text"]
+    assert all(f"reminder {i}" in text for i in range(6))
+    rows = _rows()
+    assert all(rows[i].status == "sent" for i in ids)
+    assert rows[other].status == "pending"
+    assert dispatcher.get_stats()["merged"] == 5
+
+
+def test_dispatcher_reschedules_rate_limited_rows(server):
+    dispatcher = NotificationDispatcher()
+    token = _token("dispatch429")
+    StandIn.responses.append({"ok": False, "error_code": 429, "description": "Too Many Requests",
+                              "parameters": {"retry_after": 1}})
+    row_id = _enqueue(dispatcher, token, "9", "message", {"text": "alert"})
+
+    _deliver(dispatcher, row_id)
+    row = _rows()[row_id]
+    assert row.status == "pending"
+    assert row.attempts == 0  # a 429 is not a failed attempt
+    assert (row.next_attempt_at - datetime.utcnow()).total_seconds() > 0.5
+
+    # Still paused: deferred without calling the API or blocking the worker
+    started = time.monotonic()
+    _deliver(dispatcher, row_id)
+    assert time.monotonic() - started < 0.5
+    assert len(StandIn.calls) == 1
+
+    time.sleep(1.1)
+    _deliver(dispatcher, row_id)
+    assert _rows()[row_id].status == "sent"
+    assert len(StandIn.calls) == 2
+
+
+def test_finished_rows_are_purged_but_open_alerts_kept(server):
+    dispatcher = NotificationDispatcher()
+    token = _token("purge")
+    db = database.SessionLocal()
+    open_event = database.FallEventModel(source_id=1, track_id=1, fall_score=0.9, is_fall=True)
+    resolved_event = database.FallEventModel(source_id=1, track_id=2, fall_score=0.9, is_fall=True, is_resolved=True)
+    db.add_all([open_event, resolved_event])
+    db.commit()
+    open_id, resolved_id = open_event.id, resolved_event.id
+    db.close()
+
+    old = {"open_alert": _enqueue(dispatcher, token, "1", "photo", {"path": "x.jpg"}, event_id=open_id),
+           "resolved_alert": _enqueue(dispatcher, token, "1", "photo", {"path": "x.jpg"}, event_id=resolved_id),
+           "reminder": _enqueue(dispatcher, token, "1", "message", {"text": "r"}, event_id=open_id),
+           "pending": _enqueue(dispatcher, token, "1", "message", {"text": "p"})}
+    recent = _enqueue(dispatcher, token, "1", "message", {"text": "new"}, event_id=open_id)
+
+    db = database.SessionLocal()
+    long_ago = datetime.utcnow() - timedelta(hours=dispatcher.RETENTION_HOURS + 1)
+    for name, row_id in old.items():
+        row = db.get(database.NotificationModel, row_id)
+        row.created_at = long_ago
+        row.status = "pending" if name == "pending" else "sent"
+    db.get(database.NotificationModel, recent).status = "sent"
+    db.commit()
+    dispatcher._purge(db, force=True)
+    db.close()
+
+    left = set(_rows())
+    assert left == {old["open_alert"], old["pending"], recent}
+    assert dispatcher.get_stats()["purged"] == 2
+    db = database.SessionLocal()
+    db.query(database.FallEventModel).delete()
+    db.commit()
+    db.close()
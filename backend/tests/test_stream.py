@@ -0,0 +1,188 @@
+"""
+VideoStream reconnect engine and StreamWatchdog against scripted fake captures
+(no camera or ffmpeg needed). Run from backend/: python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import stream as stream_module  # noqa: E402
+from app.stream import StreamWatchdog, VideoStream  # noqa: E402
+
+SHAPE = (48, 64, 3)
+
+
+class FakeCapture:
+    """cv2.VideoCapture stand-in: `frames` good reads, then failing or stalled reads."""
+
+    def __init__(self, frames=0, opened=True, stall=False, read_timeout=1.0):
+        self.frames = frames
+        self.opened = opened
+        self.stall = stall
+        self.read_timeout = read_timeout  # like cv2's READ_TIMEOUT on a stalled RTSP session
+        self.released = threading.Event()
+
+    def isOpened(self):
+        return self.opened and not self.released.is_set()
+
+    def read(self, image=None):
+        if self.frames > 0:
+            self.frames -= 1
+            time.sleep(0.005)
+            frame = image if image is not None else np.empty(SHAPE, dtype=np.uint8)
+            frame[:] = self.frames % 256
+            return True, frame
+        if self.stall:
+            self.released.wait(self.read_timeout)
+        return False, None
+
+    def grab(self):
+        return self.read()[0]
+
+    def get(self, prop_id):
+        return 0.0
+
+    def set(self, prop_id, value):
+        return False
+
+    def release(self):
+        self.released.set()
+
+
+class RecordingEvent(threading.Event):
+    """Stop event whose backoff waits return at once, recording (delay, state)."""
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        self.waits = []
+
+    def wait(self, timeout=None):
+        self.waits.append((timeout, self.stream.state))
+        return super().wait(0)
+
+
+def _stream(captures, is_file=False, **tuning):
+    stream = VideoStream("rtsp://camera.test/stream", is_file=is_file)
+    for name, value in tuning.items():
+        setattr(stream, name, value)
+    script = list(captures)
+    stream.opened = []
+
+    def open_capture():
+        cap = script.pop(0) if script else FakeCapture(frames=10 ** 6)
+        stream.opened.append(cap)
+        return cap
+
+    stream._open_capture = open_capture
+    stream._stop_event = RecordingEvent(stream)
+    return stream
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    # Upper end of the jitter range, so the schedule is deterministic
+    monkeypatch.setattr(stream_module.random, "uniform", lambda a, b: b)
+
+
+@pytest.fixture
+def watchdog(monkeypatch):
+    dog = StreamWatchdog(interval=0.05)
+    monkeypatch.setattr(stream_module, "_WATCHDOG", dog)
+    return dog
+
+
+def test_backoff_doubles_up_to_the_cap(monkeypatch):
+    stream = VideoStream("rtsp://camera.test/stream")
+    stream.BACKOFF_MAX = 4.0
+    assert [stream._backoff_delay(n) for n in range(6)] == [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+
+    monkeypatch.setattr(stream_module.random, "uniform", lambda a, b: a)
+    assert stream._backoff_delay(3) == 2.0  # jitter never goes below half
+
+
+def test_open_failures_back_off_then_recover(watchdog):
+    stream = _stream([FakeCapture(opened=False)] * 3)
+    stream.start()
+    try:
+        assert _wait_until(lambda: stream.state == "streaming")
+        assert stream._stop_event.waits == [(0.5, "backoff"), (1.0, "backoff"), (2.0, "backoff")]
+        health = stream.get_health()
+        assert health["consecutive_failures"] == 0
+        assert health["reconnects"] == 0  # never connected, so nothing to reconnect
+        assert health["time_to_first_frame_s"] is not None
+        packet = stream.read_packet(timeout=1.0)
+        assert packet is not None and packet.frame.shape == SHAPE
+        stream.release(packet)
+    finally:
+        stream.stop()
+    assert stream.state == "stopped"
+    assert stream.opened[-1].released.is_set()
+
+
+def test_read_failures_reconnect_with_a_fresh_backoff(watchdog):
+    stream = _stream([FakeCapture(opened=False), FakeCapture(frames=5)])
+    stream.start()
+    try:
+        assert _wait_until(lambda: stream.reconnects == 1 and stream.state == "streaming")
+        # The open failure used attempt 0; frames then arrived, so the reconnect starts over
+        assert stream._stop_event.waits == [(0.5, "backoff"), (0.5, "backoff")]
+        assert stream.last_error == "read failed"
+        assert len(stream.opened) == 3
+        assert stream.opened[1].released.is_set()
+        assert stream.get_health()["consecutive_failures"] == 0
+    finally:
+        stream.stop()
+
+
+def test_watchdog_trips_a_stalled_stream(watchdog):
+    stalled = FakeCapture(frames=3, stall=True, read_timeout=2.0)
+    stream = _stream([stalled], STALL_SECONDS=0.2)
+    stream.start()
+    try:
+        assert _wait_until(lambda: stream.stalls >= 1)
+        assert _wait_until(lambda: stream.reconnects == 1 and stream.state == "streaming")
+        assert stream.stalls == 1
+        assert stream.last_error == "stalled"
+        assert stalled.released.is_set()
+        assert stream._stop_event.waits[0] == (0.5, "backoff")
+        assert _wait_until(lambda: stream.get_health()["effective_fps"] > 0)
+    finally:
+        stream.stop()
+    assert stream not in watchdog._streams
+
+
+def test_watchdog_leaves_healthy_streams_alone():
+    stream = _stream([], STALL_SECONDS=10.0)
+    stream.state = "streaming"
+    stream._last_frame_mono = time.monotonic()
+    stream._watchdog_tick(time.monotonic() + 5.0)
+    assert stream.stalls == 0 and not stream._reconnect_requested
+    stream._watchdog_tick(time.monotonic() + 11.0)
+    stream._watchdog_tick(time.monotonic() + 12.0)
+    assert stream.stalls == 1 and stream._reconnect_requested  # counted once per stall
+
+
+def test_missing_file_fails_without_retrying(watchdog):
+    stream = _stream([FakeCapture(opened=False)], is_file=True)
+    stream.start()
+    assert _wait_until(lambda: stream.state == "failed")
+    assert not stream.running
+    assert stream._stop_event.waits == []
+    assert stream.get_health()["last_error"] == "open failed"
+    stream.stop()
@@ -8,6 +8,7 @@ import Groups from './pages/Groups';
 import Login from './pages/Login';
 import Files from './pages/Files';
 import Demo from './pages/Demo';
+import liveHub from './liveHub';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
@@ -91,12 +92,32 @@ const AppContent = () => {
             }
         };
 
-        fetchInitialData();
+        // Pipelines started or stopped elsewhere: keep the grid in sync
+        const syncActiveStreams = async (activeIds) => {
+            setActiveStreams(prev => prev.filter(s => activeIds.includes(s.id)));
+            try {
+                const res = await axios.get(`${API_URL}/api/sources`);
+                setActiveStreams(prev => {
+                    const known = new Set(prev.map(s => s.id));
+                    return [...prev, ...res.data.filter(s => activeIds.includes(s.id) && !known.has(s.id))];
+                });
+            } catch (e) { }
+        };
 
-        // Poll for events every 5s for better responsiveness
-        const interval = setInterval(fetchEvents, 5000);
+        fetchInitialData();
 
-        return () => clearInterval(interval);
+        // After the initial fetch, events arrive over the multiplexed live socket instead of polling
+        const unsubscribers = [
+            liveHub.on('fall_event', (msg) => {
+                setEvents(prev => [msg.data, ...prev.filter(e => e.id !== msg.data.id)].slice(0, 20));
+            }),
+            liveHub.on('event_update', (msg) => {
+                setEvents(prev => prev.map(e => (e.id === msg.data.id ? { ...e, ...msg.data } : e)));
+            }),
+            liveHub.on('pipelines', (msg) => syncActiveStreams(msg.active_source_ids)),
+        ];
+
+        return () => unsubscribers.forEach(off => off());
     }, []);
 
     const handleStart = async (source) => {
@@ -63,6 +63,16 @@ export default function EventList({ events }) {
                                         alt="Snapshot"
                                         style={{ width: '60px', height: '60px', objectFit: 'cover', borderRadius: '4px' }}
                                     />
+                                    {event.clip_path && (
+                                        <a
+                                            href={`${API_URL}/data/snapshots/${event.clip_path}`}
+                                            target="_blank"
+                                            rel="noreferrer"
+                                            style={{ display: 'block', fontSize: '0.75rem', textAlign: 'center', color: '#38bdf8' }}
+                                        >
+                                            ▶ Clip
+                                        </a>
+                                    )}
                                 </div>
                             )}
                         </div>
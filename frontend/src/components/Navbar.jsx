@@ -2,6 +2,7 @@ import React from 'react';
 import { Link, useLocation, useNavigate } from 'react-router-dom';
 import { LayoutDashboard, Settings, Activity, Video, Users, LogOut, Languages } from 'lucide-react';
 import { useTranslation } from 'react-i18next';
+import liveHub from '../liveHub';
 
 export default function Navbar() {
     const { t, i18n } = useTranslation();
@@ -12,6 +13,7 @@ export default function Navbar() {
 
     const handleLogout = () => {
         localStorage.removeItem('token');
+        liveHub.disconnect();
         navigate('/login');
     };
 
@@ -24,6 +24,12 @@ export default function StreamGrid({ activeStreams }) {
         gridStyle.gridTemplateRows = '1fr 1fr 1fr';
     }
 
+    // Tiles get a scaled-down, lower-rate rendition; a single stream gets full frames.
+    // Overlays are drawn in the browser, so the server only encodes clean frames.
+    const rendition = count > 1
+        ? { max_width: count > 4 ? 320 : 480, quality: 60, fps: 10, overlay: 'client' }
+        : { overlay: 'client' };
+
     if (count === 0) {
         return (
             <div style={{ display: 'flex', justifyContent: 'center', alignItems: 'center', height: '100%', color: '#64748b' }}>
@@ -37,7 +43,8 @@ export default function StreamGrid({ activeStreams }) {
             {activeStreams.map(stream => (
                 <div key={stream.id} style={{ position: 'relative', background: '#000', borderRadius: '8px', overflow: 'hidden' }}>
                     <VideoPlayer
-                        wsUrl={`ws://localhost:8000/api/ws/stream/${stream.id}`}
+                        sourceId={stream.id}
+                        rendition={rendition}
                         isStreaming={true}
                     />
                     <div style={{
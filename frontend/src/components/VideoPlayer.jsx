@@ -1,11 +1,103 @@
 import React, { useEffect, useRef, useState } from 'react';
+import liveHub from '../liveHub';
 
-export default function VideoPlayer({ wsUrl, isStreaming }) {
+// Same pairs and colors as FallDetector.annotate on the server
+const SKELETON = [
+    [5, 7], [7, 9], [6, 8], [8, 10],
+    [11, 13], [13, 15], [12, 14], [14, 16],
+    [5, 6], [11, 12], [5, 11], [6, 12]
+];
+const STATUS_PENDING = 1;
+const STATUS_FALL = 2;
+const STATUS_CONFIRMED = 3;
+
+// Draw a {"type": "detections"} message (see FallDetector.serialize) over the frame
+const drawOverlay = (ctx, meta, showSkeleton) => {
+    const d = meta.data;
+    const scale = ctx.canvas.height / 480;
+    ctx.lineWidth = Math.max(1, 2 * scale);
+    for (let i = 0; i < d.ids.length; i++) {
+        const [x1, y1, x2, y2] = d.boxes[i];
+        const st = d.status[i];
+        const color = st >= STATUS_FALL ? '#ff0000' : '#00ff00';
+
+        ctx.font = `bold ${Math.round(16 * scale)}px sans-serif`;
+        if (st === STATUS_CONFIRMED) {
+            ctx.fillStyle = '#ff0000';
+            ctx.fillText(`FALL CONFIRMED! (${d.reasons[i]})`, x1, Math.max(0, y1 - 10 * scale));
+        } else if (st === STATUS_PENDING) {
+            ctx.fillStyle = '#ffa500';
+            ctx.fillText('FALL? (pending confirm)', x1, Math.max(0, y1 - 10 * scale));
+        }
+
+        ctx.strokeStyle = color;
+        ctx.strokeRect(x1, y1, x2 - x1, y2 - y1);
+        ctx.fillStyle = color;
+        ctx.fillText(`ID: ${d.ids[i]}`, x1, Math.max(0, y1 - 30 * scale));
+
+        const k = d.kpts && d.kpts[i];
+        if (showSkeleton && k) {
+            ctx.beginPath();
+            SKELETON.forEach(([a, b]) => {
+                if (k[2 * a] < 0 || k[2 * b] < 0) return;
+                ctx.moveTo(k[2 * a], k[2 * a + 1]);
+                ctx.lineTo(k[2 * b], k[2 * b + 1]);
+            });
+            ctx.stroke();
+        }
+    }
+};
+
+const drawJpeg = (canvas, data, meta, showSkeleton) => {
+    const ctx = canvas.getContext('2d');
+    const blob = new Blob([data], { type: 'image/jpeg' });
+    const url = URL.createObjectURL(blob);
+    const img = new Image();
+    img.onload = () => {
+        canvas.width = img.width;
+        canvas.height = img.height;
+        ctx.drawImage(img, 0, 0);
+        if (meta) drawOverlay(ctx, meta, showSkeleton);
+        URL.revokeObjectURL(url);
+    };
+    img.src = url;
+};
+
+// With `sourceId` frames come over the shared multiplexed socket (liveHub);
+// `wsUrl` opens a dedicated per-camera socket. With rendition.overlay === 'client' the
+// server sends clean frames and this component draws boxes and skeletons itself.
+export default function VideoPlayer({ wsUrl, sourceId, rendition, isStreaming }) {
     const canvasRef = useRef(null);
     const wsRef = useRef(null);
+    const metaRef = useRef(null); // detections message for the next frame
     const [error, setError] = useState(null);
+    const [showSkeleton, setShowSkeleton] = useState(true);
+    const skeletonRef = useRef(showSkeleton);
+    skeletonRef.current = showSkeleton;
+    const clientOverlay = rendition?.overlay === 'client';
+    const renditionKey = JSON.stringify(rendition || {});
+
+    // The detections message always arrives right before the frame it describes
+    const takeMeta = () => {
+        const meta = metaRef.current;
+        metaRef.current = null;
+        return meta;
+    };
+
+    useEffect(() => {
+        if (!isStreaming || sourceId == null) return;
+        const canvas = canvasRef.current;
+        const offMeta = liveHub.on('detections', (msg) => {
+            if (msg.source_id === sourceId) metaRef.current = msg;
+        });
+        const offFrames = liveHub.subscribe(sourceId, rendition,
+            (jpeg) => drawJpeg(canvas, jpeg, takeMeta(), skeletonRef.current));
+        return () => { offFrames(); offMeta(); };
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [isStreaming, sourceId, renditionKey]);
 
     useEffect(() => {
+        if (sourceId != null) return;
         if (!isStreaming) {
             if (wsRef.current) {
                 wsRef.current.close();
@@ -15,9 +107,9 @@ export default function VideoPlayer({ wsUrl, isStreaming }) {
         }
 
         const canvas = canvasRef.current;
-        const ctx = canvas.getContext('2d');
 
-        wsRef.current = new WebSocket(wsUrl);
+        const params = clientOverlay ? `${wsUrl.includes('?') ? '&' : '?'}overlay=client` : '';
+        wsRef.current = new WebSocket(wsUrl + params);
         wsRef.current.binaryType = 'arraybuffer';
 
         wsRef.current.onopen = () => {
@@ -30,7 +122,9 @@ export default function VideoPlayer({ wsUrl, isStreaming }) {
                 // Handle metadata (events) if needed
                 try {
                     const data = JSON.parse(event.data);
-                    if (data.type === 'events') {
+                    if (data.type === 'detections') {
+                        metaRef.current = data;
+                    } else if (data.type === 'events') {
                         // Dispatch event to parent or global store if needed
                         // For now, we just log it or handle it in App.jsx via a callback prop if we passed one
                         // But since App.jsx will likely poll or use a separate mechanism, we might ignore here
@@ -39,16 +133,7 @@ export default function VideoPlayer({ wsUrl, isStreaming }) {
                 } catch (e) { }
             } else {
                 // Handle binary frame
-                const blob = new Blob([event.data], { type: 'image/jpeg' });
-                const url = URL.createObjectURL(blob);
-                const img = new Image();
-                img.onload = () => {
-                    canvas.width = img.width;
-                    canvas.height = img.height;
-                    ctx.drawImage(img, 0, 0);
-                    URL.revokeObjectURL(url);
-                };
-                img.src = url;
+                drawJpeg(canvas, event.data, takeMeta(), skeletonRef.current);
             }
         };
 
@@ -66,13 +151,34 @@ export default function VideoPlayer({ wsUrl, isStreaming }) {
                 wsRef.current.close();
             }
         };
-    }, [isStreaming, wsUrl]);
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [isStreaming, wsUrl, sourceId, clientOverlay]);
 
     return (
-        <div className="video-container" style={{ width: '100%', height: '100%', display: 'flex', justifyContent: 'center', alignItems: 'center' }}>
+        <div className="video-container" style={{ position: 'relative', width: '100%', height: '100%', display: 'flex', justifyContent: 'center', alignItems: 'center' }}>
             {!isStreaming && <div className="placeholder">Waiting for stream...</div>}
             {error && <div className="error">{error}</div>}
             <canvas ref={canvasRef} style={{ maxWidth: '100%', maxHeight: '100%', display: isStreaming ? 'block' : 'none' }} />
+            {isStreaming && clientOverlay && (
+                <button
+                    onClick={() => setShowSkeleton(!showSkeleton)}
+                    title="Toggle skeleton overlay"
+                    style={{
+                        position: 'absolute',
+                        bottom: '10px',
+                        right: '10px',
+                        background: showSkeleton ? 'rgba(56, 189, 248, 0.8)' : 'rgba(0, 0, 0, 0.6)',
+                        color: '#fff',
+                        border: 'none',
+                        borderRadius: '4px',
+                        padding: '2px 8px',
+                        fontSize: '0.75rem',
+                        cursor: 'pointer'
+                    }}
+                >
+                    Skeleton
+                </button>
+            )}
         </div>
     );
 }
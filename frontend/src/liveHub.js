@@ -0,0 +1,104 @@
+// One multiplexed WebSocket (/api/ws/live) shared by every camera view and the event feed.
+// Binary messages: 8-byte header (uint32 source id, uint32 sequence, big-endian) + JPEG.
+// Text messages: JSON with a `type` (events, fall_event, event_update, pipelines, status, ...).
+
+const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+
+const wsBase = () => {
+    if (API_URL.startsWith('http')) return API_URL.replace(/^http/, 'ws');
+    return `${window.location.protocol === 'https:' ? 'wss' : 'ws'}://${window.location.host}`;
+};
+
+class LiveHub {
+    constructor() {
+        this.ws = null;
+        this.frameHandlers = new Map(); // sourceId -> { rendition, handlers: Set }
+        this.messageHandlers = new Map(); // type -> Set
+        this.retry = 0;
+        this.closedByUser = false;
+    }
+
+    connect() {
+        const token = localStorage.getItem('token');
+        if (!token || (this.ws && this.ws.readyState <= WebSocket.OPEN)) return;
+        this.closedByUser = false;
+
+        const ws = new WebSocket(`${wsBase()}/api/ws/live?token=${encodeURIComponent(token)}`);
+        ws.binaryType = 'arraybuffer';
+        this.ws = ws;
+
+        ws.onopen = () => {
+            this.retry = 0;
+            // Restore subscriptions after a reconnect
+            this.frameHandlers.forEach((entry, sourceId) => this._sendSubscribe(sourceId, entry.rendition));
+        };
+
+        ws.onmessage = (event) => {
+            if (typeof event.data === 'string') {
+                let msg;
+                try { msg = JSON.parse(event.data); } catch (e) { return; }
+                (this.messageHandlers.get(msg.type) || []).forEach(h => h(msg));
+            } else {
+                const sourceId = new DataView(event.data).getUint32(0);
+                const entry = this.frameHandlers.get(sourceId);
+                if (!entry) return;
+                const jpeg = new Uint8Array(event.data, 8);
+                entry.handlers.forEach(h => h(jpeg));
+            }
+        };
+
+        ws.onclose = () => {
+            this.ws = null;
+            if (this.closedByUser || !localStorage.getItem('token')) return;
+            const delay = Math.min(30000, 500 * 2 ** this.retry++);
+            setTimeout(() => this.connect(), delay);
+        };
+    }
+
+    disconnect() {
+        this.closedByUser = true;
+        if (this.ws) this.ws.close();
+    }
+
+    _send(msg) {
+        if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+            this.ws.send(JSON.stringify(msg));
+        }
+    }
+
+    _sendSubscribe(sourceId, rendition) {
+        this._send({ action: 'subscribe', source_id: sourceId, ...(rendition || {}) });
+    }
+
+    // Receive JPEG frames of one source. Returns an unsubscribe function.
+    subscribe(sourceId, rendition, onFrame) {
+        this.connect();
+        let entry = this.frameHandlers.get(sourceId);
+        if (!entry) {
+            entry = { rendition, handlers: new Set() };
+            this.frameHandlers.set(sourceId, entry);
+        }
+        entry.rendition = rendition;
+        entry.handlers.add(onFrame);
+        this._sendSubscribe(sourceId, rendition);
+
+        return () => {
+            entry.handlers.delete(onFrame);
+            if (entry.handlers.size === 0) {
+                this.frameHandlers.delete(sourceId);
+                this._send({ action: 'unsubscribe', source_id: sourceId });
+            }
+        };
+    }
+
+    // Listen for a JSON message type. Returns an unsubscribe function.
+    on(type, handler) {
+        this.connect();
+        if (!this.messageHandlers.has(type)) this.messageHandlers.set(type, new Set());
+        this.messageHandlers.get(type).add(handler);
+        return () => this.messageHandlers.get(type).delete(handler);
+    }
+}
+
+const liveHub = new LiveHub();
+export default liveHub;
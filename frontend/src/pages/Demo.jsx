@@ -2,6 +2,7 @@ import React, { useState, useRef, useEffect } from 'react';
 import axios from 'axios';
 import { Upload, Play, Square, AlertTriangle, Activity, CheckCircle } from 'lucide-react';
 import VideoPlayer from '../components/VideoPlayer';
+import liveHub from '../liveHub';
 import { useTranslation } from 'react-i18next';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
@@ -82,26 +83,23 @@ export default function Demo() {
         }
     };
 
-    // Poll for events for this specific source
+    // Events for this source: one fetch, then pushed over the live socket
     useEffect(() => {
         if (!isPlaying || !sourceId) return;
 
-        const interval = setInterval(async () => {
-            try {
-                const res = await axios.get(`${API_URL}/api/events?limit=10`);
-                // Filter for this source (though backend returns all, we filter client side for demo focus)
-                const myEvents = res.data.filter(e => e.source_id === sourceId);
-                setEvents(myEvents);
+        axios.get(`${API_URL}/api/events?limit=10`)
+            .then(res => setEvents(res.data.filter(e => e.source_id === sourceId)))
+            .catch(e => console.error(e));
 
-                if (myEvents.length > 0 && myEvents[0].timestamp > (Date.now() / 1000 - 2)) {
-                    // Simple check to log new events roughly
-                }
-            } catch (e) {
-                console.error(e);
-            }
-        }, 1000);
+        const offNew = liveHub.on('fall_event', (msg) => {
+            if (msg.data.source_id !== sourceId) return;
+            setEvents(prev => [msg.data, ...prev.filter(e => e.id !== msg.data.id)].slice(0, 10));
+        });
+        const offUpdate = liveHub.on('event_update', (msg) => {
+            setEvents(prev => prev.map(e => (e.id === msg.data.id ? { ...e, ...msg.data } : e)));
+        });
 
-        return () => clearInterval(interval);
+        return () => { offNew(); offUpdate(); };
     }, [isPlaying, sourceId]);
 
     return (
@@ -225,7 +223,8 @@ export default function Demo() {
                 }}>
                     {isPlaying && sourceId ? (
                         <VideoPlayer
-                            wsUrl={`ws://localhost:8000/api/ws/stream/${sourceId}`}
+                            sourceId={sourceId}
+                            rendition={{ overlay: 'client' }}
                             isStreaming={true}
                         />
                     ) : (